@@ -1,15 +1,40 @@
-from fastapi import FastAPI, UploadFile, File, Form
+from fastapi import FastAPI, UploadFile, File, Form, Header, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from contextlib import asynccontextmanager
+from typing import Literal
+import json
+import logging
 import os
 from ollama import chat, ChatResponse
 from pymilvus import connections, Collection
 import sys
 
 os.sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-from documentsPortal import documents_portal
+from documentsPortal import documents_portal, ingestion_jobs
 from fastapi.middleware.cors import CORSMiddleware
-from input_embedding import chatrag
+from input_embedding import chatrag_stream
+from embeddingService import embedding_cache, embedding_pool, model_registry, micro_batcher
+from databaseHandling.connection_manager import get_manager
+from databaseHandling.index_manager import get_index_manager
+from monitoring import metrics
+from retrieval import answer_cache, context_packing, hybrid_search, lexical_index, scoping, search_cache, search_profiles
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    connection_manager = get_manager()
+    try:
+        connection_manager.start()
+    except Exception as e:
+        # Keep serving; pooled clients reconnect with backoff on first use.
+        logging.warning(f"Milvus not reachable at startup: {e}")
+    ingestion_queue.start()
+    yield
+    ingestion_queue.shutdown()
+    micro_batcher.close_all()
+    embedding_pool.close_all()
+    connection_manager.close()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -22,6 +47,13 @@ app.add_middleware(
 UPLOAD_DIR = "uploaded_files/"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+ingestion_queue = ingestion_jobs.IngestionQueue(
+    store=ingestion_jobs.JobStore(
+        os.environ.get("INGESTION_JOBS_DB", os.path.join(UPLOAD_DIR, "ingestion_jobs.sqlite3"))
+    ),
+    run_job=documents_portal.run_ingestion_job,
+)
+
 selected_bank_name = None
 
 @app.get("/")
@@ -30,7 +62,60 @@ def read_root():
 
 @app.get("/health")
 def health_check():
-    return {"status": "ok", "version": "1.0.0"}
+    return {"status": "ok", "version": "1.0.0", "milvus": get_manager().health()}
+
+@app.post("/health/milvus/reconnect")
+def reconnect_milvus():
+    get_manager().reconnect()
+    return {"milvus": get_manager().health(), "pool": get_manager().stats()}
+
+@app.get("/stats/embedding-models")
+def embedding_model_stats():
+    return model_registry.registry_stats()
+
+@app.get("/stats/embedding-batches")
+def embedding_batch_stats():
+    return micro_batcher.batcher_stats()
+
+@app.get("/stats/embedding-cache")
+def embedding_cache_stats():
+    return embedding_cache.cache_stats()
+
+@app.get("/stats/embedding-pool")
+def embedding_pool_stats():
+    return embedding_pool.pool_stats()
+
+@app.get("/stats/answer-cache")
+def answer_cache_stats():
+    return answer_cache.get_cache().stats()
+
+@app.get("/stats/search-cache")
+def search_cache_stats():
+    return search_cache.get_cache().stats()
+
+@app.get("/stats/lexical-index")
+def lexical_index_stats():
+    return lexical_index.stats()
+
+@app.get("/stats/indexes")
+def index_stats():
+    return get_index_manager().stats()
+
+metrics.register(metrics.Gauge(
+    "ragflow_cache_hit_ratio", "Hit ratio of the in-process caches since start.", ("cache",),
+    lambda: {("answer",): answer_cache.get_cache().stats()["hit_rate"],
+             ("search",): search_cache.get_cache().stats()["hit_rate"],
+             ("embedding",): embedding_cache.cache_stats().get("hit_rate")},
+))
+metrics.register(metrics.Gauge(
+    "ragflow_cache_entries", "Entries held by the in-process caches.", ("cache",),
+    lambda: {("answer",): answer_cache.get_cache().stats()["entries"],
+             ("search",): search_cache.get_cache().stats()["entries"]},
+))
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 @app.post("/bankname")
 async def add_bank_name(bank_name: str = Form(...)):
@@ -54,38 +139,125 @@ async def process_document(filename: str):
     file_path = os.path.join(UPLOAD_DIR, filename)
     if not os.path.exists(file_path):
         return {"error": f"File '{filename}' not found."}
-    filename = os.path.basename(filename)
-    filename, _ = os.path.splitext(filename)
-    document = documents_portal.load_document(file_path)
-    chunks = documents_portal.perform_semantic_chunking(
-        document=document,
-        source=file_path,
-    )
-    chunks = documents_portal.perform_embedding_generation(
-        chunked_docs=chunks,
-        model_name="all-MiniLM-L6-v2",
-    )
-    documents_portal.toDB(
-        documents=chunks,
-        collection_name=selected_bank_name,
+    filename = scoping.partition_for(filename)
+    job_id = ingestion_queue.submit(
+        file_path=file_path,
+        bank_name=selected_bank_name,
         partition_name=filename,
     )
-    return {"message": f"Document '{filename}' processed and stored in database."}
+    return {
+        "job_id": job_id,
+        "status": "queued",
+        "message": f"Document '{filename}' queued for processing.",
+    }
+
+@app.get("/jobs")
+def list_jobs(limit: int = 50):
+    return {"jobs": ingestion_queue.store.list(limit)}
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = ingestion_queue.store.get(job_id)
+    if job is None:
+        return {"error": f"Job '{job_id}' not found."}
+    return job
 
 @app.get("/chat/{query}")
-def rag(
+async def rag(
     query: str,
+    response: Response,
     bank_name: str,
     search_limit: int = 5,
     embedding_model: str = "all-MiniLM-L6-v2",
     llm_model: str = "gpt-oss:latest",
+    search_profile: Literal["fast", "balanced", "exhaustive"] = search_profiles.DEFAULT_PROFILE,
+    document: str = None,
+    chunk_type: str = None,
+    source: str = None,
+    retrieval_mode: Literal["vector", "hybrid"] = hybrid_search.DEFAULT_MODE,
+    context_tokens: int = context_packing.TOKEN_BUDGET,
+    debug_timing: str = Header(None, alias="X-Debug-Timing"),
 ):
-    response = chatrag(query,
-            bank_name,
-            search_limit,
-            embedding_model,
-            llm_model)
-    return {"response": response}
+    if not model_registry.is_allowed(embedding_model):
+        return {"error": f"Unknown embedding model '{embedding_model}'."}
+    tokens = []
+    timings = {}
+    with metrics.trace() as spans:
+        async for event in chatrag_stream(query,
+                bank_name,
+                search_limit,
+                embedding_model,
+                llm_model,
+                search_profile,
+                scoping.search_scope(document, chunk_type, source),
+                retrieval_mode,
+                context_tokens):
+            if event["type"] == "token":
+                tokens.append(event["content"])
+            else:
+                timings = event
+    metrics.CHAT_REQUESTS.inc(endpoint="chat", cache=timings.get("cache") or "miss")
+    body = {
+        "response": "".join(tokens),
+        "partial": timings.get("partial", False),
+        "collections": timings.get("collections", {}),
+        "cache": timings.get("cache"),
+        "scope": timings.get("scope"),
+        "search_ms": timings.get("search_ms"),
+        "context": timings.get("context"),
+        "prompt_tokens": timings.get("prompt_tokens"),
+        "prompt_eval_ms": timings.get("prompt_eval_ms"),
+        "time_to_first_token_ms": timings.get("time_to_first_token_ms"),
+        "total_ms": timings.get("total_ms"),
+    }
+    if debug_timing:
+        body["timings"] = spans
+        response.headers["Server-Timing"] = metrics.server_timing(spans)
+    return body
+
+@app.get("/chat/{query}/stream")
+async def rag_stream(
+    query: str,
+    bank_name: str,
+    search_limit: int = 5,
+    embedding_model: str = "all-MiniLM-L6-v2",
+    llm_model: str = "gpt-oss:latest",
+    search_profile: Literal["fast", "balanced", "exhaustive"] = search_profiles.DEFAULT_PROFILE,
+    document: str = None,
+    chunk_type: str = None,
+    source: str = None,
+    retrieval_mode: Literal["vector", "hybrid"] = hybrid_search.DEFAULT_MODE,
+    context_tokens: int = context_packing.TOKEN_BUDGET,
+    debug_timing: str = Header(None, alias="X-Debug-Timing"),
+):
+    if not model_registry.is_allowed(embedding_model):
+        return {"error": f"Unknown embedding model '{embedding_model}'."}
+    async def events():
+        try:
+            with metrics.trace() as spans:
+                async for event in chatrag_stream(query,
+                        bank_name,
+                        search_limit,
+                        embedding_model,
+                        llm_model,
+                        search_profile,
+                        scoping.search_scope(document, chunk_type, source),
+                        retrieval_mode,
+                        context_tokens):
+                    if event["type"] == "done":
+                        metrics.CHAT_REQUESTS.inc(endpoint="chat_stream", cache=event.get("cache") or "miss")
+                        if debug_timing:
+                            event["timings"] = dict(spans)
+                    yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        except Exception as e:
+            logging.exception("Streaming chat failed")
+            yield f"event: error\ndata: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 if __name__ == "__main__":
     import uvicorn
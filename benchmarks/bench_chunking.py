@@ -0,0 +1,93 @@
+"""
+Chunking throughput: per-line regex classification (the original
+perform_semantic_chunking loop) vs. the single compiled scan in classify_chunks.
+
+    python benchmarks/bench_chunking.py --repeat 200
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from documentsPortal.chunking import classify_chunks
+
+
+DEFAULT_CORPUS = os.path.join("data", "Bank_of_Beirut", "Bank_of_Beirut_Policies.txt")
+
+
+def legacy_classify(chunks: list) -> list:
+    """The nested loop perform_semantic_chunking used before section detection was compiled."""
+    section_patterns = [
+        r"^#+\s+(.+)$",
+        r"^.+\n[=\-]{2,}$",
+        r"^[A-Z\s]+:$",
+    ]
+    labels = []
+    for chunk in chunks:
+        chunk_type = "semantic"
+        for line in chunk.split("\n"):
+            for pattern in section_patterns:
+                if re.match(pattern, line.strip()):
+                    chunk_type = "section_header"
+                    break
+                else:
+                    chunk_type = "semantic"
+        re.findall(r"\b\w+\b", chunk.lower())
+        labels.append(chunk_type)
+    return labels
+
+
+def bench(fn, rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--repeat", type=int, default=100, help="concatenate the corpus this many times")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--chunk-overlap", type=int, default=100)
+    args = parser.parse_args()
+
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        text = "\n\n".join([f.read()] * args.repeat)
+
+    splitter = RecursiveCharacterTextSplitter(
+        separators=["\n\n", "\n", ". ", " ", "", "? "],
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        length_function=len,
+    )
+    chunks = splitter.split_text(text)
+    megabytes = len(text.encode("utf-8")) / 1e6
+
+    split_s = bench(lambda: splitter.split_text(text), args.rounds)
+    legacy_s = bench(lambda: legacy_classify(chunks), args.rounds)
+    compiled_s = bench(lambda: classify_chunks(text, chunks, args.chunk_overlap), args.rounds)
+
+    print(json.dumps({
+        "corpus_mb": round(megabytes, 3),
+        "chunks": len(chunks),
+        "split_seconds": split_s,
+        "legacy_classify_seconds": legacy_s,
+        "compiled_classify_seconds": compiled_s,
+        "legacy_chunking_mb_per_s": megabytes / (split_s + legacy_s),
+        "compiled_chunking_mb_per_s": megabytes / (split_s + compiled_s),
+        "classify_speedup": legacy_s / compiled_s if compiled_s else None,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
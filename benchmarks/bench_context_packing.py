@@ -0,0 +1,100 @@
+"""
+Prompt size and prefill latency with and without context packing.
+
+Questions are taken from --questions (one per line) or built from the first
+sentence of random chunks. Each is retrieved once; the same hits are then
+assembled unpacked (every hit joined, the old behaviour) and packed at each
+--budgets value. Reports estimated context tokens and, with --llm-model,
+Ollama's prompt token count and prefill time for a one-token generation.
+
+    python benchmarks/bench_context_packing.py --bank Bank_of_Beirut --search-limit 10 --llm-model gpt-oss:20b
+"""
+import argparse
+import json
+import os
+import re
+import sys
+
+import numpy as np
+from ollama import chat
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "prompts"))
+
+from databaseHandling.connection_manager import get_manager, DATABASE_NAME
+from embeddingService import model_registry
+from input_embedding import build_messages
+from retrieval import context_packing, federated_search
+
+
+def sample_questions(bank: str, count: int, rng) -> list:
+    with get_manager().client(DATABASE_NAME) as client:
+        rows = client.query(collection_name=bank, filter="chunk_id >= 0", output_fields=["text"], limit=2000)
+    questions = []
+    for i in rng.permutation(len(rows)):
+        sentence = re.split(r"(?<=[.?!])\s", rows[i]["text"].strip(), maxsplit=1)[0]
+        if len(sentence.split()) >= 5:
+            questions.append(sentence[:200])
+        if len(questions) == count:
+            break
+    return questions
+
+
+def prefill(llm_model: str, question: str, context: str) -> dict:
+    response = chat(model=llm_model, messages=build_messages(question, context), options={"num_predict": 1})
+    return {"prompt_tokens": response.get("prompt_eval_count"),
+            "prompt_eval_ms": (response.get("prompt_eval_duration") or 0) / 1e6}
+
+
+def summarize(samples: list) -> dict:
+    summary = {}
+    for key in samples[0]:
+        values = [s[key] for s in samples if isinstance(s.get(key), (int, float))]
+        if values:
+            summary[f"{key}_mean"] = float(np.mean(values))
+            summary[f"{key}_p95"] = float(np.percentile(values, 95))
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bank", required=True)
+    parser.add_argument("--questions", help="file with one question per line")
+    parser.add_argument("--count", type=int, default=30)
+    parser.add_argument("--search-limit", type=int, default=10)
+    parser.add_argument("--budgets", type=int, nargs="*", default=[500, 1000, 1500])
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--llm-model", help="measure Ollama prefill with this model")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    if args.questions:
+        with open(args.questions, "r", encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()][:args.count]
+    else:
+        questions = sample_questions(args.bank, args.count, rng)
+    vectors = model_registry.get_model(args.model).encode(questions, convert_to_numpy=True)
+
+    modes = {"unpacked": 0, **{f"packed_{budget}": budget for budget in args.budgets}}
+    samples = {mode: [] for mode in modes}
+    for question, vector in zip(questions, vectors):
+        hits = federated_search.search_collection(args.bank, vector, args.search_limit,
+                                                  output_fields=context_packing.OUTPUT_FIELDS)
+        for mode, budget in modes.items():
+            packed = context_packing.pack(hits, budget)
+            sample = {key: packed["stats"][key] for key in
+                      ("raw_tokens", "packed_tokens", "tokens_saved", "duplicates_dropped", "chunks_merged",
+                       "blocks_dropped", "pack_ms")}
+            if args.llm_model:
+                sample.update(prefill(args.llm_model, question, packed["text"]))
+            samples[mode].append(sample)
+
+    report = {"bank": args.bank, "questions": len(questions), "search_limit": args.search_limit,
+              "modes": {mode: summarize(values) for mode, values in samples.items()}}
+    get_manager().close()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
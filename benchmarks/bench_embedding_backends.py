@@ -0,0 +1,85 @@
+"""
+Embedding throughput and fidelity of the PyTorch, ONNX and int8 ONNX backends.
+
+Every backend is loaded through embeddingService/backends.py (exporting the
+ONNX models on first use) once per --threads value and encodes --texts
+paragraphs of the Bank_of_Beirut corpus at each --batch-sizes value.
+Throughput is reported in sentences per second (best of --repeats runs).
+Fidelity is the cosine similarity of each backend's embeddings to the
+PyTorch ones on the same texts.
+
+    python benchmarks/bench_embedding_backends.py --threads 1 2 4 8 --batch-sizes 1 8 32 128
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(BENCH_DIR))
+sys.path.append(BENCH_DIR)
+
+import corpora
+from embeddingService import backends
+
+
+def sample_texts(count: int) -> list:
+    paragraphs = [p.strip() for _, text in corpora.documents("scaled", copies=max(1, count // 50 + 1))
+                  for p in text.split("\n") if len(p.strip()) > 20]
+    return [paragraphs[i % len(paragraphs)] for i in range(count)]
+
+
+def throughput(model, texts: list, batch_size: int, repeats: int) -> float:
+    model.encode(texts[:batch_size], batch_size=batch_size)
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+        best = min(best, time.perf_counter() - started)
+    return len(texts) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--backends", nargs="+", choices=backends.BACKENDS, default=list(backends.BACKENDS))
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 0], help="0 = all cores")
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    texts = sample_texts(args.texts)
+    reference = backends.load_model(args.model, "torch").encode(texts, convert_to_numpy=True)
+    report = {"model": args.model, "texts": len(texts), "quantization": backends.QUANTIZATION
+              or backends.default_quantization(), "backends": {}}
+    for backend in args.backends:
+        result = {"throughput": []}
+        for threads in args.threads:
+            threads = threads or os.cpu_count()
+            backends.limit_torch_threads(threads)
+            model = backends.load_model(args.model, backend, threads=threads)
+            if "fidelity" not in result:
+                # load_model falls back to PyTorch when an export fails its fidelity check
+                result["fell_back_to_torch"] = backend != "torch" and not hasattr(model, "fidelity")
+                result["fidelity"] = backends.cosine_agreement(reference, model.encode(texts, convert_to_numpy=True))
+            for batch_size in args.batch_sizes:
+                result["throughput"].append({
+                    "threads": threads,
+                    "batch_size": batch_size,
+                    "sentences_per_second": throughput(model, texts, batch_size, args.repeats),
+                })
+        report["backends"][backend] = result
+
+    base = {(r["threads"], r["batch_size"]): r["sentences_per_second"]
+            for r in report["backends"].get("torch", {}).get("throughput", [])}
+    for result in report["backends"].values():
+        for row in result["throughput"]:
+            if (row["threads"], row["batch_size"]) in base:
+                row["speedup_vs_torch"] = row["sentences_per_second"] / base[(row["threads"], row["batch_size"])]
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Re-embedding cost with and without the on-disk embedding cache.
+
+Chunks the --corpus (see corpora.py) into paragraphs and embeds them three
+times into a scratch cache directory:
+
+  cold      empty cache: every text is encoded and stored
+  warm      same process, every text served from the cache
+  restart   a new cache instance on the same files, as after a restart
+
+    python benchmarks/bench_embedding_cache.py --corpus scaled --copies 50
+    python benchmarks/bench_embedding_cache.py --embedder hash   # offline
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(BENCH_DIR))
+sys.path.append(BENCH_DIR)
+
+import corpora
+from embeddingService import model_registry
+from embeddingService.embedding_cache import EmbeddingCache
+
+
+def paragraphs(corpus: str, copies: int) -> list:
+    return [p.strip() for _, text in corpora.documents(corpus, copies)
+            for p in text.split("\n") if len(p.strip()) > 20]
+
+
+def timed_pass(cache: EmbeddingCache, texts: list, model_name: str, batch_size: int) -> dict:
+    started = time.perf_counter()
+    vectors = [cache.encode(texts[i:i + batch_size], model_name) for i in range(0, len(texts), batch_size)]
+    seconds = time.perf_counter() - started
+    return {"seconds": seconds, "texts_per_second": len(texts) / seconds, "vectors": np.concatenate(vectors)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", choices=corpora.CORPORA, default="scaled")
+    parser.add_argument("--copies", type=int, default=20)
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--embedder", choices=("model", "hash"), default="model")
+    parser.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args()
+
+    if args.embedder == "hash":
+        from bench_end_to_end import HashEmbedder
+        model_registry.register_model(args.model, HashEmbedder())
+    model_registry.get_model(args.model)
+
+    texts = paragraphs(args.corpus, args.copies)
+    directory = tempfile.mkdtemp(prefix="embedding-cache-")
+    try:
+        cache = EmbeddingCache(directory)
+        cold = timed_pass(cache, texts, args.model, args.batch_size)
+        warm = timed_pass(cache, texts, args.model, args.batch_size)
+        stats = cache.stats()["models"][args.model]
+        cache.close()
+        restart = timed_pass(EmbeddingCache(directory), texts, args.model, args.batch_size)
+        disk = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    report = {
+        "texts": len(texts),
+        "unique_texts": len(set(texts)),
+        "model": args.model,
+        "embedder": args.embedder,
+        "cache_bytes_on_disk": disk,
+        "hit_rate_after_warm": stats["hit_rate"],
+        "identical_vectors": bool(np.array_equal(cold["vectors"], warm["vectors"])
+                                  and np.array_equal(cold["vectors"], restart["vectors"])),
+    }
+    for name, result in (("cold", cold), ("warm", warm), ("restart", restart)):
+        report[name] = {"seconds": result["seconds"], "texts_per_second": result["texts_per_second"]}
+    report["warm_speedup"] = cold["seconds"] / warm["seconds"]
+    report["restart_speedup"] = cold["seconds"] / restart["seconds"]
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
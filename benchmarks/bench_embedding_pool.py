@@ -0,0 +1,95 @@
+"""
+Bulk embedding throughput of the multi-process embedding pool.
+
+Encodes --texts paragraphs of the Bank_of_Beirut corpus in-process (one
+model.encode call, as bulk reindexing did before the pool) and then through
+embeddingService/embedding_pool.py with each --workers count. Every pool
+run is checked against the in-process embeddings, so results that come back
+out of order or from a different model show up as a low cosine. With
+--compare-unsorted each pool also encodes the texts without sorting them,
+to show how much length sorting saves on padding.
+
+    python benchmarks/bench_embedding_pool.py --workers 1 2 4 8 --texts 4096
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(BENCH_DIR))
+sys.path.append(BENCH_DIR)
+
+from bench_embedding_backends import sample_texts
+from embeddingService import backends, embedding_pool
+
+
+def timed(encode, texts: list, repeats: int):
+    best, vectors = float("inf"), None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        vectors = encode(texts)
+        best = min(best, time.perf_counter() - started)
+    return best, vectors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--backend", choices=backends.BACKENDS, default=backends.BACKEND)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--texts", type=int, default=2048)
+    parser.add_argument("--texts-per-task", type=int, default=embedding_pool.TEXTS_PER_TASK)
+    parser.add_argument("--batch-size", type=int, default=embedding_pool.ENCODE_BATCH_SIZE)
+    parser.add_argument("--max-worker-mb", type=float, default=embedding_pool.MAX_WORKER_MB)
+    parser.add_argument("--repeats", type=int, default=2)
+    parser.add_argument("--compare-unsorted", action="store_true")
+    args = parser.parse_args()
+
+    texts = sample_texts(args.texts)
+    model = backends.load_model(args.model, args.backend)
+    seconds, reference = timed(lambda batch: model.encode(batch, batch_size=args.batch_size, convert_to_numpy=True),
+                               texts, args.repeats)
+    report = {
+        "model": args.model,
+        "backend": args.backend,
+        "texts": len(texts),
+        "cpu_count": os.cpu_count(),
+        "in_process": {"seconds": seconds, "texts_per_second": len(texts) / seconds},
+        "pool": [],
+    }
+
+    for workers in args.workers:
+        started = time.perf_counter()
+        pool = embedding_pool.EmbeddingPool(args.model, workers=workers, texts_per_task=args.texts_per_task,
+                                            batch_size=args.batch_size, max_worker_mb=args.max_worker_mb,
+                                            backend=args.backend)
+        startup = time.perf_counter() - started
+        try:
+            seconds, vectors = timed(pool.encode, texts, args.repeats)
+            result = {
+                "workers": workers,
+                "threads_per_worker": pool.threads,
+                "startup_seconds": startup,
+                "seconds": seconds,
+                "texts_per_second": len(texts) / seconds,
+                "speedup_vs_in_process": report["in_process"]["seconds"] / seconds,
+                "agreement": backends.cosine_agreement(reference, vectors),
+            }
+            if args.compare_unsorted:
+                unsorted, _ = timed(lambda batch: pool.encode(batch, sort=False), texts, args.repeats)
+                result["unsorted_seconds"] = unsorted
+                result["sorting_speedup"] = unsorted / seconds
+            stats = pool.stats()
+            result["worker_rss_mb"] = sorted(stats["worker_rss_mb"].values())
+            result["recycled"] = stats["recycled"]
+            result["restarts"] = stats["restarts"]
+        finally:
+            pool.close()
+        report["pool"].append(result)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
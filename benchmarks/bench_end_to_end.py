@@ -0,0 +1,439 @@
+"""
+End-to-end ingestion and chat benchmark that runs offline on a CPU-only box.
+
+Everything the pipeline talks to is replaced by a local stand-in: the vector
+store is the embedded one (VECTOR_STORE=local, see databaseHandling/local_store.py),
+Ollama is benchmarks/fake_ollama.py with a configurable first-token delay and
+token rate, and with --embedder hash the sentence-transformers model is a
+feature-hashing encoder so no model has to be downloaded. All state lives
+in a scratch --workdir.
+
+  1. ingestion  the corpus (see corpora.py) is uploaded and processed through
+                the ingestion job queue; documents, chunks/s and per-stage
+                job times are reported
+  2. chat       --requests questions are asked at every --concurrency level
+                (closed loop: each worker sends its next question when the
+                previous answer has finished streaming)
+
+--target inprocess drives chatrag_stream and the job queue directly;
+--target http starts the FastAPI app under uvicorn and goes through
+/documents -> /documents/{name}/process -> /jobs/{id} -> /chat/{query}/stream.
+The JSON report has p50/p95/p99 latency and time to first token, QPS, peak
+RSS per phase and the per-request stage breakdown (monitoring/metrics.py).
+
+    python benchmarks/bench_end_to_end.py --corpus scaled --copies 20 --concurrency 1 4 16 --requests 200
+    python benchmarks/bench_end_to_end.py --target http --tokens-per-second 80 --first-token-ms 300
+"""
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import json
+import os
+import re
+import resource
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import quote
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "prompts"))
+sys.path.append(BENCH_DIR)
+
+import corpora
+from fake_ollama import FakeOllama
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+
+class HashEmbedder:
+    """Signed feature hashing of word unigrams and bigrams; stands in for a SentenceTransformer."""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def _vector(self, text: str):
+        vector = np.zeros(self.dim, dtype="float32")
+        words = re.findall(r"\w+", text.lower())
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dim] += 1.0 if value >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def encode(self, sentences, convert_to_numpy: bool = True, **kwargs):
+        single = isinstance(sentences, str)
+        vectors = np.stack([self._vector(text) for text in ([sentences] if single else sentences)])
+        return vectors[0] if single else vectors
+
+
+class PeakRSS:
+    """Samples the resident set size in a background thread; `peak_mb` is the maximum seen."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def current_mb() -> float:
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+        except OSError:
+            # no procfs: fall back to the lifetime peak (KiB on Linux, bytes on macOS)
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, self.current_mb())
+
+    def __enter__(self):
+        self.peak_mb = self.current_mb()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, self.current_mb())
+
+
+def distribution(values) -> dict:
+    values = [v for v in values if v is not None]
+    if not values:
+        return {}
+    return {
+        "mean": float(np.mean(values)),
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "p99": float(np.percentile(values, 99)),
+        "max": float(np.max(values)),
+    }
+
+
+def stage_breakdown(traces: list) -> dict:
+    per_stage = defaultdict(list)
+    for spans in traces:
+        for name, ms in spans.items():
+            per_stage[name].append(ms)
+    return {name: distribution(values) for name, values in sorted(per_stage.items())}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# ---------------------------------------------------------------- in-process target
+
+class InProcessTarget:
+    def __init__(self, bank: str):
+        from documentsPortal import documents_portal, ingestion_jobs
+        from databaseHandling.connection_manager import get_manager
+
+        self.bank = bank
+        self.manager = get_manager()
+        self.manager.start()
+        self.queue = ingestion_jobs.IngestionQueue(
+            store=ingestion_jobs.JobStore(os.environ["INGESTION_JOBS_DB"]),
+            run_job=documents_portal.run_ingestion_job,
+        )
+        self.queue.start()
+
+    async def submit(self, path: str) -> str:
+        from retrieval import scoping
+        return self.queue.submit(file_path=path, bank_name=self.bank, partition_name=scoping.partition_for(path))
+
+    async def job(self, job_id: str) -> dict:
+        return self.queue.store.get(job_id)
+
+    async def chat(self, query: str, options: dict) -> dict:
+        from input_embedding import chatrag_stream
+        from monitoring import metrics
+
+        started = time.perf_counter()
+        first_token = None
+        with metrics.trace() as spans:
+            async for event in chatrag_stream(query, self.bank, **options):
+                if event["type"] == "token" and first_token is None:
+                    first_token = time.perf_counter()
+                elif event["type"] == "done":
+                    done = event
+        return {"latency_ms": (time.perf_counter() - started) * 1000,
+                "ttft_ms": (first_token - started) * 1000 if first_token else None,
+                "cache": done.get("cache"), "timings": dict(spans)}
+
+    def close(self):
+        from embeddingService import micro_batcher
+        self.queue.shutdown(wait=True)
+        micro_batcher.close_all()
+        self.manager.close()
+
+
+# ---------------------------------------------------------------- HTTP target
+
+class HttpTarget:
+    def __init__(self, bank: str, concurrency: int):
+        import httpx
+        import uvicorn
+        from api.app import app
+
+        self.bank = bank
+        port = free_port()
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+        self.base_url = f"http://127.0.0.1:{port}"
+        self.limits = httpx.Limits(max_connections=concurrency + 4)
+        self.client = None
+        self.bank_set = False
+
+    def _client(self):
+        import httpx
+        if self.client is None:
+            self.client = httpx.AsyncClient(base_url=self.base_url, limits=self.limits, timeout=None)
+        return self.client
+
+    async def submit(self, path: str) -> str:
+        client = self._client()
+        if not self.bank_set:
+            (await client.post("/bankname", data={"bank_name": self.bank})).raise_for_status()
+            self.bank_set = True
+        name = os.path.basename(path)
+        with open(path, "rb") as f:
+            (await client.post("/documents", files={"file": (name, f, "text/plain")})).raise_for_status()
+        response = (await client.get(f"/documents/{name}/process")).json()
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response["job_id"]
+
+    async def job(self, job_id: str) -> dict:
+        return (await self._client().get(f"/jobs/{job_id}")).json()
+
+    async def chat(self, query: str, options: dict) -> dict:
+        params = {"bank_name": self.bank, **{k: v for k, v in options.items() if v is not None}}
+        started = time.perf_counter()
+        first_token, done = None, {}
+        async with self._client().stream("GET", f"/chat/{quote(query, safe='')}/stream", params=params,
+                                         headers={"X-Debug-Timing": "1"}) as response:
+            event = None
+            async for line in response.aiter_lines():
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                    if event == "token" and first_token is None:
+                        first_token = time.perf_counter()
+                elif line.startswith("data: ") and event in ("done", "error"):
+                    done = json.loads(line[len("data: "):])
+                    if event == "error":
+                        raise RuntimeError(done.get("error"))
+        return {"latency_ms": (time.perf_counter() - started) * 1000,
+                "ttft_ms": (first_token - started) * 1000 if first_token else None,
+                "cache": done.get("cache"), "timings": done.get("timings", {})}
+
+    def close(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+# ---------------------------------------------------------------- phases
+
+async def run_ingestion(target, paths: list, poll_seconds: float = 0.02) -> dict:
+    started = time.perf_counter()
+    submitted = {}
+    for path in paths:
+        submitted[await target.submit(path)] = time.perf_counter()
+    finished, jobs = {}, {}
+    while len(jobs) < len(submitted):
+        for job_id in submitted:
+            if job_id in jobs:
+                continue
+            job = await target.job(job_id)
+            if job["status"] in ("done", "failed"):
+                finished[job_id] = time.perf_counter()
+                jobs[job_id] = job
+        await asyncio.sleep(poll_seconds)
+    wall = time.perf_counter() - started
+
+    done = [job for job in jobs.values() if job["status"] == "done"]
+    chunks = sum((job["result"] or {}).get("chunks_total", 0) for job in done)
+    stage_seconds, wait_seconds = defaultdict(list), defaultdict(list)
+    for job in done:
+        for name, stage in job["stages"].items():
+            if stage.get("seconds") is not None:
+                stage_seconds[name].append(stage["seconds"] * 1000)
+            if stage.get("wait_seconds") is not None:
+                wait_seconds[name].append(stage["wait_seconds"] * 1000)
+    return {
+        "documents": len(paths),
+        "failed": len(jobs) - len(done),
+        "errors": sorted({job["error"] for job in jobs.values() if job.get("error")})[:5],
+        "chunks": chunks,
+        "wall_seconds": wall,
+        "documents_per_second": len(done) / wall if wall else None,
+        "chunks_per_second": chunks / wall if wall else None,
+        "job_latency_ms": distribution([(finished[j] - submitted[j]) * 1000 for j in jobs]),
+        "stages_ms": {name: distribution(values) for name, values in sorted(stage_seconds.items())},
+        "stage_wait_ms": {name: distribution(values) for name, values in sorted(wait_seconds.items())},
+    }
+
+
+async def run_chat(target, questions: list, concurrency: int, options: dict) -> dict:
+    pending = list(reversed(questions))
+    results, errors = [], []
+
+    async def worker():
+        while pending:
+            query = pending.pop()
+            try:
+                results.append(await target.chat(query, options))
+            except Exception as e:
+                errors.append(str(e))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+    caches = defaultdict(int)
+    for result in results:
+        caches[result["cache"] or "miss"] += 1
+    return {
+        "concurrency": concurrency,
+        "requests": len(questions),
+        "errors": len(errors),
+        "error_samples": sorted(set(errors))[:5],
+        "wall_seconds": wall,
+        "qps": len(results) / wall if wall else None,
+        "latency_ms": distribution([r["latency_ms"] for r in results]),
+        "time_to_first_token_ms": distribution([r["ttft_ms"] for r in results]),
+        "cache": dict(caches),
+        "stages_ms": stage_breakdown([r["timings"] for r in results]),
+    }
+
+
+async def run(args, paths: list, fake) -> dict:
+    if args.target == "http":
+        target = HttpTarget(args.bank, max(args.concurrency))
+    else:
+        target = InProcessTarget(args.bank)
+    report = {"phases": {}}
+    try:
+        with PeakRSS() as rss:
+            report["phases"]["ingestion"] = await run_ingestion(target, paths)
+        report["phases"]["ingestion"]["rss_peak_mb"] = rss.peak_mb
+
+        options = {
+            "search_limit": args.search_limit,
+            "embedding_model": EMBEDDING_MODEL,
+            "llm_model": args.llm_model,
+            "retrieval_mode": args.retrieval_mode,
+            "context_tokens": args.context_tokens,
+        }
+        if args.warmup:
+            await run_chat(target, corpora.questions(args.warmup, seed=args.seed + 1), 1, options)
+        report["phases"]["chat"] = []
+        for concurrency in args.concurrency:
+            before = fake.stats()
+            with PeakRSS() as rss:
+                level = await run_chat(target, corpora.questions(args.requests, seed=args.seed), concurrency, options)
+            after = fake.stats()
+            level["rss_peak_mb"] = rss.peak_mb
+            level["llm"] = {key: after[key] - before[key] for key in after}
+            report["phases"]["chat"].append(level)
+    finally:
+        if isinstance(target, HttpTarget) and target.client is not None:
+            await target.client.aclose()
+        target.close()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=("inprocess", "http"), default="inprocess")
+    parser.add_argument("--corpus", choices=corpora.CORPORA, default="sections")
+    parser.add_argument("--copies", type=int, default=10, help="variants per section for --corpus scaled")
+    parser.add_argument("--bank", default="Bank_of_Beirut")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=100, help="questions per concurrency level")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--search-limit", type=int, default=5)
+    parser.add_argument("--retrieval-mode", choices=("vector", "hybrid"), default="hybrid")
+    parser.add_argument("--context-tokens", type=int, default=1500)
+    parser.add_argument("--llm-model", default="gpt-oss:latest")
+    parser.add_argument("--embedder", default="hash",
+                        help=f"'hash' for the offline stand-in, 'model' to load {EMBEDDING_MODEL}")
+    parser.add_argument("--answer-cache", action="store_true", help="keep the answer cache on (off by default)")
+    parser.add_argument("--tokens-per-second", type=float, default=40.0)
+    parser.add_argument("--first-token-ms", type=float, default=150.0)
+    parser.add_argument("--prefill-tokens-per-second", type=float, default=2000.0)
+    parser.add_argument("--completion-tokens", type=int, default=64)
+    parser.add_argument("--llm-parallel", type=int, default=4, help="requests the fake LLM serves at once")
+    parser.add_argument("--workdir", help="scratch directory (default: a temporary one, removed afterwards)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="ragflow-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    fake = FakeOllama(tokens_per_second=args.tokens_per_second, first_token_ms=args.first_token_ms,
+                      prefill_tokens_per_second=args.prefill_tokens_per_second,
+                      completion_tokens=args.completion_tokens, parallel=args.llm_parallel).start()
+
+    # module-level settings are read at import time, so configure before importing the pipeline
+    os.environ.update({
+        "VECTOR_STORE": "local",
+        "LOCAL_VECTOR_STORE_PATH": os.path.join(workdir, "vector_store"),
+        "BM25_INDEX_DIR": os.path.join(workdir, "bm25"),
+        "INGESTION_JOBS_DB": os.path.join(workdir, "ingestion_jobs.sqlite3"),
+        "OLLAMA_HOST": fake.url,
+    })
+    if not args.answer_cache:
+        os.environ["ANSWER_CACHE_TTL_SECONDS"] = "0"
+    # the app writes uploads under ./uploaded_files
+    os.chdir(workdir)
+
+    from embeddingService import model_registry
+    if args.embedder == "hash":
+        model_registry.register_model(EMBEDDING_MODEL, HashEmbedder())
+
+    paths = corpora.write_corpus(args.corpus, os.path.join(workdir, "corpus"), args.copies, args.seed)
+    try:
+        # the pipeline prints progress; keep stdout for the report
+        with contextlib.redirect_stdout(sys.stderr):
+            report = asyncio.run(run(args, paths, fake))
+    finally:
+        fake.stop()
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report["config"] = {key: value for key, value in vars(args).items() if key != "output"}
+    report["config"]["corpus_documents"] = len(paths)
+    report["rss_peak_mb"] = max([report["phases"]["ingestion"]["rss_peak_mb"]] +
+                                [level["rss_peak_mb"] for level in report["phases"]["chat"]])
+    text = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Hybrid (vector + BM25 via RRF) retrieval vs. vector search with an inflated k.
+
+Builds exact-token queries from the collection itself: for sampled chunks it
+picks a rare token (a fee code, product or card name that appears in few
+chunks) and asks about it, so the chunk holding that token is the answer.
+Every query is then run three ways and the report gives hit rate (target
+chunk retrieved), context size in words and latency percentiles:
+
+  vector     top-k vector search
+  inflated   top-(k * inflate) vector search, the current workaround
+  hybrid     top-k after fusing vector and BM25 candidates
+
+    python benchmarks/bench_hybrid_retrieval.py --collection Bank_of_Beirut --queries 100 --backfill
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from databaseHandling.connection_manager import get_manager, DATABASE_NAME
+from embeddingService import model_registry
+from retrieval import federated_search, hybrid_search, lexical_index, search_cache
+
+
+def fetch_chunks(client, collection_name: str, max_rows: int) -> list:
+    rows = []
+    iterator = client.query_iterator(
+        collection_name=collection_name,
+        batch_size=1000,
+        limit=max_rows,
+        filter="chunk_id >= 0",
+        output_fields=["chunk_id", "text"],
+    )
+    try:
+        while True:
+            batch = iterator.next()
+            if not batch:
+                break
+            rows.extend(batch)
+    finally:
+        iterator.close()
+    return rows
+
+
+def exact_token_queries(rows: list, count: int, max_df: int, rng) -> list:
+    """(query, target chunk_id) pairs built around tokens that occur in at most `max_df` chunks."""
+    tokens_per_row = [set(lexical_index.tokenize(row["text"])) for row in rows]
+    df = Counter(token for tokens in tokens_per_row for token in tokens)
+    queries = []
+    for i in rng.permutation(len(rows)):
+        rare = [t for t in tokens_per_row[i] if df[t] <= max_df and len(t) > 3 and not t.isdigit()]
+        if not rare:
+            continue
+        # prefer code-like tokens (digits, dashes) over plain rare words
+        rare.sort(key=lambda t: (not any(c.isdigit() or c in "-_." for c in t), df[t], t))
+        queries.append((f"What does the bank say about {rare[0]}?", rows[i]["chunk_id"]))
+        if len(queries) == count:
+            break
+    return queries
+
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q) * 1000) if samples else None
+
+
+def run_mode(collection_name: str, queries: list, vectors, limit: int, profile: str, query_text: bool) -> dict:
+    # start from a cold search cache for every mode
+    search_cache.bump_version(collection_name)
+    latencies, found, words = [], [], []
+    for (query, target), vector in zip(queries, vectors):
+        start = time.perf_counter()
+        if query_text:
+            hits = hybrid_search.search_collection(collection_name, vector, limit, profile, query_text=query)
+        else:
+            hits = federated_search.search_collection(collection_name, vector, limit, profile)
+        latencies.append(time.perf_counter() - start)
+        found.append(any(hit["id"] == target for hit in hits))
+        words.append(sum(len((hit["entity"].get("text") or "").split()) for hit in hits))
+    return {
+        "k": limit,
+        "hit_rate": float(np.mean(found)),
+        "context_words_mean": float(np.mean(words)),
+        "p50_ms": percentile_ms(latencies, 50),
+        "p95_ms": percentile_ms(latencies, 95),
+        "p99_ms": percentile_ms(latencies, 99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--collection", required=True)
+    parser.add_argument("--database", default=DATABASE_NAME)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--inflate", type=int, default=4, help="k multiplier for the inflated vector search")
+    parser.add_argument("--max-df", type=int, default=3, help="a query token occurs in at most this many chunks")
+    parser.add_argument("--max-rows", type=int, default=200000)
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--profile", default="balanced")
+    parser.add_argument("--backfill", action="store_true", help="(re)build the BM25 index from Milvus first")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    manager = get_manager()
+    with manager.client(args.database) as client:
+        if args.backfill:
+            start = time.perf_counter()
+            indexed = lexical_index.backfill(client, args.collection)
+            print(f"Indexed {indexed} chunks in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+        rows = fetch_chunks(client, args.collection, args.max_rows)
+
+    queries = exact_token_queries(rows, args.queries, args.max_df, rng)
+    if not queries:
+        print(json.dumps({"error": "no chunk has a rare enough token"}))
+        return
+    vectors = model_registry.get_model(args.model).encode([q for q, _ in queries], convert_to_numpy=True)
+
+    report = {
+        "collection": args.collection,
+        "chunks": len(rows),
+        "queries": len(queries),
+        "lexical_index": lexical_index.get_index(args.collection).stats(),
+        "vector": run_mode(args.collection, queries, vectors, args.k, args.profile, query_text=False),
+        "inflated": run_mode(args.collection, queries, vectors, args.k * args.inflate, args.profile,
+                             query_text=False),
+        "hybrid": run_mode(args.collection, queries, vectors, args.k, args.profile, query_text=True),
+    }
+    manager.close()
+    print(json.dumps(report, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Search latency with and without partition / metadata scoping.
+
+For every partition of a collection, samples stored vectors as queries and
+times the same search three ways: over the whole collection, restricted to
+that partition (`partition_names`), and restricted by a scalar filter on the
+chunk's `source`. Reports per-mode latency percentiles and how many of the
+unscoped top-k hits came from outside the partition, i.e. what scoping
+keeps out of the context.
+
+    python benchmarks/bench_partition_scoping.py --collection Bank_of_Beirut --queries 100
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from databaseHandling.connection_manager import get_manager, DATABASE_NAME
+from retrieval.scoping import filter_expression
+from retrieval.search_profiles import resolve
+
+
+def sample_partition(client, collection_name: str, partition_name: str, count: int):
+    rows = client.query(
+        collection_name=collection_name,
+        partition_names=[partition_name],
+        filter="chunk_id >= 0",
+        output_fields=["embedding", "source"],
+        limit=count,
+    )
+    return rows
+
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q) * 1000) if samples else None
+
+
+def timed_search(client, collection_name: str, query, search_param: dict, k: int, **scope):
+    start = time.perf_counter()
+    hits = client.search(
+        collection_name=collection_name,
+        data=[query],
+        anns_field="embedding",
+        search_params=search_param,
+        limit=k,
+        output_fields=["source"],
+        **scope,
+    )[0]
+    return time.perf_counter() - start, hits
+
+
+def bench_partition(client, collection_name: str, partition_name: str, args) -> dict:
+    rows = sample_partition(client, collection_name, partition_name, args.queries)
+    if not rows:
+        return {"error": "partition is empty"}
+    search_param = resolve(client, collection_name, args.profile, args.k)
+    modes = {"unscoped": [], "partition": [], "source_filter": []}
+    foreign_hits = []
+    for row in rows:
+        query = row["embedding"]
+        elapsed, hits = timed_search(client, collection_name, query, search_param, args.k)
+        modes["unscoped"].append(elapsed)
+        foreign_hits.append(sum(hit["entity"]["source"] != row["source"] for hit in hits) / max(1, len(hits)))
+
+        elapsed, _ = timed_search(client, collection_name, query, search_param, args.k,
+                                  partition_names=[partition_name])
+        modes["partition"].append(elapsed)
+
+        elapsed, _ = timed_search(client, collection_name, query, search_param, args.k,
+                                  filter=filter_expression(source=row["source"]))
+        modes["source_filter"].append(elapsed)
+
+    report = {
+        "queries": len(rows),
+        "unscoped_hits_from_other_documents": float(np.mean(foreign_hits)),
+    }
+    for mode, latencies in modes.items():
+        report[mode] = {
+            "p50_ms": percentile_ms(latencies, 50),
+            "p95_ms": percentile_ms(latencies, 95),
+            "p99_ms": percentile_ms(latencies, 99),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--collection", required=True)
+    parser.add_argument("--database", default=DATABASE_NAME)
+    parser.add_argument("--partitions", nargs="*", help="defaults to every partition except _default")
+    parser.add_argument("--queries", type=int, default=50, help="queries per partition")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--profile", default="balanced")
+    args = parser.parse_args()
+
+    manager = get_manager()
+    with manager.client(args.database) as client:
+        partitions = args.partitions or [
+            name for name in client.list_partitions(collection_name=args.collection) if name != "_default"
+        ]
+        report = {
+            "collection": args.collection,
+            "rows": client.get_collection_stats(collection_name=args.collection).get("row_count"),
+            "partitions": {name: bench_partition(client, args.collection, name, args) for name in partitions},
+        }
+    manager.close()
+    print(json.dumps(report, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Recall vs. latency of the search profiles against an exact (FLAT) ground truth.
+
+For each bank collection, pulls the stored vectors out of Milvus, builds
+query vectors by perturbing a random sample of them, computes the exact
+top-k with NumPy using the collection's metric, then runs every profile
+through Milvus and reports recall@k and per-query latency percentiles.
+
+    python benchmarks/bench_search_profiles.py --collections Bank_of_Beirut --queries 200
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from databaseHandling.connection_manager import get_manager, DATABASE_NAME
+from databaseHandling.index_manager import get_index_manager
+from retrieval.search_profiles import PROFILES, profile_params, higher_is_better
+
+
+def fetch_vectors(client, collection_name: str, max_rows: int):
+    ids, vectors = [], []
+    iterator = client.query_iterator(
+        collection_name=collection_name,
+        batch_size=1000,
+        limit=max_rows,
+        filter="chunk_id >= 0",
+        output_fields=["chunk_id", "embedding"],
+    )
+    try:
+        while True:
+            batch = iterator.next()
+            if not batch:
+                break
+            for row in batch:
+                ids.append(row["chunk_id"])
+                vectors.append(row["embedding"])
+    finally:
+        iterator.close()
+    return np.asarray(ids), np.asarray(vectors, dtype="float32")
+
+
+def exact_top_k(vectors, queries, k: int, metric_type: str):
+    if (metric_type or "").upper() == "COSINE":
+        vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    if higher_is_better(metric_type):
+        scores = queries @ vectors.T
+    else:
+        scores = -(
+            (queries ** 2).sum(axis=1, keepdims=True) - 2 * queries @ vectors.T + (vectors ** 2).sum(axis=1)
+        )
+    k = min(k, vectors.shape[0])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return top
+
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q) * 1000) if samples else None
+
+
+def bench_collection(client, collection_name: str, args, rng) -> dict:
+    spec = get_index_manager().describe(client, collection_name)
+    if spec is None:
+        return {"error": "collection has no index"}
+    ids, vectors = fetch_vectors(client, collection_name, args.max_rows)
+    if len(ids) == 0:
+        return {"error": "collection is empty"}
+
+    sample = rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+    queries = vectors[sample] + rng.normal(0, args.noise, size=(len(sample), vectors.shape[1])).astype("float32")
+    truth = [set(ids[row]) for row in exact_top_k(vectors, queries, args.k, spec["metric_type"])]
+
+    report = {"index": spec, "rows": int(len(ids)), "queries": int(len(queries)), "profiles": {}}
+    for profile in PROFILES:
+        search_param = profile_params(spec, profile, args.k)
+        latencies, recalls = [], []
+        for query, expected in zip(queries, truth):
+            start = time.perf_counter()
+            hits = client.search(
+                collection_name=collection_name,
+                data=[query.tolist()],
+                anns_field="embedding",
+                search_params=search_param,
+                limit=args.k,
+            )[0]
+            latencies.append(time.perf_counter() - start)
+            found = {hit["id"] for hit in hits}
+            recalls.append(len(found & expected) / len(expected))
+        report["profiles"][profile] = {
+            "search_param": search_param,
+            f"recall@{args.k}": float(np.mean(recalls)),
+            "p50_ms": percentile_ms(latencies, 50),
+            "p95_ms": percentile_ms(latencies, 95),
+            "p99_ms": percentile_ms(latencies, 99),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--collections", nargs="*", help="defaults to every collection in the database")
+    parser.add_argument("--database", default=DATABASE_NAME)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--noise", type=float, default=0.02, help="std-dev of the perturbation added to queries")
+    parser.add_argument("--max-rows", type=int, default=200000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    manager = get_manager()
+    with manager.client(args.database) as client:
+        collections = args.collections or client.list_collections()
+        report = {name: bench_collection(client, name, args, rng) for name in collections}
+    manager.close()
+    print(json.dumps(report, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Embedding work saved by structure-aware chunking.
+
+Chunks a document with the recursive character splitter (chunk_size=500,
+chunk_overlap=100) and with the structured chunker, and reports for each:
+stored vectors, embedded characters, characters embedded more than once
+because of overlap, and embedding tokens as the model's tokenizer counts them.
+
+    python benchmarks/bench_structured_chunking.py
+    python benchmarks/bench_structured_chunking.py --approx-tokens   # no model download
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from documentsPortal.chunking import chunk_text
+
+
+DEFAULT_CORPUS = os.path.join("data", "Bank_of_Beirut", "Bank_of_Beirut_Policies.txt")
+
+
+def token_counter(model_name: str, approximate: bool):
+    if approximate:
+        return lambda text: len(text.split())
+    from embeddingService import model_registry
+    model = model_registry.get_model(model_name)
+    max_tokens = model.max_seq_length
+    # the model truncates anything longer, so that is all it ever embeds
+    return lambda text: min(len(model.tokenizer(text)["input_ids"]), max_tokens)
+
+
+def measure(text: str, chunks: list, count_tokens) -> dict:
+    covered = bytearray(len(text))
+    for _, meta in chunks:
+        covered[meta["start_offset"]:meta["end_offset"]] = b"\x01" * (meta["end_offset"] - meta["start_offset"])
+    embedded_chars = sum(len(chunk) for chunk, _ in chunks)
+    return {
+        "vectors": len(chunks),
+        "embedded_chars": embedded_chars,
+        "duplicated_chars": embedded_chars - sum(covered),
+        "embedding_tokens": sum(count_tokens(chunk) for chunk, _ in chunks),
+        "mean_chunk_chars": embedded_chars / len(chunks) if chunks else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--chunk-overlap", type=int, default=100)
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--approx-tokens", action="store_true", help="count whitespace tokens instead of model tokens")
+    args = parser.parse_args()
+
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        text = f.read()
+
+    splitter = RecursiveCharacterTextSplitter(
+        separators=["\n\n", "\n", ". ", " ", "", "? "],
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        length_function=len,
+    )
+    count_tokens = token_counter(args.model, args.approx_tokens)
+
+    report = {}
+    for mode in ("recursive", "structured"):
+        chunks = chunk_text(text, splitter, args.chunk_size, args.chunk_overlap, mode=mode)
+        report[mode] = measure(text, chunks, count_tokens)
+
+    baseline, structured = report["recursive"], report["structured"]
+    report["saved"] = {
+        "vectors": baseline["vectors"] - structured["vectors"],
+        "embedding_tokens": baseline["embedding_tokens"] - structured["embedding_tokens"],
+        "embedding_tokens_pct": 100.0 * (1 - structured["embedding_tokens"] / baseline["embedding_tokens"])
+        if baseline["embedding_tokens"] else 0.0,
+    }
+    report["corpus"] = args.corpus
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
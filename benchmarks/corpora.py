@@ -0,0 +1,105 @@
+"""
+Benchmark corpora and questions derived from data/Bank_of_Beirut.
+
+  policies   the policy file as a single document
+  sections   one document per section of the policy file
+  scaled     `copies` variants of every section, each with its sentences in a
+             different order, so every variant chunks and hashes differently
+
+    python benchmarks/corpora.py --corpus scaled --copies 20 --out /tmp/corpus
+"""
+import argparse
+import json
+import os
+import random
+import re
+
+
+SOURCE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                      "data", "Bank_of_Beirut", "Bank_of_Beirut_Policies.txt")
+CORPORA = ("policies", "sections", "scaled")
+
+
+def load_source(path: str = SOURCE) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def sections(text: str) -> list:
+    """(heading, body) pairs; sections are separated by runs of blank lines."""
+    result = []
+    for block in re.split(r"\n\s*\n\s*\n+", text):
+        lines = [line.strip() for line in block.strip().splitlines() if line.strip()]
+        if len(lines) >= 2:
+            result.append((lines[0], "\n".join(lines[1:])))
+    return result
+
+
+def _slug(heading: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", heading).strip("_")[:60] or "section"
+
+
+def _shuffled(body: str, rng) -> str:
+    sentences = re.split(r"(?<=[.;:])\s+", body)
+    rng.shuffle(sentences)
+    return " ".join(sentences)
+
+
+def documents(corpus: str, copies: int = 10, seed: int = 0) -> list:
+    """(file name, text) pairs for `corpus`."""
+    text = load_source()
+    if corpus == "policies":
+        return [(os.path.basename(SOURCE), text)]
+    parts = sections(text)
+    if corpus == "sections":
+        return [(f"{i:03d}_{_slug(heading)}.txt", f"{heading}\n{body}") for i, (heading, body) in enumerate(parts)]
+    if corpus == "scaled":
+        rng = random.Random(seed)
+        return [(f"{copy:03d}_{i:03d}_{_slug(heading)}.txt", f"{heading}\n{_shuffled(body, rng)}")
+                for copy in range(copies) for i, (heading, body) in enumerate(parts)]
+    raise ValueError(f"Unknown corpus '{corpus}'. Expected one of {CORPORA}.")
+
+
+def write_corpus(corpus: str, out_dir: str, copies: int = 10, seed: int = 0) -> list:
+    """Write the corpus as .txt files under `out_dir` and return their paths."""
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for name, text in documents(corpus, copies, seed):
+        path = os.path.join(out_dir, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        paths.append(path)
+    return paths
+
+
+def questions(count: int, seed: int = 0) -> list:
+    """
+    Questions about the policy sections: one per section heading plus the
+    opening sentence of each section's longest paragraph, cycled to `count`.
+    """
+    pool = []
+    for heading, body in sections(load_source()):
+        pool.append(f"What does the Bank of Beirut policy say about {heading.lower()}?")
+        paragraph = max(body.splitlines(), key=len)
+        sentence = re.split(r"(?<=[.?!;])\s", paragraph, maxsplit=1)[0]
+        if len(sentence.split()) >= 5:
+            pool.append(sentence[:200])
+    rng = random.Random(seed)
+    rng.shuffle(pool)
+    return [pool[i % len(pool)] for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", choices=CORPORA, default="sections")
+    parser.add_argument("--copies", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+    paths = write_corpus(args.corpus, args.out, args.copies, args.seed)
+    print(json.dumps({"corpus": args.corpus, "documents": len(paths),
+                      "bytes": sum(os.path.getsize(p) for p in paths), "out": args.out}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
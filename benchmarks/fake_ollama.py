@@ -0,0 +1,185 @@
+"""
+A stand-in for the Ollama HTTP API, for benchmarks on machines without a GPU or network.
+
+Serves /api/chat and /api/generate (streamed NDJSON or a single JSON body),
+/api/tags and /api/version. Nothing is generated: the reply is a fixed
+number of words cycled from the prompt, emitted at `tokens_per_second`
+after a first-token delay of `first_token_ms` plus the prompt's prefill
+time at `prefill_tokens_per_second`. At most `parallel` requests are
+served at once (Ollama's OLLAMA_NUM_PARALLEL); the rest wait their turn,
+so queueing under load looks like a real single-GPU server. The final
+message carries the usual prompt_eval/eval counts and durations.
+
+    python benchmarks/fake_ollama.py --port 11434 --tokens-per-second 40 --first-token-ms 150
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _count_tokens(text: str) -> int:
+    # same four-characters-per-token estimate the context packer uses
+    return (len(text) + 3) // 4
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+class FakeOllama:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 tokens_per_second: float = 40.0,
+                 first_token_ms: float = 150.0,
+                 prefill_tokens_per_second: float = 2000.0,
+                 completion_tokens: int = 64,
+                 parallel: int = 4):
+        self.tokens_per_second = tokens_per_second
+        self.first_token_ms = first_token_ms
+        self.prefill_tokens_per_second = prefill_tokens_per_second
+        self.completion_tokens = completion_tokens
+        self._slots = threading.Semaphore(max(1, parallel))
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "queue_seconds": 0.0}
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+    def _reply_words(self, prompt: str) -> list:
+        words = re.findall(r"\w+", prompt) or ["ok"]
+        return [words[i % len(words)] for i in range(self.completion_tokens)]
+
+    def _generate(self, prompt: str):
+        """Yield (token, final) pairs, sleeping like a model would; `final` holds the usage fields."""
+        queued = time.perf_counter()
+        with self._slots:
+            started = time.perf_counter()
+            prompt_tokens = _count_tokens(prompt)
+            prefill = self.first_token_ms / 1000
+            if self.prefill_tokens_per_second > 0:
+                prefill += prompt_tokens / self.prefill_tokens_per_second
+            time.sleep(prefill)
+            prefill_done = time.perf_counter()
+
+            words = self._reply_words(prompt)
+            for i, word in enumerate(words):
+                if i and self.tokens_per_second > 0:
+                    time.sleep(1 / self.tokens_per_second)
+                yield (word if i == 0 else " " + word), None
+
+            finished = time.perf_counter()
+            with self._lock:
+                self._stats["requests"] += 1
+                self._stats["prompt_tokens"] += prompt_tokens
+                self._stats["completion_tokens"] += len(words)
+                self._stats["queue_seconds"] += started - queued
+            yield "", {
+                "done_reason": "stop",
+                "total_duration": int((finished - queued) * 1e9),
+                "load_duration": 0,
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": int((prefill_done - started) * 1e9),
+                "eval_count": len(words),
+                "eval_duration": int((finished - prefill_done) * 1e9),
+            }
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _json(self, body: dict, status: int = 200):
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                if self.path == "/api/version":
+                    self._json({"version": "0.0.0-fake"})
+                elif self.path == "/api/tags":
+                    self._json({"models": []})
+                else:
+                    self._json({"error": f"unknown path {self.path}"}, 404)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if self.path == "/api/chat":
+                    prompt = "\n".join(m.get("content") or "" for m in request.get("messages", []))
+                    shape = lambda text: {"message": {"role": "assistant", "content": text}}
+                elif self.path == "/api/generate":
+                    prompt = request.get("prompt") or ""
+                    shape = lambda text: {"response": text}
+                else:
+                    self._json({"error": f"unknown path {self.path}"}, 404)
+                    return
+
+                model = request.get("model", "")
+                if request.get("stream", True):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/x-ndjson")
+                    self.send_header("Connection", "close")
+                    self.end_headers()
+                    for token, final in fake._generate(prompt):
+                        part = {"model": model, "created_at": _now(), **shape(token), "done": final is not None}
+                        part.update(final or {})
+                        self.wfile.write(json.dumps(part).encode("utf-8") + b"\n")
+                        self.wfile.flush()
+                else:
+                    tokens, final = [], None
+                    for token, final in fake._generate(prompt):
+                        tokens.append(token)
+                    self._json({"model": model, "created_at": _now(), **shape("".join(tokens)),
+                                "done": True, **final})
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--tokens-per-second", type=float, default=40.0)
+    parser.add_argument("--first-token-ms", type=float, default=150.0)
+    parser.add_argument("--prefill-tokens-per-second", type=float, default=2000.0)
+    parser.add_argument("--completion-tokens", type=int, default=64)
+    parser.add_argument("--parallel", type=int, default=4)
+    args = parser.parse_args()
+
+    server = FakeOllama(args.host, args.port, args.tokens_per_second, args.first_token_ms,
+                        args.prefill_tokens_per_second, args.completion_tokens, args.parallel)
+    print(f"fake Ollama listening on {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from databaseHandling import vector_store
+
+
+MILVUS_URI = os.environ.get("MILVUS_URI", "http://localhost:19530")
+MILVUS_TOKEN = os.environ.get("MILVUS_TOKEN", "root:Milvus")
+DATABASE_NAME = os.environ.get("MILVUS_DATABASE", "Banks_DB")
+POOL_SIZE = int(os.environ.get("MILVUS_POOL_SIZE", "4"))
+# Longest a health probe or a manual reconnect may spend connecting (including backoff), in seconds.
+HEALTH_TIMEOUT = float(os.environ.get("MILVUS_HEALTH_TIMEOUT", "5"))
+
+logger = logging.getLogger(__name__)
+
+
+class MilvusConnectionManager:
+    """
+    Pool of long-lived MilvusClient instances, one pool per database.
+
+    Clients are created already bound to their database (`db_name=` at
+    construction), so callers never pay for `use_database` round trips and
+    never mutate a client another request is using. Each client gets its own
+    pymilvus connection alias, so closing a discarded client does not close
+    the connection other borrowers are using. With VECTOR_STORE=local
+    the pooled clients are embedded LocalVectorClient instances instead (see
+    vector_store.py); nothing else changes for callers.
+    """
+
+    def __init__(self,
+                 uri: str = MILVUS_URI,
+                 token: str = MILVUS_TOKEN,
+                 pool_size: int = POOL_SIZE,
+                 max_retries: int = 5,
+                 backoff_base: float = 0.5,
+                 backoff_max: float = 8.0,
+                 acquire_timeout: float = 30.0,
+                 health_timeout: float = HEALTH_TIMEOUT):
+        self.uri = uri
+        self.token = token
+        self.pool_size = max(1, pool_size)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.acquire_timeout = acquire_timeout
+        self.health_timeout = health_timeout
+        self._aliases = itertools.count()
+        self._idle = {}
+        self._created = {}
+        self._known_databases = set()
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def start(self, databases=(DATABASE_NAME,), timeout: float = None):
+        """Open one client per database up front so the first request is warm."""
+        self._closed = False
+        for db_name in databases:
+            client = self.acquire(db_name, timeout=timeout)
+            self.release(db_name, client)
+        location = self.uri if vector_store.VECTOR_STORE == "milvus" else vector_store.LOCAL_STORE_PATH
+        logger.info(f"{vector_store.VECTOR_STORE} connection manager started for {list(databases)} at {location}")
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            pools = list(self._idle.items())
+            self._idle = {}
+            self._created = {}
+        for db_name, pool in pools:
+            while True:
+                try:
+                    client = pool.get_nowait()
+                except queue.Empty:
+                    break
+                self._close_client(client)
+        logger.info("Milvus connection manager closed.")
+
+    def _connect(self, db_name: str = None, timeout: float = None):
+        """Create a client, retrying with exponential backoff for at most `timeout` seconds (if given)."""
+        deadline = time.monotonic() + timeout if timeout else None
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            alias = f"ragflow-{db_name or 'default'}-{next(self._aliases)}"
+            remaining = deadline - time.monotonic() if deadline else None
+            try:
+                return vector_store.create_client(self.uri, self.token, db_name, alias=alias, timeout=remaining)
+            except Exception as e:
+                last_error = e
+                if attempt == self.max_retries:
+                    break
+                delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+                if deadline and time.monotonic() + delay >= deadline:
+                    break
+                logger.warning(f"Milvus connection failed ({e}); retrying in {delay:.1f}s")
+                time.sleep(delay)
+        raise ConnectionError(f"Could not connect to Milvus at {self.uri}: {last_error}")
+
+    def ensure_database(self, db_name: str, timeout: float = None):
+        if db_name in self._known_databases:
+            return
+        client = self._connect(timeout=timeout)
+        try:
+            if db_name not in client.list_databases():
+                client.create_database(db_name)
+                logger.info(f"Created database '{db_name}'")
+        finally:
+            self._close_client(client)
+        self._known_databases.add(db_name)
+
+    def _pool(self, db_name: str):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Milvus connection manager is closed.")
+            if db_name not in self._idle:
+                self._idle[db_name] = queue.LifoQueue()
+                self._created[db_name] = 0
+            return self._idle[db_name]
+
+    def acquire(self, db_name: str = DATABASE_NAME, timeout: float = None):
+        """Borrow a client; `timeout` bounds the whole wait, connecting and backoff included."""
+        deadline = time.monotonic() + timeout if timeout else None
+        pool = self._pool(db_name)
+        try:
+            return pool.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_create = self._created[db_name] < self.pool_size
+            if can_create:
+                self._created[db_name] += 1
+        if can_create:
+            try:
+                self.ensure_database(db_name, timeout=timeout)
+                remaining = max(0.1, deadline - time.monotonic()) if deadline else None
+                return self._connect(db_name, timeout=remaining)
+            except Exception:
+                with self._lock:
+                    self._created[db_name] -= 1
+                raise
+
+        wait = min(self.acquire_timeout, timeout) if timeout else self.acquire_timeout
+        try:
+            return pool.get(timeout=wait)
+        except queue.Empty:
+            raise TimeoutError(f"No Milvus client available for '{db_name}' after {wait}s")
+
+    def release(self, db_name: str, client, discard: bool = False):
+        with self._lock:
+            closed = self._closed or db_name not in self._idle
+            if discard and not closed:
+                self._created[db_name] -= 1
+        if closed or discard:
+            self._close_client(client)
+            return
+        self._idle[db_name].put(client)
+
+    @contextmanager
+    def client(self, db_name: str = DATABASE_NAME, timeout: float = None):
+        """
+        Borrow a pooled client bound to `db_name`.
+
+        A client that raised a connection-level error is discarded instead of
+        being returned to the pool, so the next borrower reconnects.
+        """
+        client = self.acquire(db_name, timeout=timeout)
+        discard = False
+        try:
+            yield client
+        except ConnectionError:
+            discard = True
+            raise
+        except Exception as e:
+            discard = not self._probe(client)
+            raise
+        finally:
+            self.release(db_name, client, discard=discard)
+
+    def _probe(self, client) -> bool:
+        try:
+            client.get_server_version()
+            return True
+        except Exception:
+            return False
+
+    def health(self, db_name: str = DATABASE_NAME) -> dict:
+        start = time.perf_counter()
+        try:
+            with self.client(db_name, timeout=self.health_timeout) as client:
+                version = client.get_server_version()
+            return {
+                "status": "ok",
+                "backend": vector_store.VECTOR_STORE,
+                "server_version": version,
+                "latency_ms": (time.perf_counter() - start) * 1000,
+            }
+        except Exception as e:
+            return {"status": "unavailable", "error": str(e)}
+
+    def reconnect(self):
+        """Drop every pooled client; new ones are created (with backoff) on demand."""
+        databases = list(self._idle.keys()) or [DATABASE_NAME]
+        self.close()
+        self._known_databases.clear()
+        try:
+            self.start(databases, timeout=self.health_timeout)
+        except Exception as e:
+            # health() reports the outage; pooled clients keep reconnecting on first use
+            logger.warning(f"Milvus reconnect failed: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                db_name: {"created": self._created[db_name], "idle": pool.qsize()}
+                for db_name, pool in self._idle.items()
+            }
+
+    @staticmethod
+    def _close_client(client):
+        try:
+            client.close()
+        except Exception:
+            pass
+
+
+_manager = MilvusConnectionManager()
+
+
+def get_manager() -> MilvusConnectionManager:
+    return _manager
@@ -1,20 +1,26 @@
 from pymilvus import connections, Collection, MilvusClient, utility, CollectionSchema, FieldSchema, DataType
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from databaseHandling.connection_manager import get_manager, MILVUS_URI, MILVUS_TOKEN
+from databaseHandling import vector_store
+from databaseHandling.vector_store import create_client, drop_collection_and_aliases
 
-try:
-    connections.disconnect(alias="default")
-    connections.connect(alias="default", host="localhost", port="19530")
-except:
-    connections.connect(alias="default", host="localhost", port="19530")
+
+def connect_orm(alias: str = "default"):
+    """Open the ORM connection used by `Collection`/`utility` helpers, once."""
+    if not connections.has_connection(alias):
+        connections.connect(alias=alias, uri=MILVUS_URI, token=MILVUS_TOKEN)
 
 def load_database(db_name: str):
-    connections.connect(alias="default", host="localhost", port="19530")
-    client = MilvusClient(
-        uri="http://localhost:19530",
-        token="root:Milvus",
-        db_name=db_name,
-    )
-    return client
+    """
+    Borrow a pooled client bound to `db_name`.
+
+    Return it with `get_manager().release(db_name, client)` when done, or use
+    `get_manager().client(db_name)` as a context manager instead.
+    """
+    return get_manager().acquire(db_name)
 
 def list_collections(client, db_name: str):
     client.using_database(db_name)
@@ -22,24 +28,29 @@ def list_collections(client, db_name: str):
     return collections
 
 def create_collection(collection_name: str, schema: CollectionSchema, db_name: str, **kwargs):
-    if utility.has_collection(collection_name=collection_name, using="default"):
-        print(f"Collection '{collection_name}' already exists.")
-        return Collection(name=collection_name, using="default", db_name=db_name)
-    else:
-        collection = Collection(
-            name=collection_name,
-            schema=schema,
-            using="default",
-            db_name=db_name,
-            **kwargs
-        )
-        print(f"Collection '{collection_name}' created.")
-        return collection
+    """
+    Create the collection unless it exists and return it as an ORM `Collection`.
+
+    With VECTOR_STORE=local there is no ORM to return a `Collection` from, so
+    the collection name is returned instead.
+    """
+    # through the pooled client, so this also works with VECTOR_STORE=local
+    with get_manager().client(db_name) as client:
+        if client.has_collection(collection_name=collection_name):
+            print(f"Collection '{collection_name}' already exists.")
+        else:
+            client.create_collection(collection_name=collection_name, schema=schema, **kwargs)
+            print(f"Collection '{collection_name}' created.")
+    if vector_store.VECTOR_STORE == "local":
+        return collection_name
+    connect_orm()
+    return Collection(name=collection_name, using="default", db_name=db_name)
     
 def delete_collection(client, collection_name: str, db_name: str):
-    collections = client.list_collections(db_name=db_name)
-    if collection_name in collections:
-        client.drop_collection(collection_name, db_name=db_name)
+    client.using_database(db_name)
+    # also true for an alias, which list_collections does not show
+    if client.has_collection(collection_name=collection_name):
+        drop_collection_and_aliases(client, collection_name)
         print(f"Collection '{collection_name}' deleted from database '{db_name}'.")
     else:
         print(f"Collection '{collection_name}' does not exist in database '{db_name}'.")
@@ -67,10 +78,7 @@ def create_database(client, db_name: str):
 def main():
     db_name = "default_bank"
 
-    client = MilvusClient(
-        uri="http://localhost:19530",
-        token="root:Milvus",
-    )
+    client = create_client(MILVUS_URI, MILVUS_TOKEN)
 
     create_database(client, db_name)
 
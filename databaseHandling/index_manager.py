@@ -0,0 +1,357 @@
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from databaseHandling import vector_store
+from databaseHandling.connection_manager import get_manager, DATABASE_NAME
+
+
+VECTOR_FIELD = "embedding"
+# MiniLM embeddings are unit-normalized, so cosine ranks like IP and avoids L2's extra norm terms.
+DEFAULT_METRIC = os.environ.get("VECTOR_METRIC", "COSINE")
+# Below this many rows a brute-force FLAT index is both exact and fast enough.
+FLAT_MAX_ROWS = int(os.environ.get("INDEX_FLAT_MAX_ROWS", "10000"))
+# Above this many rows IVF probing gets expensive; switch to a graph index.
+IVF_MAX_ROWS = int(os.environ.get("INDEX_IVF_MAX_ROWS", "1000000"))
+# Cached index specs are re-checked against the collection id after this long,
+# so a collection recreated or rebuilt by another process is noticed.
+DESCRIBE_TTL_SECONDS = float(os.environ.get("INDEX_DESCRIBE_TTL_SECONDS", "30"))
+# A collection is stored as "<name>__idx<ms>" and served under the alias "<name>".
+SHADOW_MARKER = "__idx"
+# Searches that resolved the alias just before a switch may still read the replaced collection.
+RETIRE_GRACE_SECONDS = 5.0
+COPY_BATCH_SIZE = 1000
+
+logger = logging.getLogger(__name__)
+
+
+def choose_index(row_count: int, metric_type: str = DEFAULT_METRIC) -> dict:
+    """Pick index type and build params for a collection of `row_count` vectors."""
+    if row_count < FLAT_MAX_ROWS:
+        return {"index_type": "FLAT", "metric_type": metric_type, "params": {}}
+    if row_count < IVF_MAX_ROWS:
+        # ~4 * sqrt(n) lists, rounded to a power of two
+        nlist = 2 ** round(math.log2(4 * math.sqrt(row_count)))
+        return {"index_type": "IVF_FLAT", "metric_type": metric_type,
+                "params": {"nlist": max(64, min(65536, nlist))}}
+    return {"index_type": "HNSW", "metric_type": metric_type,
+            "params": {"M": 16, "efConstruction": 200}}
+
+
+def public_name(collection_name: str) -> str:
+    """The name a collection is searched under, i.e. the alias of a "<name>__idx<ms>" collection."""
+    return collection_name.split(SHADOW_MARKER, 1)[0]
+
+
+def public_names(collection_names) -> list:
+    """`collection_names` as listed by Milvus, each listed under the alias it is searched by."""
+    return list(dict.fromkeys(public_name(name) for name in collection_names))
+
+
+def _new_physical_name(client, collection_name: str) -> str:
+    while True:
+        physical = f"{collection_name}{SHADOW_MARKER}{time.time_ns() // 1_000_000}"
+        if not client.has_collection(collection_name=physical):
+            return physical
+        time.sleep(0.001)
+
+
+def needs_rebuild(current: dict, row_count: int) -> bool:
+    desired = choose_index(row_count, current.get("metric_type", DEFAULT_METRIC))
+    if desired["index_type"] != current.get("index_type"):
+        return True
+    if desired["index_type"] == "IVF_FLAT":
+        current_nlist = int(current.get("params", {}).get("nlist", 0))
+        return desired["params"]["nlist"] >= 2 * current_nlist
+    return False
+
+
+class _WriteGate:
+    """Any number of writers, or one rebuild alone; a waiting rebuild holds back new writers."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._writers = 0
+        self._rebuilding = False
+        self._waiting = 0
+
+    @contextmanager
+    def shared(self):
+        with self._condition:
+            while self._rebuilding or self._waiting:
+                self._condition.wait()
+            self._writers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writers -= 1
+                self._condition.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        with self._condition:
+            self._waiting += 1
+            while self._rebuilding or self._writers:
+                self._condition.wait()
+            self._waiting -= 1
+            self._rebuilding = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._rebuilding = False
+                self._condition.notify_all()
+
+
+class IndexManager:
+    """
+    Owns index creation and loading for the document collections.
+
+    The index is created once per collection, with type and params chosen
+    from its row count, and the collection is loaded once and kept loaded.
+    After writes, `maybe_rebuild` rechecks the row count and, when the
+    collection has outgrown its index (FLAT -> IVF_FLAT -> HNSW, or an IVF
+    nlist that is now too small), rebuilds it on a background thread without
+    taking it offline: the rows are copied into a new collection, which gets
+    the new index and is loaded, and then the alias `<name>` is switched to
+    it. Searches keep using the old collection until the switch; writes made
+    through `writing` wait for the copy. The copy assigns new primary keys,
+    which listeners added with `on_swap` receive. Collections made with
+    `create_collection` are aliased from the start; older ones are renamed
+    and aliased when first rebuilt.
+
+    Index specs are cached and re-read when the collection id changes, i.e.
+    when the collection was recreated or rebuilt, possibly by another process.
+    """
+
+    def __init__(self, db_name: str = DATABASE_NAME, field_name: str = VECTOR_FIELD):
+        self.db_name = db_name
+        self.field_name = field_name
+        self._indexes = {}
+        self._rebuilding = set()
+        self._gates = {}
+        self._swap_listeners = []
+        self._lock = threading.Lock()
+
+    def writing(self, collection_name: str):
+        """Context manager held around writes to `collection_name`; it waits while the collection is copied."""
+        with self._lock:
+            gate = self._gates.setdefault(collection_name, _WriteGate())
+        return gate.shared()
+
+    def on_swap(self, listener):
+        """Call `listener(client, collection_name, old_ids, new_ids)` after a rebuild switched collections."""
+        self._swap_listeners.append(listener)
+
+    def describe(self, client, collection_name: str, refresh: bool = False):
+        """Current index spec of `collection_name`, or None when it has no index."""
+        with self._lock:
+            spec = self._indexes.get(collection_name)
+        if spec is not None and not refresh and time.monotonic() - spec["checked_at"] < DESCRIBE_TTL_SECONDS:
+            return spec
+        collection_id = client.describe_collection(collection_name=collection_name).get("collection_id")
+        if spec is not None and spec["collection_id"] == collection_id:
+            with self._lock:
+                spec["checked_at"] = time.monotonic()
+            return spec
+
+        indexes = client.list_indexes(collection_name=collection_name, field_name=self.field_name)
+        if not indexes:
+            self.forget(collection_name)
+            return None
+        index_name = indexes[0]
+        info = client.describe_index(collection_name=collection_name, index_name=index_name)
+        spec = {
+            "index_name": index_name,
+            "index_type": info.get("index_type"),
+            "metric_type": info.get("metric_type"),
+            "params": {k: v for k, v in info.items()
+                       if k not in ("index_type", "metric_type", "field_name", "index_name",
+                                    "total_rows", "indexed_rows", "pending_index_rows", "state")},
+            "collection_id": collection_id,
+            "checked_at": time.monotonic(),
+            "loaded": False,
+        }
+        with self._lock:
+            self._indexes[collection_name] = spec
+        return spec
+
+    def _row_count(self, client, collection_name: str) -> int:
+        return int(client.get_collection_stats(collection_name=collection_name).get("row_count", 0))
+
+    def _create(self, client, collection_name: str, spec: dict):
+        index_params = client.prepare_index_params()
+        index_params.add_index(
+            field_name=self.field_name,
+            index_name=self.field_name,
+            index_type=spec["index_type"],
+            metric_type=spec["metric_type"],
+            params=spec["params"],
+        )
+        client.create_index(collection_name=collection_name, index_params=index_params)
+        logger.info(f"Created {spec['index_type']} index {spec['params']} on '{collection_name}'")
+
+    def ensure_ready(self, client, collection_name: str, metric_type: str = DEFAULT_METRIC):
+        """Make sure the collection has an index and is loaded; cheap while the cached spec is current."""
+        spec = self.describe(client, collection_name)
+        if spec is not None and spec["loaded"]:
+            return spec
+        if spec is None:
+            self._create(client, collection_name, choose_index(self._row_count(client, collection_name), metric_type))
+            spec = self.describe(client, collection_name, refresh=True)
+
+        state = client.get_load_state(collection_name=collection_name)["state"]
+        if getattr(state, "name", str(state)) != "Loaded":
+            client.load_collection(collection_name=collection_name)
+        spec["loaded"] = True
+        return spec
+
+    def forget(self, collection_name: str):
+        with self._lock:
+            self._indexes.pop(collection_name, None)
+
+    def maybe_rebuild(self, client, collection_name: str) -> bool:
+        """Schedule a background rebuild if the collection outgrew its index."""
+        spec = self.describe(client, collection_name, refresh=True)
+        if spec is None:
+            return False
+        row_count = self._row_count(client, collection_name)
+        if not needs_rebuild(spec, row_count):
+            return False
+        with self._lock:
+            if collection_name in self._rebuilding:
+                return False
+            self._rebuilding.add(collection_name)
+        threading.Thread(
+            target=self._rebuild,
+            args=(collection_name, spec["metric_type"]),
+            name=f"index-rebuild-{collection_name}",
+            daemon=True,
+        ).start()
+        return True
+
+    def create_collection(self, client, collection_name: str, schema, **kwargs):
+        """Create `collection_name` as the alias of a new physical collection, so rebuilds only move the alias."""
+        physical = _new_physical_name(client, collection_name)
+        client.create_collection(collection_name=physical, schema=schema, **kwargs)
+        try:
+            client.create_alias(collection_name=physical, alias=collection_name)
+        except Exception:
+            client.drop_collection(collection_name=physical)
+            raise
+        self.forget(collection_name)
+
+    def _physical_name(self, client, collection_name: str) -> str:
+        """The collection behind the alias `collection_name`, or the name itself for a collection without one."""
+        description = client.describe_collection(collection_name=collection_name)
+        if collection_name in description.get("aliases", []):
+            return description["collection_name"]
+        return collection_name
+
+    def _adopt(self, client, collection_name: str) -> str:
+        """Move a collection created under its public name behind an alias of that name; returns the new name."""
+        physical = _new_physical_name(client, collection_name)
+        client.rename_collection(old_name=collection_name, new_name=physical)
+        try:
+            client.create_alias(collection_name=physical, alias=collection_name)
+        except Exception:
+            client.rename_collection(old_name=physical, new_name=collection_name)
+            raise
+        logger.info(f"'{collection_name}' is now an alias of '{physical}'")
+        return physical
+
+    def _copy_rows(self, client, source: str, target: str) -> tuple:
+        """Copy every partition of `source` into `target`; returns the old and new primary keys."""
+        description = client.describe_collection(collection_name=source)
+        primary = next(field for field in description["fields"] if field.get("is_primary"))
+        auto_id = bool(primary.get("auto_id") or description.get("auto_id"))
+        old_ids, new_ids = [], []
+        for partition_name in client.list_partitions(collection_name=source):
+            if not client.has_partition(collection_name=target, partition_name=partition_name):
+                client.create_partition(collection_name=target, partition_name=partition_name)
+            iterator = client.query_iterator(
+                collection_name=source,
+                batch_size=COPY_BATCH_SIZE,
+                filter="",
+                output_fields=["*"],
+                partition_names=[partition_name],
+            )
+            try:
+                while True:
+                    batch = iterator.next()
+                    if not batch:
+                        break
+                    ids = [row[primary["name"]] for row in batch]
+                    if auto_id:
+                        batch = [{k: v for k, v in row.items() if k != primary["name"]} for row in batch]
+                    result = client.insert(collection_name=target, data=batch, partition_name=partition_name)
+                    old_ids.extend(ids)
+                    new_ids.extend(result["ids"] if auto_id else ids)
+            finally:
+                iterator.close()
+        return old_ids, new_ids
+
+    def _rebuild(self, collection_name: str, metric_type: str):
+        try:
+            with get_manager().client(self.db_name) as client:
+                with self._lock:
+                    gate = self._gates.setdefault(collection_name, _WriteGate())
+                with gate.exclusive():
+                    retired = self._build_and_switch(client, collection_name, metric_type)
+                time.sleep(RETIRE_GRACE_SECONDS)
+                client.drop_collection(collection_name=retired)
+        except Exception:
+            logger.exception(f"Index rebuild failed for '{collection_name}'")
+            self.forget(collection_name)
+        finally:
+            with self._lock:
+                self._rebuilding.discard(collection_name)
+
+    def _build_and_switch(self, client, collection_name: str, metric_type: str):
+        """Copy, index and load a new collection, then point `collection_name` at it; returns what to drop."""
+        current = self._physical_name(client, collection_name)
+        if current == collection_name:
+            # created before collections were aliased; searches fail only during the rename
+            current = self._adopt(client, collection_name)
+        row_count = self._row_count(client, current)
+        spec = choose_index(row_count, metric_type)
+        shadow = _new_physical_name(client, collection_name)
+        logger.info(f"Rebuilding '{collection_name}' ({row_count} rows) as {spec['index_type']} in '{shadow}'")
+        client.create_collection(
+            collection_name=shadow,
+            schema=vector_store.clone_schema(client.describe_collection(collection_name=current)),
+        )
+        try:
+            old_ids, new_ids = self._copy_rows(client, current, shadow)
+            self._create(client, shadow, spec)
+            client.load_collection(collection_name=shadow)
+        except Exception:
+            client.drop_collection(collection_name=shadow)
+            raise
+
+        client.alter_alias(collection_name=shadow, alias=collection_name)
+        self.forget(collection_name)
+        for listener in self._swap_listeners:
+            listener(client, collection_name, old_ids, new_ids)
+        self.ensure_ready(client, collection_name, metric_type)
+        logger.info(f"'{collection_name}' now served by '{shadow}'")
+        return current
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "indexes": {name: {k: v for k, v in spec.items() if k != "checked_at"}
+                            for name, spec in self._indexes.items()},
+                "rebuilding": sorted(self._rebuilding),
+            }
+
+
+_index_manager = IndexManager()
+
+
+def get_index_manager() -> IndexManager:
+    return _index_manager
@@ -0,0 +1,971 @@
+import ast
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from functools import lru_cache
+
+import numpy as np
+
+from databaseHandling.vector_store import VectorStoreClient
+
+
+DEFAULT_DATABASE = "default"
+DEFAULT_PARTITION = "_default"
+DEFAULT_NPROBE = 8
+# Candidate sets this small (e.g. after a selective filter) are scanned exactly instead of probed.
+IVF_MIN_CANDIDATES = 4096
+KMEANS_ITERATIONS = 10
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------- filter expressions
+
+_TOKEN_PATTERN = re.compile(r"""
+    \s*(?:
+        (?P<number>-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)
+      | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+      | (?P<op>==|!=|>=|<=|>|<|&&|\|\||!|\(|\)|\[|\]|,)
+      | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+    )""", re.VERBOSE)
+
+_COMPARE = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    ">=": lambda a, b: a >= b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    "<": lambda a, b: a < b,
+}
+
+
+def _tokenize(expr: str) -> list:
+    tokens, pos = [], 0
+    expr = expr.rstrip()
+    while pos < len(expr):
+        match = _TOKEN_PATTERN.match(expr, pos)
+        if not match or match.end() == pos:
+            raise ValueError(f"Cannot parse filter expression at: {expr[pos:]!r}")
+        kind = match.lastgroup
+        text = match.group(kind)
+        if kind == "number":
+            tokens.append(("value", ast.literal_eval(text)))
+        elif kind == "string":
+            tokens.append(("value", ast.literal_eval(text)))
+        elif kind == "name" and text.lower() in ("and", "or", "not", "in", "like"):
+            tokens.append(("op", text.lower()))
+        elif kind == "name" and text.lower() in ("true", "false"):
+            tokens.append(("value", text.lower() == "true"))
+        else:
+            tokens.append((kind, text))
+        pos = match.end()
+    return tokens
+
+
+class _FilterParser:
+    """Recursive-descent parser for the boolean expressions Milvus accepts in `filter=`."""
+
+    def __init__(self, tokens: list):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self, *expected):
+        token = self.peek()
+        if expected and token[1] not in expected:
+            raise ValueError(f"Expected {expected} in filter expression, got {token[1]!r}")
+        self.pos += 1
+        return token
+
+    def parse(self):
+        predicate = self.or_expr()
+        if self.pos != len(self.tokens):
+            raise ValueError(f"Unexpected {self.peek()[1]!r} in filter expression")
+        return predicate
+
+    def or_expr(self):
+        terms = [self.and_expr()]
+        while self.peek()[1] in ("or", "||"):
+            self.take()
+            terms.append(self.and_expr())
+        return terms[0] if len(terms) == 1 else (lambda row: any(term(row) for term in terms))
+
+    def and_expr(self):
+        terms = [self.not_expr()]
+        while self.peek()[1] in ("and", "&&"):
+            self.take()
+            terms.append(self.not_expr())
+        return terms[0] if len(terms) == 1 else (lambda row: all(term(row) for term in terms))
+
+    def not_expr(self):
+        if self.peek()[1] in ("not", "!"):
+            self.take()
+            inner = self.not_expr()
+            return lambda row: not inner(row)
+        if self.peek()[1] == "(":
+            self.take("(")
+            inner = self.or_expr()
+            self.take(")")
+            return inner
+        return self.comparison()
+
+    def value_list(self) -> list:
+        self.take("[")
+        values = []
+        while self.peek()[1] != "]":
+            kind, value = self.take()
+            if kind != "value":
+                raise ValueError(f"Expected a literal in filter list, got {value!r}")
+            values.append(value)
+            if self.peek()[1] == ",":
+                self.take(",")
+        self.take("]")
+        return values
+
+    def comparison(self):
+        kind, field = self.take()
+        if kind != "name":
+            raise ValueError(f"Expected a field name in filter expression, got {field!r}")
+        op = self.take()[1]
+        if op == "not":
+            self.take("in")
+            values = set(self.value_list())
+            return lambda row: field in row and row[field] not in values
+        if op == "in":
+            values = set(self.value_list())
+            return lambda row: row.get(field) in values
+        if op == "like":
+            pattern = self.take()[1]
+            regex = re.compile("".join(
+                ".*" if c == "%" else "." if c == "_" else re.escape(c) for c in pattern
+            ), re.DOTALL)
+            return lambda row: isinstance(row.get(field), str) and regex.fullmatch(row[field]) is not None
+        if op not in _COMPARE:
+            raise ValueError(f"Unsupported operator {op!r} in filter expression")
+        kind, value = self.take()
+        if kind != "value":
+            raise ValueError(f"Expected a literal after {op!r} in filter expression, got {value!r}")
+        compare = _COMPARE[op]
+
+        def predicate(row):
+            current = row.get(field)
+            if current is None:
+                return False
+            try:
+                return compare(current, value)
+            except TypeError:
+                return False
+        return predicate
+
+
+@lru_cache(maxsize=256)
+def compile_filter(expr: str):
+    """Compile a Milvus filter expression into a predicate over row dicts."""
+    if not expr or not expr.strip():
+        return lambda row: True
+    return _FilterParser(_tokenize(expr)).parse()
+
+
+# ---------------------------------------------------------------- storage
+
+def _unit_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _nearest_centroid(vectors: np.ndarray, centroids: np.ndarray, batch_size: int = 65536) -> np.ndarray:
+    assign = np.empty(len(vectors), dtype=np.int32)
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    for start in range(0, len(vectors), batch_size):
+        block = np.asarray(vectors[start:start + batch_size], dtype=np.float32)
+        assign[start:start + batch_size] = np.argmin(centroid_norms - 2 * block @ centroids.T, axis=1)
+    return assign
+
+
+def _kmeans(vectors: np.ndarray, k: int, iterations: int = KMEANS_ITERATIONS, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), max(256 * k, 10000))
+    sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))], dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), k, replace=False)].copy()
+    for _ in range(iterations):
+        assign = _nearest_centroid(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        counts = np.bincount(assign, minlength=k)
+        filled = counts > 0
+        # empty lists keep their previous centroid
+        centroids[filled] = sums[filled] / counts[filled, None]
+    return centroids
+
+
+class _VectorFile:
+    """Growable float32 matrix backed by a memory-mapped file (row-major, no header)."""
+
+    def __init__(self, path: str, dim: int):
+        self.path = path
+        self.dim = dim
+        if not os.path.exists(path):
+            open(path, "wb").close()
+        self._map()
+
+    def _map(self):
+        capacity = os.path.getsize(self.path) // (4 * self.dim)
+        if capacity:
+            self.data = np.memmap(self.path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        else:
+            self.data = np.zeros((0, self.dim), dtype=np.float32)
+
+    def write(self, start: int, matrix: np.ndarray):
+        end = start + len(matrix)
+        if end > len(self.data):
+            # grow geometrically so appends stay amortized O(1)
+            capacity = max(end, 2 * len(self.data), 1024)
+            if isinstance(self.data, np.memmap):
+                self.data.flush()
+            with open(self.path, "r+b") as f:
+                f.truncate(capacity * 4 * self.dim)
+            self._map()
+        self.data[start:end] = matrix
+        self.data.flush()
+
+
+class _Collection:
+    """
+    One collection on disk: `collection.json` (schema, partitions, indexes),
+    one memory-mapped `<field>.f32` per vector field, and `rows.jsonl`, an
+    append-only log of inserts, updates, deletes and partition drops that is replayed
+    on open. Opening only maps the vector files, so startup is near-instant.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.lock = threading.RLock()
+        with open(os.path.join(directory, "collection.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.vectors = {name: _VectorFile(os.path.join(directory, f"{name}.f32"), dim)
+                        for name, dim in self.meta["vector_fields"].items()}
+        self.rows = []
+        self.partition_of = []
+        self.alive = np.zeros(0, dtype=bool)
+        self.pk_slot = {}
+        self.next_id = 1
+        self.loaded = False
+        self._replay()
+        self.norms = {name: np.linalg.norm(vectors.data[:len(self.rows)], axis=1)
+                      for name, vectors in self.vectors.items()}
+        self.ivf = {}
+        for name in self.vectors:
+            path = os.path.join(directory, f"{name}.centroids.npy")
+            if os.path.exists(path):
+                self._set_ivf(name, np.load(path))
+
+    @staticmethod
+    def create(directory: str, meta: dict) -> "_Collection":
+        os.makedirs(directory, exist_ok=True)
+        _write_json(os.path.join(directory, "collection.json"), meta)
+        return _Collection(directory)
+
+    # -- persistence
+
+    def save_meta(self):
+        _write_json(os.path.join(self.directory, "collection.json"), self.meta)
+
+    def _log(self, record: dict):
+        with open(os.path.join(self.directory, "rows.jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def _replay(self):
+        path = os.path.join(self.directory, "rows.jsonl")
+        if not os.path.exists(path):
+            return
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # a torn last line from a crash mid-write
+                    logger.warning(f"Skipping corrupt log line in {path}")
+                    continue
+                if record["op"] == "insert":
+                    self._apply_insert(record["partition"], record["rows"])
+                elif record["op"] == "update":
+                    self._apply_update(record["rows"])
+                elif record["op"] == "delete":
+                    self._apply_delete(record["ids"])
+                elif record["op"] == "drop_partition":
+                    self._apply_drop_partition(record["partition"])
+
+    # -- state changes (shared by live calls and replay)
+
+    def _apply_insert(self, partition_name: str, rows: list):
+        start = len(self.rows)
+        primary = self.meta["primary"]
+        if len(self.alive) < start + len(rows):
+            grown = np.zeros(max(start + len(rows), 2 * len(self.alive), 1024), dtype=bool)
+            grown[:len(self.alive)] = self.alive
+            self.alive = grown
+        for offset, row in enumerate(rows):
+            pk = row[primary]
+            if pk in self.pk_slot:
+                self.alive[self.pk_slot[pk]] = False
+            self.pk_slot[pk] = start + offset
+            self.rows.append(row)
+            self.partition_of.append(partition_name)
+            self.alive[start + offset] = True
+            if isinstance(pk, int) and pk >= self.next_id:
+                self.next_id = pk + 1
+
+    def _apply_update(self, rows: list):
+        primary = self.meta["primary"]
+        for row in rows:
+            slot = self.pk_slot.get(row[primary])
+            if slot is not None:
+                self.rows[slot] = {**self.rows[slot], **row}
+
+    def _apply_delete(self, ids):
+        deleted = 0
+        for pk in ids:
+            slot = self.pk_slot.pop(pk, None)
+            if slot is not None and self.alive[slot]:
+                self.alive[slot] = False
+                deleted += 1
+        return deleted
+
+    def _apply_drop_partition(self, partition_name: str):
+        primary = self.meta["primary"]
+        ids = [self.rows[slot][primary] for slot in range(len(self.rows))
+               if self.alive[slot] and self.partition_of[slot] == partition_name]
+        self._apply_delete(ids)
+
+    # -- operations
+
+    def insert(self, rows: list, partition_name: str) -> list:
+        primary = self.meta["primary"]
+        scalar_fields = set(self.meta["scalar_fields"])
+        with self.lock:
+            if partition_name not in self.meta["partitions"]:
+                raise ValueError(f"Partition '{partition_name}' does not exist.")
+            start = len(self.rows)
+            scalars, matrices = [], {name: [] for name in self.vectors}
+            for row in rows:
+                row = dict(row)
+                if self.meta["auto_id"]:
+                    row[primary] = self.next_id + len(scalars)
+                elif primary not in row:
+                    raise ValueError(f"Missing primary key field '{primary}'.")
+                for name in self.vectors:
+                    if name not in row:
+                        raise ValueError(f"Missing vector field '{name}'.")
+                    matrices[name].append(np.asarray(row.pop(name), dtype=np.float32))
+                unknown = set(row) - scalar_fields - {primary}
+                if unknown and not self.meta["dynamic"]:
+                    raise ValueError(f"Unknown fields {sorted(unknown)} and dynamic fields are disabled.")
+                scalars.append({key: _plain(value) for key, value in row.items()})
+
+            # vectors first: a crash before the log line leaves unreferenced rows, never missing vectors
+            for name, vectors in matrices.items():
+                matrix = np.stack(vectors) if vectors else np.zeros((0, self.vectors[name].dim), np.float32)
+                self.vectors[name].write(start, matrix)
+                self.norms[name] = np.concatenate([self.norms[name][:start], np.linalg.norm(matrix, axis=1)])
+                if name in self.ivf:
+                    self.ivf[name]["assign"] = np.concatenate([
+                        self.ivf[name]["assign"][:start],
+                        _nearest_centroid(self._ivf_space(name, matrix), self.ivf[name]["centroids"]),
+                    ])
+            self._log({"op": "insert", "partition": partition_name, "rows": scalars})
+            self._apply_insert(partition_name, scalars)
+            return [row[primary] for row in scalars]
+
+    def update(self, rows: list) -> list:
+        """Overwrite scalar fields of existing rows (Milvus' partial upsert); returns the updated keys."""
+        primary = self.meta["primary"]
+        with self.lock:
+            updates = []
+            for row in rows:
+                if set(row) & set(self.vectors):
+                    raise ValueError("Only scalar fields can be updated in place.")
+                unknown = set(row) - set(self.meta["scalar_fields"]) - {primary}
+                if unknown and not self.meta["dynamic"]:
+                    raise ValueError(f"Unknown fields {sorted(unknown)} and dynamic fields are disabled.")
+                if row.get(primary) in self.pk_slot:
+                    updates.append({key: _plain(value) for key, value in row.items()})
+            if updates:
+                self._log({"op": "update", "rows": updates})
+                self._apply_update(updates)
+            return [row[primary] for row in updates]
+
+    def delete(self, ids) -> int:
+        with self.lock:
+            ids = [pk for pk in ids if pk in self.pk_slot]
+            if ids:
+                self._log({"op": "delete", "ids": ids})
+            return self._apply_delete(ids)
+
+    def drop_partition(self, partition_name: str):
+        with self.lock:
+            self._log({"op": "drop_partition", "partition": partition_name})
+            self._apply_drop_partition(partition_name)
+            self.meta["partitions"].remove(partition_name)
+            self.save_meta()
+
+    def row_count(self) -> int:
+        return int(self.alive[:len(self.rows)].sum())
+
+    def matching_slots(self, filter_expr: str = "", partition_names=None, ids=None) -> np.ndarray:
+        """Live slots in the given partitions whose row satisfies the filter."""
+        with self.lock:
+            count = len(self.rows)
+            mask = self.alive[:count].copy()
+            rows, partition_of = self.rows, self.partition_of
+        if ids is not None:
+            id_mask = np.zeros(count, dtype=bool)
+            id_mask[[self.pk_slot[pk] for pk in ids if pk in self.pk_slot and self.pk_slot[pk] < count]] = True
+            mask &= id_mask
+        if partition_names:
+            wanted = set(partition_names)
+            mask &= np.fromiter((p in wanted for p in partition_of[:count]), dtype=bool, count=count)
+        if filter_expr and filter_expr.strip():
+            predicate = compile_filter(filter_expr)
+            slots = np.flatnonzero(mask)
+            keep = np.fromiter((predicate(rows[slot]) for slot in slots), dtype=bool, count=len(slots))
+            return slots[keep]
+        return np.flatnonzero(mask)
+
+    def entity(self, slot: int, output_fields) -> dict:
+        row = self.rows[slot]
+        if not output_fields:
+            return {}
+        if "*" in output_fields:
+            output_fields = [*row.keys(), *self.vectors.keys()]
+        entity = {}
+        for field in output_fields:
+            if field in self.vectors:
+                entity[field] = self.vectors[field].data[slot].tolist()
+            elif field in row:
+                entity[field] = row[field]
+        return entity
+
+    def query_row(self, slot: int, output_fields) -> dict:
+        primary = self.meta["primary"]
+        return {primary: self.rows[slot][primary], **self.entity(slot, output_fields)}
+
+    # -- indexes
+
+    def _ivf_space(self, field: str, vectors: np.ndarray) -> np.ndarray:
+        metric = self.meta["indexes"].get(field, {}).get("metric_type", "COSINE")
+        return _unit_rows(np.asarray(vectors, np.float32)) if metric in ("COSINE", "IP") else vectors
+
+    def _set_ivf(self, field: str, centroids: np.ndarray):
+        count = len(self.rows)
+        self.ivf[field] = {
+            "centroids": centroids,
+            "assign": _nearest_centroid(self._ivf_space(field, self.vectors[field].data[:count]), centroids),
+        }
+
+    def _drop_centroids(self, field: str):
+        self.ivf.pop(field, None)
+        path = os.path.join(self.directory, f"{field}.centroids.npy")
+        if os.path.exists(path):
+            os.remove(path)
+
+    def drop_index(self, field: str):
+        with self.lock:
+            del self.meta["indexes"][field]
+            self.save_meta()
+            self._drop_centroids(field)
+
+    def build_index(self, field: str):
+        """Train IVF centroids for `field`; other index types are searched exactly."""
+        spec = self.meta["indexes"][field]
+        path = os.path.join(self.directory, f"{field}.centroids.npy")
+        self._drop_centroids(field)
+        if not spec["index_type"].upper().startswith("IVF"):
+            return
+        live = self.matching_slots()
+        nlist = min(int(spec["params"].get("nlist", 128)), len(live))
+        if nlist < 1:
+            # trained on the next create_index once there is data; exact until then
+            return
+        centroids = _kmeans(self._ivf_space(field, self.vectors[field].data[live]), nlist)
+        np.save(path, centroids)
+        self._set_ivf(field, centroids)
+
+    def search(self, field: str, query: np.ndarray, limit: int, metric: str, params: dict, slots: np.ndarray):
+        vectors = self.vectors[field].data
+        if field in self.ivf and len(slots) > IVF_MIN_CANDIDATES:
+            ivf = self.ivf[field]
+            centroids = ivf["centroids"]
+            nprobe = max(1, min(len(centroids), int(params.get("nprobe", DEFAULT_NPROBE))))
+            probe_space = self._ivf_space(field, query[None, :])[0]
+            centroid_distance = (centroids ** 2).sum(axis=1) - 2 * centroids @ probe_space
+            probed = np.argpartition(centroid_distance, nprobe - 1)[:nprobe]
+            slots = slots[np.isin(ivf["assign"][slots], probed)]
+        if not len(slots):
+            return [], []
+        candidates = np.asarray(vectors[slots], dtype=np.float32)
+        dots = candidates @ query
+        metric = (metric or "COSINE").upper()
+        if metric == "L2":
+            distances = self.norms[field][slots] ** 2 - 2 * dots + float(query @ query)
+            order_key = distances
+        else:
+            if metric == "COSINE":
+                denominator = self.norms[field][slots] * max(float(np.linalg.norm(query)), 1e-12)
+                dots = dots / np.where(denominator == 0, 1, denominator)
+            distances = dots
+            order_key = -dots
+        limit = min(limit, len(slots))
+        top = np.argpartition(order_key, limit - 1)[:limit]
+        top = top[np.argsort(order_key[top], kind="stable")]
+        return slots[top], distances[top]
+
+
+def _plain(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return value
+
+
+def _write_json(path: str, value):
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(value, f)
+    os.replace(path + ".tmp", path)
+
+
+def _field_meta(field) -> dict:
+    dtype = getattr(field.dtype, "name", str(field.dtype))
+    return {
+        "name": field.name,
+        "type": dtype,
+        "params": dict(getattr(field, "params", {}) or {}),
+        "is_primary": bool(getattr(field, "is_primary", False)),
+        "auto_id": bool(getattr(field, "auto_id", False)),
+    }
+
+
+_collections = {}
+_collections_lock = threading.Lock()
+# aliases.json of each database, cached by modification time
+_aliases = {}
+_aliases_lock = threading.Lock()
+
+
+# ---------------------------------------------------------------- client
+
+class _IndexParams(list):
+    """Stand-in for MilvusClient.prepare_index_params()."""
+
+    def add_index(self, field_name: str, index_type: str = "", index_name: str = "", metric_type: str = None,
+                  params: dict = None, **kwargs):
+        self.append({
+            "field_name": field_name,
+            "index_type": index_type or "FLAT",
+            "index_name": index_name or field_name,
+            "metric_type": metric_type or "COSINE",
+            "params": dict(params or kwargs.get("params", {}) or {}),
+        })
+
+
+class _QueryIterator:
+    def __init__(self, collection: _Collection, slots: np.ndarray, batch_size: int, output_fields):
+        self.collection = collection
+        self.slots = slots
+        self.batch_size = max(1, batch_size)
+        self.output_fields = output_fields
+        self.position = 0
+
+    def next(self) -> list:
+        batch = self.slots[self.position:self.position + self.batch_size]
+        self.position += len(batch)
+        return [self.collection.query_row(slot, self.output_fields) for slot in batch]
+
+    def close(self):
+        self.slots = self.slots[:0]
+
+
+class LocalVectorClient(VectorStoreClient):
+    """
+    Embedded, in-process stand-in for MilvusClient.
+
+    Databases are directories under `root` and collections are directories
+    inside them (see `_Collection`); every client in the process shares one
+    in-memory view per collection. Search is exact (FLAT, and HNSW, which
+    is not built locally) or inverted-file (IVF_*: k-means lists probed by
+    `nprobe`). Results use Milvus' shapes: `search` returns one list of
+    {"id", "distance", "entity"} hits per query, with COSINE/IP similarities
+    and squared L2 distances. Aliases resolve wherever a collection name is
+    accepted, as in Milvus.
+    """
+
+    def __init__(self, root: str, db_name: str = None):
+        self.root = root
+        self.db_name = db_name or DEFAULT_DATABASE
+        os.makedirs(os.path.join(root, DEFAULT_DATABASE), exist_ok=True)
+
+    # -- helpers
+
+    def _db_path(self, db_name: str = None) -> str:
+        return os.path.join(self.root, db_name or self.db_name)
+
+    def _collection_path(self, collection_name: str, db_name: str = None) -> str:
+        # like Milvus, an alias is accepted wherever a collection name is
+        name = self._alias_map(db_name).get(collection_name, collection_name)
+        return os.path.join(self._db_path(db_name), name)
+
+    def _alias_map(self, db_name: str = None) -> dict:
+        path = os.path.join(self._db_path(db_name), "aliases.json")
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        with _aliases_lock:
+            cached = _aliases.get(path)
+            if cached is None or cached[0] != mtime:
+                with open(path, "r", encoding="utf-8") as f:
+                    cached = _aliases[path] = (mtime, json.load(f))
+            return cached[1]
+
+    def _save_aliases(self, aliases: dict, db_name: str = None):
+        path = os.path.join(self._db_path(db_name), "aliases.json")
+        _write_json(path, aliases)
+        with _aliases_lock:
+            _aliases.pop(path, None)
+
+    def _collection(self, collection_name: str, db_name: str = None) -> _Collection:
+        path = self._collection_path(collection_name, db_name)
+        with _collections_lock:
+            collection = _collections.get(path)
+            if collection is None:
+                if not os.path.exists(os.path.join(path, "collection.json")):
+                    raise ValueError(f"Collection '{collection_name}' does not exist.")
+                collection = _Collection(path)
+                _collections[path] = collection
+            return collection
+
+    # -- databases
+
+    def list_databases(self, **kwargs):
+        return sorted(name for name in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, name)))
+
+    def create_database(self, db_name: str, **kwargs):
+        os.makedirs(self._db_path(db_name), exist_ok=True)
+
+    def drop_database(self, db_name: str, **kwargs):
+        path = self._db_path(db_name)
+        with _collections_lock:
+            for key in [key for key in _collections if key.startswith(path + os.sep)]:
+                del _collections[key]
+        shutil.rmtree(path, ignore_errors=True)
+
+    def use_database(self, db_name: str, **kwargs):
+        self.db_name = db_name
+
+    def using_database(self, db_name: str, **kwargs):
+        self.use_database(db_name)
+
+    # -- collections and partitions
+
+    def create_collection(self, collection_name: str, dimension: int = None, schema=None, **kwargs):
+        if collection_name in self._alias_map(kwargs.get("db_name")):
+            raise ValueError(f"'{collection_name}' is already an alias.")
+        path = self._collection_path(collection_name, kwargs.get("db_name"))
+        if os.path.exists(os.path.join(path, "collection.json")):
+            return
+        if isinstance(schema, dict):
+            # a describe_collection result, e.g. to create a copy of a collection
+            fields = [dict(field) for field in schema["fields"]]
+            dynamic = bool(schema.get("enable_dynamic_field"))
+        elif schema is not None:
+            fields = [_field_meta(field) for field in schema.fields]
+            dynamic = bool(getattr(schema, "enable_dynamic_field", False))
+        elif dimension is not None:
+            # MilvusClient quick setup
+            fields = [
+                {"name": kwargs.get("primary_field_name", "id"), "type": "INT64", "params": {},
+                 "is_primary": True, "auto_id": bool(kwargs.get("auto_id", False))},
+                {"name": kwargs.get("vector_field_name", "vector"), "type": "FLOAT_VECTOR",
+                 "params": {"dim": dimension}, "is_primary": False, "auto_id": False},
+            ]
+            dynamic = True
+        else:
+            raise ValueError("create_collection needs a schema or a dimension.")
+
+        primary = next(field for field in fields if field["is_primary"])
+        meta = {
+            "name": collection_name,
+            "collection_id": time.time_ns(),
+            "fields": fields,
+            "primary": primary["name"],
+            "auto_id": primary["auto_id"],
+            "dynamic": dynamic,
+            "vector_fields": {f["name"]: int(f["params"]["dim"]) for f in fields if f["type"] == "FLOAT_VECTOR"},
+            "scalar_fields": [f["name"] for f in fields if f["type"] != "FLOAT_VECTOR" and not f["is_primary"]],
+            "partitions": [DEFAULT_PARTITION],
+            "indexes": {},
+        }
+        collection = _Collection.create(path, meta)
+        with _collections_lock:
+            _collections[path] = collection
+
+    def drop_collection(self, collection_name: str, **kwargs):
+        if collection_name in self._alias_map(kwargs.get("db_name")):
+            raise ValueError(f"'{collection_name}' is an alias; drop the alias or its collection instead.")
+        path = self._collection_path(collection_name, kwargs.get("db_name"))
+        with _collections_lock:
+            _collections.pop(path, None)
+        shutil.rmtree(path, ignore_errors=True)
+
+    def has_collection(self, collection_name: str, **kwargs):
+        return os.path.exists(os.path.join(self._collection_path(collection_name, kwargs.get("db_name")),
+                                           "collection.json"))
+
+    def list_collections(self, **kwargs):
+        path = self._db_path(kwargs.get("db_name"))
+        if not os.path.isdir(path):
+            return []
+        return sorted(name for name in os.listdir(path)
+                      if os.path.exists(os.path.join(path, name, "collection.json")))
+
+    def rename_collection(self, old_name: str, new_name: str, **kwargs):
+        aliases = self._alias_map()
+        if old_name in aliases or new_name in aliases:
+            raise ValueError("Aliases cannot be renamed or renamed to; alter the alias instead.")
+        source = os.path.join(self._db_path(), old_name)
+        target = os.path.join(self._db_path(), new_name)
+        if not os.path.exists(os.path.join(source, "collection.json")):
+            raise ValueError(f"Collection '{old_name}' does not exist.")
+        if os.path.exists(target):
+            raise ValueError(f"Collection '{new_name}' already exists.")
+        with _collections_lock:
+            _collections.pop(source, None)
+            os.rename(source, target)
+            with open(os.path.join(target, "collection.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            meta["name"] = new_name
+            _write_json(os.path.join(target, "collection.json"), meta)
+
+    def describe_collection(self, collection_name: str, **kwargs):
+        meta = self._collection(collection_name).meta
+        return {
+            "collection_name": meta["name"],
+            "collection_id": meta.get("collection_id", 0),
+            "aliases": [alias for alias, target in self._alias_map().items() if target == meta["name"]],
+            "fields": [dict(field) for field in meta["fields"]],
+            "enable_dynamic_field": meta["dynamic"],
+            "num_partitions": len(meta["partitions"]),
+            "auto_id": meta["auto_id"],
+        }
+
+    def get_collection_stats(self, collection_name: str, **kwargs):
+        return {"row_count": self._collection(collection_name).row_count()}
+
+    # -- aliases (aliases.json in the database directory)
+
+    def create_alias(self, collection_name: str, alias: str, **kwargs):
+        aliases = dict(self._alias_map())
+        if alias in aliases or os.path.exists(os.path.join(self._db_path(), alias, "collection.json")):
+            raise ValueError(f"Alias '{alias}' is already a collection or an alias.")
+        if not os.path.exists(os.path.join(self._db_path(), collection_name, "collection.json")):
+            raise ValueError(f"Collection '{collection_name}' does not exist.")
+        aliases[alias] = collection_name
+        self._save_aliases(aliases)
+
+    def alter_alias(self, collection_name: str, alias: str, **kwargs):
+        aliases = dict(self._alias_map())
+        if alias not in aliases:
+            raise ValueError(f"Alias '{alias}' does not exist.")
+        if not os.path.exists(os.path.join(self._db_path(), collection_name, "collection.json")):
+            raise ValueError(f"Collection '{collection_name}' does not exist.")
+        aliases[alias] = collection_name
+        self._save_aliases(aliases)
+
+    def drop_alias(self, alias: str, **kwargs):
+        aliases = dict(self._alias_map())
+        if aliases.pop(alias, None) is not None:
+            self._save_aliases(aliases)
+
+    def describe_alias(self, alias: str, **kwargs):
+        aliases = self._alias_map()
+        if alias not in aliases:
+            raise ValueError(f"Alias '{alias}' does not exist.")
+        return {"alias": alias, "collection_name": aliases[alias], "db_name": self.db_name}
+
+    def list_aliases(self, collection_name: str = "", **kwargs):
+        aliases = [alias for alias, target in self._alias_map().items()
+                   if not collection_name or target == collection_name]
+        return {"aliases": aliases, "collection_name": collection_name, "db_name": self.db_name}
+
+    def create_partition(self, collection_name: str, partition_name: str, **kwargs):
+        collection = self._collection(collection_name)
+        with collection.lock:
+            if partition_name not in collection.meta["partitions"]:
+                collection.meta["partitions"].append(partition_name)
+                collection.save_meta()
+
+    def drop_partition(self, collection_name: str, partition_name: str, **kwargs):
+        if partition_name == DEFAULT_PARTITION:
+            raise ValueError("The default partition cannot be dropped.")
+        collection = self._collection(collection_name)
+        if partition_name in collection.meta["partitions"]:
+            collection.drop_partition(partition_name)
+
+    def has_partition(self, collection_name: str, partition_name: str, **kwargs):
+        return partition_name in self._collection(collection_name).meta["partitions"]
+
+    def list_partitions(self, collection_name: str, **kwargs):
+        return list(self._collection(collection_name).meta["partitions"])
+
+    # -- loading and indexes (everything is always searchable; load state is tracked for parity)
+
+    def load_collection(self, collection_name: str, **kwargs):
+        self._collection(collection_name).loaded = True
+
+    def release_collection(self, collection_name: str, **kwargs):
+        self._collection(collection_name).loaded = False
+
+    def load_partitions(self, collection_name: str, partition_names, **kwargs):
+        self._collection(collection_name).loaded = True
+
+    def release_partitions(self, collection_name: str, partition_names, **kwargs):
+        pass
+
+    def get_load_state(self, collection_name: str, **kwargs):
+        return {"state": "Loaded" if self._collection(collection_name).loaded else "NotLoad"}
+
+    def prepare_index_params(self, **kwargs):
+        return _IndexParams()
+
+    def create_index(self, collection_name: str, index_params, **kwargs):
+        collection = self._collection(collection_name)
+        for param in index_params:
+            if not isinstance(param, dict):
+                param = {key: getattr(param, key, None)
+                         for key in ("field_name", "index_type", "index_name", "metric_type", "params")}
+            field = param["field_name"]
+            if field not in collection.vectors:
+                # scalar indexes only speed Milvus up; filters are evaluated row by row here
+                continue
+            with collection.lock:
+                collection.meta["indexes"][field] = {
+                    "index_name": param.get("index_name") or field,
+                    "index_type": (param.get("index_type") or "FLAT").upper(),
+                    "metric_type": (param.get("metric_type") or "COSINE").upper(),
+                    "params": dict(param.get("params") or {}),
+                }
+                collection.save_meta()
+                collection.build_index(field)
+
+    def _index_field(self, collection: _Collection, index_name: str):
+        for field, spec in collection.meta["indexes"].items():
+            if spec["index_name"] == index_name:
+                return field
+        return None
+
+    def list_indexes(self, collection_name: str, field_name: str = "", **kwargs):
+        indexes = self._collection(collection_name).meta["indexes"]
+        return [spec["index_name"] for field, spec in indexes.items() if not field_name or field == field_name]
+
+    def describe_index(self, collection_name: str, index_name: str, **kwargs):
+        collection = self._collection(collection_name)
+        field = self._index_field(collection, index_name)
+        if field is None:
+            return None
+        spec = collection.meta["indexes"][field]
+        return {
+            **spec["params"],
+            "index_type": spec["index_type"],
+            "metric_type": spec["metric_type"],
+            "field_name": field,
+            "index_name": spec["index_name"],
+            "total_rows": collection.row_count(),
+            "indexed_rows": collection.row_count(),
+            "pending_index_rows": 0,
+            "state": "Finished",
+        }
+
+    def drop_index(self, collection_name: str, index_name: str, **kwargs):
+        collection = self._collection(collection_name)
+        field = self._index_field(collection, index_name)
+        if field is not None:
+            collection.drop_index(field)
+
+    # -- data
+
+    def insert(self, collection_name: str, data, partition_name: str = "", **kwargs):
+        rows = [data] if isinstance(data, dict) else list(data)
+        ids = self._collection(collection_name).insert(rows, partition_name or DEFAULT_PARTITION)
+        return {"insert_count": len(ids), "ids": ids}
+
+    def upsert(self, collection_name: str, data, partition_name: str = "", **kwargs):
+        if not kwargs.get("partial_update"):
+            raise NotImplementedError("The local store only supports upsert(..., partial_update=True).")
+        rows = [data] if isinstance(data, dict) else list(data)
+        ids = self._collection(collection_name).update(rows)
+        return {"upsert_count": len(ids), "ids": ids}
+
+    def delete(self, collection_name: str, ids=None, filter: str = "", partition_name: str = "", **kwargs):
+        collection = self._collection(collection_name)
+        if ids is not None and not isinstance(ids, (list, tuple)):
+            ids = [ids]
+        slots = collection.matching_slots(filter, [partition_name] if partition_name else None, ids)
+        primary = collection.meta["primary"]
+        return {"delete_count": collection.delete([collection.rows[slot][primary] for slot in slots])}
+
+    def search(self, collection_name: str, data, filter: str = "", limit: int = 10, output_fields=None,
+               search_params=None, partition_names=None, anns_field=None, **kwargs):
+        collection = self._collection(collection_name)
+        search_params = search_params or {}
+        field = anns_field or next(iter(collection.vectors))
+        index = collection.meta["indexes"].get(field, {})
+        metric = search_params.get("metric_type") or index.get("metric_type") or "COSINE"
+        params = search_params.get("params", {}) or {}
+        slots = collection.matching_slots(filter, partition_names)
+        primary = collection.meta["primary"]
+
+        results = []
+        for query in np.asarray(data, dtype=np.float32).reshape(len(data), -1):
+            top, distances = collection.search(field, query, limit, metric, params, slots)
+            results.append([
+                {"id": collection.rows[slot][primary], "distance": float(distance),
+                 "entity": collection.entity(slot, output_fields)}
+                for slot, distance in zip(top, distances)
+            ])
+        return results
+
+    def query(self, collection_name: str, filter: str = "", output_fields=None, partition_names=None, **kwargs):
+        collection = self._collection(collection_name)
+        slots = collection.matching_slots(filter, partition_names, kwargs.get("ids"))
+        offset = int(kwargs.get("offset", 0) or 0)
+        limit = kwargs.get("limit")
+        slots = slots[offset:offset + limit] if limit and limit > 0 else slots[offset:]
+        return [collection.query_row(slot, output_fields) for slot in slots]
+
+    def get(self, collection_name: str, ids, output_fields=None, **kwargs):
+        ids = ids if isinstance(ids, (list, tuple)) else [ids]
+        return self.query(collection_name, output_fields=output_fields, ids=list(ids))
+
+    def query_iterator(self, collection_name: str, batch_size: int = 1000, limit: int = -1, filter: str = "",
+                       output_fields=None, partition_names=None, **kwargs):
+        collection = self._collection(collection_name)
+        slots = collection.matching_slots(filter, partition_names)
+        if limit is not None and limit >= 0:
+            slots = slots[:limit]
+        return _QueryIterator(collection, slots, batch_size, output_fields)
+
+    # -- connection
+
+    def get_server_version(self, **kwargs):
+        return "local-numpy"
+
+    def close(self):
+        pass
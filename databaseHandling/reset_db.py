@@ -1,13 +1,14 @@
 from pymilvus import connections, Collection, MilvusClient, FieldSchema, CollectionSchema, DataType
 import os
 import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from databaseHandling.connection_manager import MILVUS_URI, MILVUS_TOKEN
+from databaseHandling.vector_store import create_client, drop_collection_and_aliases
 
 
 def reset_all_database():
-    client = MilvusClient(
-        uri="http://localhost:19530",
-        token="root:Milvus",
-    )
+    client = create_client(MILVUS_URI, MILVUS_TOKEN)
 
     # Delete existing database
     databases = client.list_databases()
@@ -15,7 +16,7 @@ def reset_all_database():
         client.use_database(db_name=db)
         collections = client.list_collections(db_name=db)
         for coll in collections:
-            client.drop_collection(collection_name=coll)
+            drop_collection_and_aliases(client, coll)
         if db != "default":
             client.drop_database(db_name=db)
         print(f"Dropped database '{db}'.")
@@ -0,0 +1,185 @@
+import os
+from abc import ABC, abstractmethod
+
+from pymilvus import CollectionSchema, MilvusClient
+
+
+# "milvus" talks to a Milvus server; "local" uses the embedded NumPy store in local_store.py.
+VECTOR_STORE = os.environ.get("VECTOR_STORE", "milvus").lower()
+LOCAL_STORE_PATH = os.environ.get("LOCAL_VECTOR_STORE_PATH", os.path.join("uploaded_files", "vector_store"))
+
+
+class VectorStoreClient(ABC):
+    """
+    The subset of the MilvusClient API the project relies on.
+
+    pymilvus' MilvusClient is registered as an implementation; local_store.LocalVectorClient
+    implements the same calls on memory-mapped NumPy files. Code that only
+    uses these methods runs unchanged on either backend.
+    """
+
+    # databases
+    @abstractmethod
+    def list_databases(self, **kwargs): ...
+
+    @abstractmethod
+    def create_database(self, db_name: str, **kwargs): ...
+
+    @abstractmethod
+    def drop_database(self, db_name: str, **kwargs): ...
+
+    @abstractmethod
+    def use_database(self, db_name: str, **kwargs): ...
+
+    # collections and partitions
+    @abstractmethod
+    def create_collection(self, collection_name: str, dimension: int = None, schema=None, **kwargs): ...
+
+    @abstractmethod
+    def drop_collection(self, collection_name: str, **kwargs): ...
+
+    @abstractmethod
+    def has_collection(self, collection_name: str, **kwargs): ...
+
+    @abstractmethod
+    def list_collections(self, **kwargs): ...
+
+    @abstractmethod
+    def rename_collection(self, old_name: str, new_name: str, **kwargs): ...
+
+    @abstractmethod
+    def describe_collection(self, collection_name: str, **kwargs): ...
+
+    @abstractmethod
+    def get_collection_stats(self, collection_name: str, **kwargs): ...
+
+    @abstractmethod
+    def create_partition(self, collection_name: str, partition_name: str, **kwargs): ...
+
+    @abstractmethod
+    def drop_partition(self, collection_name: str, partition_name: str, **kwargs): ...
+
+    @abstractmethod
+    def has_partition(self, collection_name: str, partition_name: str, **kwargs): ...
+
+    @abstractmethod
+    def list_partitions(self, collection_name: str, **kwargs): ...
+
+    # aliases
+    @abstractmethod
+    def create_alias(self, collection_name: str, alias: str, **kwargs): ...
+
+    @abstractmethod
+    def alter_alias(self, collection_name: str, alias: str, **kwargs): ...
+
+    @abstractmethod
+    def drop_alias(self, alias: str, **kwargs): ...
+
+    @abstractmethod
+    def describe_alias(self, alias: str, **kwargs): ...
+
+    @abstractmethod
+    def list_aliases(self, collection_name: str = "", **kwargs): ...
+
+    # loading and indexes
+    @abstractmethod
+    def load_collection(self, collection_name: str, **kwargs): ...
+
+    @abstractmethod
+    def release_collection(self, collection_name: str, **kwargs): ...
+
+    @abstractmethod
+    def load_partitions(self, collection_name: str, partition_names, **kwargs): ...
+
+    @abstractmethod
+    def release_partitions(self, collection_name: str, partition_names, **kwargs): ...
+
+    @abstractmethod
+    def get_load_state(self, collection_name: str, **kwargs): ...
+
+    @abstractmethod
+    def prepare_index_params(self, **kwargs): ...
+
+    @abstractmethod
+    def create_index(self, collection_name: str, index_params, **kwargs): ...
+
+    @abstractmethod
+    def list_indexes(self, collection_name: str, field_name: str = "", **kwargs): ...
+
+    @abstractmethod
+    def describe_index(self, collection_name: str, index_name: str, **kwargs): ...
+
+    @abstractmethod
+    def drop_index(self, collection_name: str, index_name: str, **kwargs): ...
+
+    # data
+    @abstractmethod
+    def insert(self, collection_name: str, data, partition_name: str = "", **kwargs): ...
+
+    @abstractmethod
+    def upsert(self, collection_name: str, data, partition_name: str = "", **kwargs): ...
+
+    @abstractmethod
+    def delete(self, collection_name: str, ids=None, filter: str = "", partition_name: str = "", **kwargs): ...
+
+    @abstractmethod
+    def search(self, collection_name: str, data, filter: str = "", limit: int = 10, output_fields=None,
+               search_params=None, partition_names=None, anns_field=None, **kwargs): ...
+
+    @abstractmethod
+    def query(self, collection_name: str, filter: str = "", output_fields=None, partition_names=None,
+              **kwargs): ...
+
+    @abstractmethod
+    def query_iterator(self, collection_name: str, batch_size: int = 1000, limit: int = -1, filter: str = "",
+                       output_fields=None, partition_names=None, **kwargs): ...
+
+    # connection
+    @abstractmethod
+    def get_server_version(self, **kwargs): ...
+
+    @abstractmethod
+    def close(self): ...
+
+
+VectorStoreClient.register(MilvusClient)
+
+
+def clone_schema(description: dict):
+    """A schema for `create_collection` equal to that of the collection `description` was read from."""
+    if VECTOR_STORE == "local":
+        # LocalVectorClient accepts its own describe_collection output
+        return description
+    return CollectionSchema.construct_from_dict(description)
+
+
+def drop_collection_and_aliases(client, collection_name: str):
+    """Drop the collection `collection_name` names, which may be an alias, and every alias pointing at it."""
+    physical = client.describe_collection(collection_name=collection_name)["collection_name"]
+    for alias in client.list_aliases(collection_name=physical)["aliases"]:
+        client.drop_alias(alias=alias)
+    client.drop_collection(collection_name=physical)
+
+
+def create_client(uri: str, token: str, db_name: str = None, alias: str = None,
+                  timeout: float = None) -> VectorStoreClient:
+    """
+    Client for the configured backend; `uri`, `token`, `alias` and `timeout` only apply to Milvus.
+
+    MilvusClients built with the same uri, token and database share one
+    pymilvus connection unless they are given distinct aliases, and closing
+    any of them removes that shared connection.
+    """
+    if VECTOR_STORE == "local":
+        from databaseHandling.local_store import LocalVectorClient
+        return LocalVectorClient(LOCAL_STORE_PATH, db_name=db_name)
+    if VECTOR_STORE != "milvus":
+        raise ValueError(f"Unknown VECTOR_STORE '{VECTOR_STORE}'. Expected 'milvus' or 'local'.")
+    kwargs = {"uri": uri, "token": token}
+    if db_name:
+        kwargs["db_name"] = db_name
+    if alias:
+        kwargs["alias"] = alias
+    if timeout:
+        kwargs["timeout"] = timeout
+    return MilvusClient(**kwargs)
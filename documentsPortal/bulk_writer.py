@@ -0,0 +1,100 @@
+import itertools
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+BULK_BATCH_SIZE = int(os.environ.get("BULK_INSERT_BATCH_SIZE", "256"))
+
+logger = logging.getLogger(__name__)
+
+
+def _batches(iterable, size: int):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class MilvusBulkWriter:
+    """
+    Streams chunks into a Milvus partition in fixed-size batches.
+
+    Chunks are consumed lazily from any iterable. Each batch is embedded into
+    one contiguous float32 matrix (rows reference it directly, no per-row
+    `.tolist()`), then inserted on a background thread while the next batch
+    is being embedded, so embedding and network I/O overlap.
+
+    `embed_fn(texts) -> np.ndarray` computes embeddings; when it is None the
+    chunks must already carry `metadata["embedding"]`. `row_fn(doc, vector)`
+    builds the row dict for one chunk. `on_insert(batch, ids)`, if given, is
+    called with every inserted batch and the primary keys Milvus assigned to
+    it, e.g. to index the same chunks lexically.
+    """
+
+    def __init__(self, client, collection_name: str, partition_name: str, row_fn,
+                 embed_fn=None, batch_size: int = BULK_BATCH_SIZE, on_insert=None):
+        self.client = client
+        self.collection_name = collection_name
+        self.partition_name = partition_name
+        self.row_fn = row_fn
+        self.embed_fn = embed_fn
+        self.batch_size = max(1, batch_size)
+        self.on_insert = on_insert
+
+    def _vectors(self, batch) -> np.ndarray:
+        if self.embed_fn is None:
+            vectors = np.stack([doc.metadata["embedding"] for doc in batch])
+        else:
+            vectors = self.embed_fn([doc.page_content for doc in batch])
+        return np.ascontiguousarray(vectors, dtype=np.float32)
+
+    def _insert(self, rows) -> tuple:
+        start = time.perf_counter()
+        result = self.client.insert(
+            collection_name=self.collection_name,
+            partition_name=self.partition_name,
+            data=rows,
+        )
+        return list(result.get("ids", [])), time.perf_counter() - start
+
+    def write(self, documents) -> dict:
+        stats = {"rows": 0, "batches": 0, "embed_seconds": 0.0, "insert_seconds": 0.0, "ids": []}
+        started = time.perf_counter()
+        pending = None
+
+        def collect(future, batch):
+            ids, seconds = future.result()
+            stats["ids"].extend(ids)
+            stats["insert_seconds"] += seconds
+            if self.on_insert is not None:
+                self.on_insert(batch, ids)
+
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="bulk-insert") as executor:
+            for batch in _batches(documents, self.batch_size):
+                embed_start = time.perf_counter()
+                vectors = self._vectors(batch)
+                stats["embed_seconds"] += time.perf_counter() - embed_start
+
+                rows = [self.row_fn(doc, vector) for doc, vector in zip(batch, vectors)]
+                if pending is not None:
+                    # at most one insert in flight keeps memory at ~2 batches
+                    collect(*pending)
+                pending = (executor.submit(self._insert, rows), batch)
+                stats["rows"] += len(rows)
+                stats["batches"] += 1
+            if pending is not None:
+                collect(*pending)
+
+        stats["wall_seconds"] = time.perf_counter() - started
+        stats["rows_per_second"] = stats["rows"] / stats["wall_seconds"] if stats["wall_seconds"] else 0.0
+        logger.info(
+            f"Bulk wrote {stats['rows']} rows to '{self.collection_name}/{self.partition_name}' "
+            f"in {stats['batches']} batches ({stats['rows_per_second']:.1f} rows/s)"
+        )
+        return stats
@@ -0,0 +1,262 @@
+import bisect
+import re
+
+
+# Section headers, matched once per document instead of once per line per chunk:
+#   ## Markdown header | Underlined header / ===== | ALL CAPS TITLE:
+SECTION_HEADER_PATTERN = re.compile(
+    r"^[ \t]*(?:"
+    r"#+[ \t]+(?P<markdown>.+?)"
+    r"|(?P<underlined>\S.*?)[ \t]*\n[ \t]*[=\-]{2,}"
+    r"|(?P<caps>[A-Z][A-Z \t]*):"
+    r")[ \t]*$",
+    re.MULTILINE,
+)
+
+# Where a unit longer than chunk_size may be cut: at a line break, or after a sentence.
+UNIT_BREAK_PATTERN = re.compile(r"[ \t]*\n\s*|(?<=[.!?])[ \t]+")
+
+
+def find_section_headers(text: str) -> list:
+    """Return `(start_offset, end_offset, title)` for every section header in `text`."""
+    return [
+        (match.start(), match.end(), next(group for group in match.groups() if group).strip())
+        for match in SECTION_HEADER_PATTERN.finditer(text)
+    ]
+
+
+def locate_chunks(text: str, chunks: list, chunk_overlap: int) -> list:
+    """Character offsets of each splitter chunk in `text` (same search the splitter's add_start_index does)."""
+    offsets = []
+    index, previous_len = 0, 0
+    for chunk in chunks:
+        search_from = max(0, index + previous_len - chunk_overlap)
+        found = text.find(chunk, search_from)
+        if found == -1:
+            found = text.find(chunk)
+        index = max(found, 0)
+        previous_len = len(chunk)
+        offsets.append((index, index + len(chunk)))
+    return offsets
+
+
+def classify_chunks(text: str, chunks: list, chunk_overlap: int, default_type: str = "semantic") -> list:
+    """
+    Label each chunk with its chunk_type, section_title and character offsets.
+
+    The document is scanned for headers once; each chunk is then resolved with
+    a binary search over header offsets. A chunk containing a header is a
+    "section_header" chunk; its section is the one in effect where it starts,
+    or the first header it contains when it starts before any header.
+    """
+    headers = find_section_headers(text)
+    header_starts = [start for start, _, _ in headers]
+    labels = []
+    for start, end in locate_chunks(text, chunks, chunk_overlap):
+        first_inside = bisect.bisect_left(header_starts, start)
+        contains_header = first_inside < len(headers) and header_starts[first_inside] < end
+        governing = bisect.bisect_right(header_starts, start) - 1
+        if governing >= 0:
+            section_title = headers[governing][2]
+        elif contains_header:
+            section_title = headers[first_inside][2]
+        else:
+            section_title = ""
+        labels.append({
+            "chunk_type": "section_header" if contains_header and default_type == "semantic" else default_type,
+            "section_title": section_title,
+            "start_offset": start,
+            "end_offset": end,
+        })
+    return labels
+
+
+def _is_title_line(line: str) -> bool:
+    """Short, unpunctuated line at the top of a block, e.g. "Governance Framework"."""
+    stripped = line.strip()
+    return (
+        0 < len(stripped) <= 80
+        and stripped[0].isupper()
+        and stripped[-1] not in ".,;?!"
+        and any(ch.isalpha() for ch in stripped)
+    )
+
+
+def structured_units(text: str) -> list:
+    """
+    Split `text` into its natural units: FAQ question/answer pairs, titled
+    sections and paragraphs.
+
+    A block is a run of non-blank lines. Title lines (section header patterns,
+    or short unpunctuated lines at the top of a block) start a new section and
+    stay attached to the content that follows them. A line ending in "?" starts
+    a question/answer unit that runs until the next question or blank line, the
+    same rule cleaning_scripts uses to build the FAQ JSON. Returns dicts with
+    `start`, `end`, `kind` ("faq", "section" or "paragraph") and `section_title`.
+    """
+    header_titles = {start: title for start, _, title in find_section_headers(text)}
+    units = []
+    section_title = ""
+    current = None
+    at_block_start = True
+
+    def close():
+        nonlocal current
+        if current is not None and not current["title_only"]:
+            units.append({k: current[k] for k in ("start", "end", "kind", "section_title")})
+            current = None
+
+    offset = 0
+    for line in text.split("\n"):
+        line_start, line_end = offset, offset + len(line)
+        offset = line_end + 1
+        stripped = line.strip()
+
+        if not stripped:
+            # a title-only block carries over to the next block
+            close()
+            at_block_start = True
+            continue
+
+        is_header = line_start in header_titles
+        is_title = is_header or (
+            _is_title_line(line) and (at_block_start or (current is not None and current["title_only"]))
+        )
+        at_block_start = False
+
+        if set(stripped) <= set("=-") and current is not None:
+            # underline of a header matched on the previous line
+            current["end"] = line_end
+            continue
+
+        if is_title:
+            if current is None or not current["title_only"]:
+                close()
+                current = {"start": line_start, "end": line_end, "kind": "section",
+                           "section_title": "", "title_only": True}
+            section_title = header_titles.get(line_start, stripped)
+            current["end"] = line_end
+            current["section_title"] = section_title
+        elif stripped.endswith("?"):
+            if current is not None and current["title_only"]:
+                current.update(end=line_end, kind="faq", title_only=False)
+            else:
+                close()
+                current = {"start": line_start, "end": line_end, "kind": "faq",
+                           "section_title": section_title, "title_only": False}
+        elif current is not None:
+            current["end"] = line_end
+            current["title_only"] = False
+        else:
+            current = {"start": line_start, "end": line_end, "kind": "paragraph",
+                       "section_title": section_title, "title_only": False}
+    close()
+    if current is not None:
+        # document ends on a bare title
+        units.append({k: current[k] for k in ("start", "end", "kind", "section_title")})
+    return units
+
+
+def _split_unit(text: str, unit: dict, number: int, text_splitter, chunk_size: int, chunk_overlap: int) -> list:
+    """
+    Cut a unit longer than `chunk_size` at line ends, and long lines at sentence
+    ends. Only a sentence longer than `chunk_size` goes to `text_splitter`.
+    """
+    spans = []
+    start = unit["start"]
+    for match in UNIT_BREAK_PATTERN.finditer(text, unit["start"], unit["end"]):
+        if match.start() > start:
+            spans.append((start, match.start()))
+        start = match.end()
+    if unit["end"] > start:
+        spans.append((start, unit["end"]))
+
+    pieces = []
+    for start, end in spans:
+        kind = unit["kind"] if not pieces else "paragraph"
+        if end - start <= chunk_size:
+            pieces.append({"start": start, "end": end, "kind": kind, "section_title": unit["section_title"],
+                           "unit": number})
+            continue
+        sub_chunks = text_splitter.split_text(text[start:end])
+        for n, (sub_start, sub_end) in enumerate(locate_chunks(text[start:end], sub_chunks, chunk_overlap)):
+            pieces.append({
+                "start": start + sub_start,
+                "end": start + sub_end,
+                "kind": kind if n == 0 else "split",
+                "section_title": unit["section_title"],
+                "unit": number,
+                "oversized": True,
+            })
+    return pieces
+
+
+def structured_chunks(text: str, text_splitter, chunk_size: int, chunk_overlap: int,
+                      default_type: str = "semantic") -> list:
+    """
+    Chunk `text` along its structure instead of by character count.
+
+    Each FAQ pair becomes its own chunk; consecutive paragraphs of the same
+    section are packed together up to `chunk_size` characters without any
+    overlap. Units longer than `chunk_size` are cut at line and sentence ends
+    and their pieces packed the same way; only a single sentence longer than
+    `chunk_size` falls back to `text_splitter`. Returns `(chunk_text, metadata)`
+    pairs with the same metadata keys as `classify_chunks`.
+    """
+    pieces = []
+    for number, unit in enumerate(structured_units(text)):
+        if unit["end"] - unit["start"] <= chunk_size:
+            pieces.append(dict(unit, unit=number))
+        else:
+            pieces.extend(_split_unit(text, unit, number, text_splitter, chunk_size, chunk_overlap))
+
+    chunks = []
+    current = None
+    for piece in pieces:
+        can_merge = (
+            current is not None
+            and not current.get("oversized")
+            and not piece.get("oversized")
+            and piece["section_title"] == current["section_title"]
+            and piece["end"] - current["start"] <= chunk_size
+            and (piece["unit"] == current["unit"]
+                 or (piece["kind"] == "paragraph" and current["kind"] in ("paragraph", "section")))
+        )
+        if can_merge:
+            current["end"] = piece["end"]
+            current["unit"] = piece["unit"]
+            continue
+        if current is not None:
+            chunks.append(current)
+        current = dict(piece)
+    if current is not None:
+        chunks.append(current)
+
+    results = []
+    for chunk in chunks:
+        if default_type != "semantic":
+            chunk_type = default_type
+        elif chunk["kind"] == "faq":
+            chunk_type = "faq"
+        elif chunk["kind"] == "section":
+            chunk_type = "section_header"
+        else:
+            chunk_type = "semantic"
+        results.append((text[chunk["start"]:chunk["end"]], {
+            "chunk_type": chunk_type,
+            "section_title": chunk["section_title"],
+            "start_offset": chunk["start"],
+            "end_offset": chunk["end"],
+        }))
+    return results
+
+
+def chunk_text(text: str, text_splitter, chunk_size: int, chunk_overlap: int,
+               mode: str = "recursive", default_type: str = "semantic") -> list:
+    """Chunk `text` with the given mode ("recursive" or "structured") into `(chunk_text, metadata)` pairs."""
+    if mode == "structured":
+        return structured_chunks(text, text_splitter, chunk_size, chunk_overlap, default_type)
+    if mode != "recursive":
+        raise ValueError(f"Unknown chunking mode '{mode}'")
+    chunks = text_splitter.split_text(text)
+    return list(zip(chunks, classify_chunks(text, chunks, chunk_overlap, default_type)))
@@ -1,19 +1,37 @@
 import os
 import re
-from PyPDF2 import PdfReader
+import sys
 from pytesseract import image_to_string
 from PIL import Image
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
-from pymilvus import FieldSchema, CollectionSchema, DataType, MilvusClient
-from sentence_transformers import SentenceTransformer
+from pymilvus import FieldSchema, CollectionSchema, DataType
 import logging
 import base64
+import hashlib
+import io
+import itertools
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import requests
 import ollama
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from databaseHandling.connection_manager import get_manager, DATABASE_NAME
+from databaseHandling.index_manager import get_index_manager
+from documentsPortal.bulk_writer import MilvusBulkWriter
+from documentsPortal.chunking import chunk_text, classify_chunks
+from documentsPortal.pdf_extraction import iter_pdf_pages
+from embeddingService import embedding_cache
+from monitoring import metrics
+from retrieval import answer_cache, federated_search, lexical_index, search_cache
 
 OLLAMA_MODEL = "qwen3-vl:2b-instruct"
 
+@metrics.timed("ingestion", "load_document")
 def load_document(file_path: str) -> str:
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"The file {file_path} does not exist.")
@@ -38,74 +56,181 @@ def load_text_file(file_path: str) -> str:
     return content
 
 
-def load_pdf_file(file_path: str) -> str:
-    reader = PdfReader(file_path)
-    content = ""
-    for page in reader.pages:
-        text = page.extract_text() or ""
-        content += text + "\n"
-    content = {"text": content}
+def load_pdf_file(file_path: str) -> dict:
+    # Pages are extracted lazily by a process pool; see pdf_extraction.iter_pdf_pages.
+    content = {"pages": iter_pdf_pages(file_path)}
     return content
 
-def load_image_file(file_path: str) -> str:
-
-    print(f"[DEBUG] Using Ollama model {OLLAMA_MODEL} for OCR on {file_path}")
-
+DESCRIPTION_PROMPT = (
+    "You are an expert image analyst. "
+    "Describe the content of the image in a few words. "
+    "Give precisely, if available, details about tables, graphs, charts. "
+    "Do not mention text recognition in your description. "
+    "Output only the description without any additional commentary. "
+)
+
+HANDWRITING_PROMPT = (
+    "Determine whether the image contains handwritten or printed text. Take the decision carefully. "
+    "If any handwritten text is present, extract all visible text exactly as it appears. "
+    "If the image contains only printed text, return 'No text found.' "
+    "Do not explain or add commentary. "
+    "Output only the extracted text. "
+)
+
+STRUCTURED_IMAGE_PROMPT = (
+    "You are an expert image analyst. Respond with a JSON object with exactly these keys:\n"
+    '"description": the content of the image in a few words, giving precisely, if available, '
+    "details about tables, graphs, charts, without mentioning text recognition;\n"
+    '"handwritten": true if any handwritten text is present, otherwise false. Take the decision carefully;\n'
+    '"text": if handwritten text is present, all visible text exactly as it appears, otherwise an empty string.\n'
+    "Output only the JSON object."
+)
+
+# "single": one structured VLM call; "concurrent": the two original prompts run in parallel.
+IMAGE_INGEST_MODE = os.environ.get("IMAGE_INGEST_MODE", "single")
+IMAGE_MAX_SIDE = int(os.environ.get("IMAGE_MAX_SIDE", "1024"))
+IMAGE_CACHE_SIZE = int(os.environ.get("IMAGE_CACHE_SIZE", "32"))
+
+_encoded_images = OrderedDict()
+_encoded_images_lock = threading.Lock()
+_image_executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix="image-ingest")
+
+
+def encode_image(file_path: str) -> str:
+    """
+    Downscale an image so its longest side is at most IMAGE_MAX_SIDE and
+    base64-encode it. Results are cached by the SHA-256 of the file bytes.
+    """
     with open(file_path, "rb") as f:
-        encoded_image = base64.b64encode(f.read()).decode("utf-8")
-
-    description_response = ollama.generate(
+        raw = f.read()
+    digest = hashlib.sha256(raw).hexdigest()
+    with _encoded_images_lock:
+        if digest in _encoded_images:
+            _encoded_images.move_to_end(digest)
+            return _encoded_images[digest]
+
+    image = Image.open(io.BytesIO(raw))
+    if max(image.size) > IMAGE_MAX_SIDE:
+        image.thumbnail((IMAGE_MAX_SIDE, IMAGE_MAX_SIDE))
+        buffer = io.BytesIO()
+        image.convert("RGB").save(buffer, format="JPEG", quality=90)
+        raw = buffer.getvalue()
+    encoded_image = base64.b64encode(raw).decode("utf-8")
+
+    with _encoded_images_lock:
+        _encoded_images[digest] = encoded_image
+        while len(_encoded_images) > IMAGE_CACHE_SIZE:
+            _encoded_images.popitem(last=False)
+    return encoded_image
+
+
+def _timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def _tesseract(file_path: str) -> str:
+    return image_to_string(Image.open(file_path))
+
+
+def _understand_single(encoded_image: str, timings: dict):
+    """One VLM call returning description, handwriting flag and text as JSON."""
+    response, timings["vlm_ms"] = _timed(
+        ollama.generate,
         model=OLLAMA_MODEL,
-        prompt=(
-            "You are an expert image analyst. "
-            "Describe the content of the image in a few words. "
-            "Give precisely, if available, details about tables, graphs, charts. "
-            "Do not mention text recognition in your description. "
-            "Output only the description without any additional commentary. "
-        ),
+        prompt=STRUCTURED_IMAGE_PROMPT,
         images=[encoded_image],
+        format="json",
     )
-    print(f"[DEBUG] Ollama image description response: {description_response['response']}")
-    # Use Ollama’s Python client
-    response = ollama.generate(
-        model=OLLAMA_MODEL,
-        prompt=(
-            "Determine whether the image contains handwritten or printed text. Take the decision carefully. "
-            "If any handwritten text is present, extract all visible text exactly as it appears. "
-            "If the image contains only printed text, return 'No text found.' "
-            "Do not explain or add commentary. "
-            "Output only the extracted text. "
-        ),
-        images=[encoded_image],
+    logging.debug(f"Ollama structured image response: {response.get('response')}")
+    try:
+        parsed = json.loads(response.get("response", ""))
+    except (TypeError, json.JSONDecodeError):
+        return None
+    description = str(parsed.get("description", "")).strip()
+    text = str(parsed.get("text", "")).strip() if parsed.get("handwritten") else ""
+    return description, text
+
+
+def _understand_concurrent(encoded_image: str, file_path: str, timings: dict):
+    """The original description and handwriting prompts, run side by side with tesseract."""
+    description_future = _image_executor.submit(
+        _timed, ollama.generate, model=OLLAMA_MODEL, prompt=DESCRIPTION_PROMPT, images=[encoded_image]
+    )
+    extraction_future = _image_executor.submit(
+        _timed, ollama.generate, model=OLLAMA_MODEL, prompt=HANDWRITING_PROMPT, images=[encoded_image]
     )
+    # OCR is cheap next to the VLM calls; starting it now hides its latency
+    ocr_future = _image_executor.submit(_timed, _tesseract, file_path)
 
-    print(f"[DEBUG] Ollama response: {response}")
+    description_response, timings["description_ms"] = description_future.result()
+    response, timings["extraction_ms"] = extraction_future.result()
+    logging.debug(f"Ollama image description response: {description_response['response']}")
+    logging.debug(f"Ollama response: {response}")
 
     if not response or "response" not in response:
         raise ValueError("No response from Ollama model.")
-    
-    if "No text found." in response.get("response", ""):
-        print("[DEBUG] No text found by Ollama, falling back to pytesseract OCR.")
-        image = Image.open(file_path)
-        text = image_to_string(image)
+
+    extracted = response.get("response", "")
+    if "No text found." in extracted:
+        logging.debug("No text found by Ollama, falling back to pytesseract OCR.")
+        text, timings["ocr_ms"] = ocr_future.result()
+    else:
+        logging.debug("Text successfully extracted by Ollama.")
+        ocr_future.cancel()
+        text = extracted.strip()
+    return description_response.get("response", "").strip(), text
+
+
+def load_image_file(file_path: str, mode: str = None) -> dict:
+
+    mode = mode or IMAGE_INGEST_MODE
+    logging.debug(f"Using Ollama model {OLLAMA_MODEL} ({mode} mode) for OCR on {file_path}")
+
+    started = time.perf_counter()
+    timings = {}
+    encoded_image, timings["encode_ms"] = _timed(encode_image, file_path)
+
+    result = _understand_single(encoded_image, timings) if mode == "single" else None
+    if result is None:
+        if mode == "single":
+            logging.debug("Structured response was not valid JSON, running the two prompts concurrently.")
+        description, text = _understand_concurrent(encoded_image, file_path, timings)
     else:
-        print("[DEBUG] Text successfully extracted by Ollama.")
-    
+        description, text = result
+        if not text:
+            # printed text only: tesseract is the better reader, and only needed now
+            logging.debug("No handwritten text found by Ollama, falling back to pytesseract OCR.")
+            text, timings["ocr_ms"] = _timed(_tesseract, file_path)
+
+    timings["total_ms"] = (time.perf_counter() - started) * 1000
+    logging.debug(f"Image ingestion timings: {timings}")
+
     content = {
-        "text": response.get("response", "").strip() if "No text found." not in response.get("response", "") else text,
-        "description": description_response.get("response", "").strip()
+        "text": text,
+        "description": description,
+        "timings": timings,
     }
 
     return content
 
 
+# "recursive": character splitter with overlap; "structured": FAQ pairs, sections and paragraphs.
+CHUNKING_MODE = os.environ.get("CHUNKING_MODE", "recursive")
+
+
+# PDFs come back as a lazy chunk stream; their parsing and chunking happen while the chunks are embedded
+@metrics.timed("ingestion", "chunking")
 def perform_semantic_chunking(
     document: str,
     source: str,
     chunk_size: int = 500,
     chunk_overlap: int = 100,
+    chunking_mode: str = None,
 ):
 
+    chunking_mode = chunking_mode or CHUNKING_MODE
     text_splitter = RecursiveCharacterTextSplitter(
         separators=["\n\n", "\n", ". ", " ", "", "? "],
         chunk_size=chunk_size,
@@ -113,46 +238,38 @@ def perform_semantic_chunking(
         length_function=len,
     )
 
+    if isinstance(document, dict) and "pages" in document:
+        # not materialized: the bulk writer embeds the first pages while later ones are still parsed
+        return [iter_page_chunks(document["pages"], source, text_splitter, chunk_size, chunk_overlap,
+                                 chunking_mode)]
+
     documents_to_embed = [document.get("text", "")] if isinstance(document, dict) else [document]
-    if document.get("description"):
+    if isinstance(document, dict) and document.get("description"):
         documents_to_embed.append(document.get("description"))
-    
-    documents = []
-    for i in range(len(documents_to_embed)):
-        document = documents_to_embed[i]
-        semantic_chunks = text_splitter.split_text(document)
-        print(f"Document split into {len(semantic_chunks)} semantic chunks")
 
-        section_patterns = [
-            r"^#+\s+(.+)$",      # Markdown headers:  ## Section
-            r"^.+\n[=\-]{2,}$",  # Underlined headers
-            r"^[A-Z\s]+:$",      # ALL CAPS section titles:
-        ]
+    documents = []
+    for i, text in enumerate(documents_to_embed):
+        chunks = chunk_text(
+            text,
+            text_splitter,
+            chunk_size,
+            chunk_overlap,
+            mode=chunking_mode,
+            default_type="image_description" if i == 1 else "semantic",
+        )
+        print(f"Document split into {len(chunks)} {chunking_mode} chunks")
 
         docs = []
-
-        for j, chunk in enumerate(semantic_chunks):
-            chunk_lines = chunk.split("\n")
-            for line in chunk_lines:
-                for pattern in section_patterns:
-                    if re.match(pattern, line.strip()):
-                        chunk_type = "section_header"
-                        break
-                    else:
-                        chunk_type = "semantic"
-                    if i == 1:
-                        chunk_type = "image_description"
-                
-            words = re.findall(r"\b\w+\b", chunk.lower())
-
+        for j, (chunk, label) in enumerate(chunks):
             doc = Document(
                 page_content=chunk,
                 metadata={
                     "source": source,
                     "chunk_id": j,
-                    "total_chunks": len(semantic_chunks),
+                    "chunk_index": j,
+                    "total_chunks": len(chunks),
                     "chunk_size": len(chunk),
-                    "chunk_type": "semantic",
+                    **label,
                 },
             )
             docs.append(doc)
@@ -160,98 +277,401 @@ def perform_semantic_chunking(
 
     return documents
 
+def iter_page_chunks(pages, source: str, text_splitter, chunk_size: int = 500, chunk_overlap: int = 100,
+                     chunking_mode: str = "recursive"):
+    """
+    Chunk a stream of `(page_number, text)` pairs page by page.
+
+    Chunks are yielded as soon as their page arrives and carry the page number
+    in their metadata; `chunk_index` keeps counting across pages and offsets
+    are relative to the page text.
+    """
+    chunk_id = 0
+    for page_number, text in pages:
+        for chunk, label in chunk_text(text, text_splitter, chunk_size, chunk_overlap, mode=chunking_mode):
+            doc = Document(
+                page_content=chunk,
+                metadata={
+                    "source": source,
+                    "chunk_id": chunk_id,
+                    "chunk_index": chunk_id,
+                    "page": page_number,
+                    "chunk_size": len(chunk),
+                    **label,
+                },
+            )
+            chunk_id += 1
+            yield doc
+
+def embed_texts(texts: list, model_name: str):
+    # unchanged text is served from the on-disk embedding cache instead of being re-encoded
+    return embedding_cache.encode(texts, model_name)
+
+@metrics.timed("ingestion", "embedding")
 def perform_embedding_generation(chunked_docs: list, model_name: str) -> list:
-    model = SentenceTransformer(model_name)
+    chunked_docs = [list(doc_group) for doc_group in chunked_docs]
     for doc_group in chunked_docs:
         texts = [doc.page_content for doc in doc_group]
-        embeddings = model.encode(texts, convert_to_numpy=True).astype("float32")
+        embeddings = embed_texts(texts, model_name)
         for doc, embedding in zip(doc_group, embeddings):
             doc.metadata["embedding"] = embedding
         
     return chunked_docs
 
-def toDB(documents, partition_name="document_chunks", collection_name="default_bank"):
-
-    client = MilvusClient(
-        uri="http://localhost:19530",
-        token="root:Milvus",
-    )
-    try:
-        client.use_database("Banks_DB")
-    except:
-        client.create_database("Banks_DB")
-        client.use_database("Banks_DB")
-        logging.info("Created and switched to database 'Banks_DB'")
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
 
-    documents = [doc for sublist in documents for doc in sublist]
-    schema = CollectionSchema(
+def document_schema(dim: int) -> CollectionSchema:
+    return CollectionSchema(
         [
             FieldSchema(name="chunk_id", dtype=DataType.INT64, is_primary=True, auto_id=True),
             FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=4096),
             FieldSchema(name="source", dtype=DataType.VARCHAR, max_length=1024),
             FieldSchema(name="chunk_size", dtype=DataType.INT64),
             FieldSchema(name="chunk_type", dtype=DataType.VARCHAR, max_length=256),
-            FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=len(documents[0].metadata["embedding"])),
+            FieldSchema(name="content_hash", dtype=DataType.VARCHAR, max_length=64),
+            FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=dim),
         ],
         description="Document chunks with embeddings",
+        enable_dynamic_field=True,
     )
 
+
+def ensure_collection(client, collection_name: str, dim: int) -> bool:
+    """
+    Create the collection if needed and hand it to the index manager, which
+    builds the index once (sized to the row count) and keeps it loaded.
+
+    Returns True when the collection stores `content_hash`, i.e. supports
+    incremental ingestion; collections created before that field existed
+    fall back to full partition rewrites.
+    """
+    index_manager = get_index_manager()
     if not client.has_collection(collection_name=collection_name):
-        client.create_collection(
-            collection_name=collection_name,
-            schema=schema,
-        )
+        index_manager.create_collection(client, collection_name, document_schema(dim))
         logging.info(f"Collection '{collection_name}' created.")
-    else:
-        logging.info(f"Collection '{collection_name}' already exists.")
 
-    if not client.has_partition(collection_name=collection_name, partition_name=partition_name):
+    index_manager.ensure_ready(client, collection_name)
+
+    fields = client.describe_collection(collection_name=collection_name)["fields"]
+    return any(field["name"] == "content_hash" for field in fields)
+
+
+def _recreate_partition(client, collection_name: str, partition_name: str):
+    # the partition starts empty, so do its BM25 segments
+    lexical_index.get_index(collection_name).drop_partition(partition_name)
+    if client.has_partition(collection_name=collection_name, partition_name=partition_name):
+        client.release_partitions(collection_name=collection_name, partition_names=[partition_name])
+        client.drop_partition(collection_name=collection_name, partition_name=partition_name)
         client.create_partition(
             collection_name=collection_name,
             partition_name=partition_name,
         )
-        logging.info(f"Partition '{partition_name}' created in collection '{collection_name}'.")
+        search_cache.bump_version(collection_name)
+        logging.info(f"Partition '{partition_name}' recreated in collection '{collection_name}'.")
     else:
-        client.release_partitions(collection_name=collection_name, partition_names=[partition_name])
-        client.drop_partition(collection_name=collection_name, partition_name=partition_name)
         client.create_partition(
             collection_name=collection_name,
             partition_name=partition_name,
         )
-        logging.info(f"Partition '{partition_name}' recreated in collection '{collection_name}'.")
+        logging.info(f"Partition '{partition_name}' created in collection '{collection_name}'.")
+    client.load_partitions(collection_name=collection_name, partition_names=[partition_name])
+
+
+# Where a chunk sits in its document; updated in place when a kept chunk moves.
+# `chunk_index` is the chunk's ordinal in the document (the "chunk_id" field is the primary key).
+POSITION_FIELDS = ("chunk_type", "section_title", "start_offset", "end_offset", "page", "chunk_index")
+
+
+def _row(doc, embedding, with_hash: bool = True) -> dict:
+    # One row matching the schema; `embedding` is a float32 row of the batch matrix
+    row = {
+        "text": doc.page_content,
+        "source": doc.metadata["source"],
+        "chunk_size": doc.metadata["chunk_size"],
+        "chunk_type": doc.metadata["chunk_type"],
+        "embedding": embedding,
+    }
+    if with_hash:
+        row["content_hash"] = doc.metadata.get("content_hash") or chunk_hash(doc.page_content)
+        # stored as dynamic fields
+        for key in POSITION_FIELDS[1:]:
+            if key in doc.metadata:
+                row[key] = doc.metadata[key]
+    return row
+
+
+def _bulk_writer(client, collection_name: str, partition_name: str, with_hash: bool = True,
+                 model_name: str = None, lexical=None) -> MilvusBulkWriter:
+    """
+    Writer that embeds with `model_name`, or uses precomputed embeddings when it is None.
+
+    Inserted chunks are also added to `lexical`, a lexical_index.SegmentBuilder,
+    under the primary keys Milvus assigned to them.
+    """
+    return MilvusBulkWriter(
+        client,
+        collection_name,
+        partition_name,
+        row_fn=lambda doc, embedding: _row(doc, embedding, with_hash=with_hash),
+        embed_fn=(lambda texts: embed_texts(texts, model_name)) if model_name else None,
+        # an empty builder is falsy
+        on_insert=((lambda batch, ids: lexical.add(ids, [doc.page_content for doc in batch]))
+                   if lexical is not None else None),
+    )
+
+
+def _write_chunks(client, collection_name: str, partition_name: str, documents,
+                  with_hash: bool = True, model_name: str = None) -> dict:
+    """Bulk write chunks to Milvus and commit the same chunks as one BM25 segment."""
+    lexical = lexical_index.SegmentBuilder(partition_name)
+    write_stats = _bulk_writer(client, collection_name, partition_name, with_hash=with_hash,
+                               model_name=model_name, lexical=lexical).write(documents)
+    lexical_index.get_index(collection_name).commit(lexical)
+    return write_stats
+
 
-    # Prepare data as list of dictionaries matching the schema
-    data = []
-    for doc in documents:
-        data.append({
-            "text": doc.page_content,
-            "source": doc.metadata["source"],
-            "chunk_size": doc.metadata["chunk_size"],
-            "chunk_type": doc.metadata["chunk_type"],
-            "embedding": doc.metadata["embedding"].tolist(),
-        })
-
-    client.insert(
+def _mark_changed(client, collection_name: str):
+    # search results and answers computed from the previous contents are now stale
+    search_cache.bump_version(collection_name)
+    federated_search.invalidate_schema(collection_name)
+    answer_cache.get_cache().invalidate_bank(collection_name)
+    # the collection may have outgrown its index (rebuilt in the background)
+    get_index_manager().maybe_rebuild(client, collection_name)
+
+
+def _remap_rebuilt(client, collection_name: str, old_ids, new_ids):
+    # an index rebuild copied the chunks under new primary keys
+    lexical_index.get_index(collection_name).remap_ids(old_ids, new_ids)
+    search_cache.bump_version(collection_name)
+
+
+get_index_manager().on_swap(_remap_rebuilt)
+
+
+def toDB(documents, partition_name="document_chunks", collection_name="default_bank", client=None):
+
+    if client is None:
+        # Borrow a pooled client already bound to Banks_DB (created on first use).
+        with get_manager().client(DATABASE_NAME) as client:
+            return toDB(documents, partition_name, collection_name, client=client)
+
+    documents = [doc for sublist in documents for doc in sublist]
+    with partition_lock(collection_name, partition_name), get_index_manager().writing(collection_name), \
+            metrics.stage("ingestion", "store"):
+        has_hash = ensure_collection(client, collection_name, dim=len(documents[0].metadata["embedding"]))
+        _recreate_partition(client, collection_name, partition_name)
+
+        write_stats = _write_chunks(client, collection_name, partition_name, documents, with_hash=has_hash)
+
+        _mark_changed(client, collection_name)
+    metrics.ROWS.inc(write_stats["rows"], outcome="embedded")
+
+    logging.info(f"Inserted {len(documents)} documents into collection '{collection_name}' "
+                 f"({write_stats['rows_per_second']:.1f} rows/s).")
+    return write_stats
+
+
+def _position(values: dict) -> tuple:
+    return tuple(values.get(key) for key in POSITION_FIELDS)
+
+
+def _existing_chunks(client, collection_name: str, partition_name: str) -> dict:
+    """Map content_hash -> list of (primary key, position) already stored in the partition."""
+    existing = {}
+    iterator = client.query_iterator(
         collection_name=collection_name,
-        partition_name=partition_name,
-        data=data,
+        batch_size=1000,
+        filter="chunk_id >= 0",
+        output_fields=["chunk_id", "content_hash", *POSITION_FIELDS],
+        partition_names=[partition_name],
     )
+    try:
+        while True:
+            batch = iterator.next()
+            if not batch:
+                break
+            for row in batch:
+                existing.setdefault(row["content_hash"], []).append((row["chunk_id"], _position(row)))
+    finally:
+        iterator.close()
+    return existing
+
+
+def _count_chunks(stats: dict):
+    for outcome in ("total", "reused", "embedded", "deleted", "relocated"):
+        metrics.ROWS.inc(stats[f"chunks_{outcome}"], outcome=outcome)
+
+
+def ingest_document(chunked_docs: list,
+                    collection_name: str,
+                    partition_name: str,
+                    model_name: str = "all-MiniLM-L6-v2",
+                    client=None,
+                    stage=None) -> dict:
+    """
+    Idempotently sync a chunked document into its partition.
+
+    Each chunk is identified by the SHA-256 of its text. Chunks whose hash is
+    already stored are kept, new or changed chunks are embedded and inserted,
+    and stored chunks that no longer appear in the document are deleted. A
+    kept chunk whose position (page, offsets, section, type, ordinal) moved,
+    e.g. after an edit higher up in the document, gets its position fields
+    updated in place, without re-embedding. Returns per-upload counts of
+    reused, relocated, embedded and deleted chunks.
+
+    Syncs of the same partition are serialized, so two uploads of one file
+    cannot both insert the same new chunks, and wait while the collection is
+    being copied for an index rebuild.
+
+    `stage`, if given, is called as `stage("embed")` / `stage("store")` and
+    must return a context manager; the ingestion job queue uses it to time
+    and throttle each stage. Without it the stages are only recorded in the
+    "ingestion" stage histogram.
+    """
+    if client is None:
+        with get_manager().client(DATABASE_NAME) as client:
+            return ingest_document(chunked_docs, collection_name, partition_name, model_name,
+                                   client=client, stage=stage)
+    stage = stage or (lambda name: metrics.stage("ingestion", name))
+
+    # a lazy stream for PDFs; it is consumed once, while embedding
+    documents = (doc for sublist in chunked_docs for doc in sublist)
+
+    with partition_lock(collection_name, partition_name), get_index_manager().writing(collection_name):
+        return _sync_partition(client, documents, collection_name, partition_name, model_name, stage)
+
+
+def _update_positions(client, collection_name: str, partition_name: str, relocated: list,
+                      batch_size: int = 1000):
+    """Write the new position fields of kept chunks, given as (primary key, doc) pairs, in place."""
+    for start in range(0, len(relocated), batch_size):
+        batch = relocated[start:start + batch_size]
+        rows = [{"chunk_id": pk, **{key: doc.metadata[key] for key in POSITION_FIELDS if key in doc.metadata}}
+                for pk, doc in batch]
+        result = client.upsert(collection_name=collection_name, data=rows, partition_name=partition_name,
+                               partial_update=True)
+        old_ids = [pk for pk, _ in batch]
+        new_ids = list(result.get("ids") or old_ids)
+        if new_ids != old_ids:
+            # the server assigned new primary keys; move the chunks' BM25 entries along
+            index = lexical_index.get_index(collection_name)
+            index.delete(old_ids)
+            index.add(partition_name, new_ids, [doc.page_content for _, doc in batch])
+
+
+_partition_locks = {}
+_partition_locks_lock = threading.Lock()
+
+
+def partition_lock(collection_name: str, partition_name: str) -> threading.Lock:
+    """The lock serializing writes to one (collection, partition) in this process."""
+    with _partition_locks_lock:
+        return _partition_locks.setdefault((collection_name, partition_name), threading.Lock())
+
+
+def _sync_partition(client, documents, collection_name: str, partition_name: str, model_name: str,
+                    stage) -> dict:
+    dim = None
+    if not client.has_collection(collection_name=collection_name):
+        # only a new collection needs the dimension; the vector usually comes from the embedding cache
+        first = next(documents, None)
+        dim = embed_texts([first.page_content if first else ""], model_name).shape[1]
+        documents = itertools.chain([first] if first else [], documents)
+    incremental = ensure_collection(client, collection_name, dim=dim)
+    stats = {
+        "chunks_total": 0,
+        "chunks_reused": 0,
+        "chunks_embedded": 0,
+        "chunks_relocated": 0,
+        "chunks_deleted": 0,
+        "full_rewrite": not incremental,
+    }
 
-    index_params = client.prepare_index_params()
-    index_params.add_index(
-        field_name="embedding",
-        index_type="IVF_FLAT",
-        metric_type="L2",
-        params={"nlist": 128}
+    if not incremental:
+        logging.info(f"Collection '{collection_name}' has no content_hash field; rewriting partition.")
+        with stage("store"):
+            _recreate_partition(client, collection_name, partition_name)
+        with stage("embed"):
+            write_stats = _write_chunks(client, collection_name, partition_name, documents,
+                                        with_hash=False, model_name=model_name)
+        _mark_changed(client, collection_name)
+        stats["chunks_total"] = stats["chunks_embedded"] = write_stats["rows"]
+        stats["insert_rows_per_second"] = write_stats["rows_per_second"]
+        _count_chunks(stats)
+        return stats
+
+    if client.has_partition(collection_name=collection_name, partition_name=partition_name):
+        existing = _existing_chunks(client, collection_name, partition_name)
+    else:
+        _recreate_partition(client, collection_name, partition_name)
+        existing = {}
+
+    relocated = []
+
+    def new_chunks():
+        for doc in documents:
+            stats["chunks_total"] += 1
+            doc.metadata.setdefault("content_hash", chunk_hash(doc.page_content))
+            stored = existing.get(doc.metadata["content_hash"])
+            if not stored:
+                yield doc
+                continue
+            # the text is stored; prefer the row already at this position when the text repeats
+            position = _position(doc.metadata)
+            match = next((i for i, (_, stored_position) in enumerate(stored) if stored_position == position), 0)
+            pk, stored_position = stored.pop(match)
+            if stored_position == position:
+                stats["chunks_reused"] += 1
+            else:
+                relocated.append((pk, doc))
+
+    # parsing (for PDFs), embedding and insertion are pipelined batch by batch, so all happen in this stage
+    with stage("embed"):
+        write_stats = _write_chunks(client, collection_name, partition_name, new_chunks(), model_name=model_name)
+        stats["chunks_embedded"] = write_stats["rows"]
+        if write_stats["rows"]:
+            stats["insert_rows_per_second"] = write_stats["rows_per_second"]
+
+    # only known once the whole document has been seen; the new rows are already in place
+    stale_ids = [pk for stored in existing.values() for pk, _ in stored]
+    with stage("store"):
+        if relocated:
+            _update_positions(client, collection_name, partition_name, relocated)
+            stats["chunks_relocated"] = len(relocated)
+        if stale_ids:
+            client.delete(collection_name=collection_name, ids=stale_ids, partition_name=partition_name)
+            lexical_index.get_index(collection_name).delete(stale_ids)
+            stats["chunks_deleted"] = len(stale_ids)
+
+    if stale_ids or relocated or write_stats["rows"]:
+        _mark_changed(client, collection_name)
+
+    logging.info(f"Synced '{partition_name}' in '{collection_name}': {stats}")
+    _count_chunks(stats)
+    return stats
+
+
+def run_ingestion_job(job: dict, stage=None) -> dict:
+    """Load, chunk, embed and store one uploaded file described by an ingestion job row."""
+    stage = stage or (lambda name: metrics.stage("ingestion", name))
+    with stage("load"):
+        document = load_document(job["file_path"])
+    with stage("chunk"):
+        chunks = perform_semantic_chunking(
+            document=document,
+            source=job["file_path"],
+        )
+    return ingest_document(
+        chunked_docs=chunks,
+        collection_name=job["bank_name"],
+        partition_name=job["partition_name"],
+        model_name="all-MiniLM-L6-v2",
+        stage=stage,
     )
 
-    client.create_index(collection_name=collection_name, index_params=index_params)
-    client.load_collection(collection_name=collection_name)
 
-    logging.info(f"Inserted {len(documents)} documents into collection '{collection_name}'.")
-    
-    
 def main(file_path: str):
     document_content = load_document(file_path)
     print(document_content)
@@ -0,0 +1,225 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from monitoring import metrics
+
+
+JOBS_DB_PATH = os.environ.get("INGESTION_JOBS_DB", "ingestion_jobs.sqlite3")
+MAX_WORKERS = int(os.environ.get("INGESTION_WORKERS", "4"))
+# How many jobs may be inside each stage at once, e.g. "load=2,chunk=4,embed=1,store=2".
+STAGE_CONCURRENCY = os.environ.get("INGESTION_STAGE_CONCURRENCY", "load=2,chunk=4,embed=1,store=2")
+STAGES = ("load", "chunk", "embed", "store")
+
+logger = logging.getLogger(__name__)
+
+
+def parse_stage_concurrency(spec: str) -> dict:
+    limits = {stage: MAX_WORKERS for stage in STAGES}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        stage, _, value = item.partition("=")
+        limits[stage.strip()] = max(1, int(value))
+    return limits
+
+
+class JobStore:
+    """SQLite-backed table of ingestion jobs and their per-stage progress."""
+
+    def __init__(self, path: str = JOBS_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    file_path TEXT NOT NULL,
+                    bank_name TEXT NOT NULL,
+                    partition_name TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    stages TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+
+    def create(self, file_path: str, bank_name: str, partition_name: str) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        stages = {stage: {"status": "pending"} for stage in STAGES}
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, file_path, bank_name, partition_name, status, stage, stages, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, 'queued', NULL, ?, ?, ?)",
+                (job_id, file_path, bank_name, partition_name, json.dumps(stages), now, now),
+            )
+        return job_id
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list(self, limit: int = 50) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def find_queued(self, file_path: str, bank_name: str, partition_name: str):
+        """Id of a job for the same file and partition that has not started yet, if any."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' AND file_path = ? AND bank_name = ? "
+                "AND partition_name = ? ORDER BY created_at LIMIT 1",
+                (file_path, bank_name, partition_name),
+            ).fetchone()
+        return row["id"] if row else None
+
+    def unfinished(self) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def update(self, job_id: str, **fields):
+        fields["updated_at"] = time.time()
+        for key in ("stages", "result"):
+            if key in fields and not isinstance(fields[key], str):
+                fields[key] = json.dumps(fields[key])
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def update_stage(self, job_id: str, stage: str, **values):
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT stages FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            stages = json.loads(row["stages"])
+            stages.setdefault(stage, {}).update(values)
+            self._conn.execute(
+                "UPDATE jobs SET stages = ?, stage = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(stages), stage, time.time(), job_id),
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _to_dict(row) -> dict:
+        job = dict(row)
+        job["stages"] = json.loads(job["stages"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+
+class IngestionQueue:
+    """
+    Runs document ingestion jobs on a local thread pool.
+
+    Each job goes through load -> chunk -> embed -> store. A semaphore per
+    stage bounds how many jobs can be in that stage at once (for example a
+    single embedding job at a time on a CPU-only host), and the start/end
+    time of every stage is written to the job table as it happens.
+
+    At most one job per (bank, partition) runs at a time; later ones stay
+    queued until it finishes. Resubmitting a file whose job is still queued
+    returns that job instead of adding another one.
+    """
+
+    def __init__(self, store: JobStore, run_job, max_workers: int = MAX_WORKERS,
+                 stage_limits: dict = None):
+        self.store = store
+        self.run_job = run_job
+        self.max_workers = max_workers
+        self.stage_limits = stage_limits or parse_stage_concurrency(STAGE_CONCURRENCY)
+        self._semaphores = {
+            stage: threading.BoundedSemaphore(limit) for stage, limit in self.stage_limits.items()
+        }
+        self._executor = None
+        self._lock = threading.Lock()
+        self._partition_locks = {}
+
+    def start(self):
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ingestion")
+        # Ingestion is idempotent, so jobs cut short by a restart are simply run again.
+        for job in self.store.unfinished():
+            logger.info(f"Resuming ingestion job {job['id']} for {job['file_path']}")
+            self._executor.submit(self._run, job["id"])
+
+    def shutdown(self, wait: bool = False):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+    def submit(self, file_path: str, bank_name: str, partition_name: str) -> str:
+        if self._executor is None:
+            raise RuntimeError("Ingestion queue is not running.")
+        with self._lock:
+            # a queued job has not loaded the file yet, so it will pick up this upload too
+            job_id = self.store.find_queued(file_path, bank_name, partition_name)
+            if job_id is not None:
+                return job_id
+            job_id = self.store.create(file_path, bank_name, partition_name)
+        self._executor.submit(self._run, job_id)
+        return job_id
+
+    def _partition_lock(self, job: dict) -> threading.Lock:
+        with self._lock:
+            return self._partition_locks.setdefault((job["bank_name"], job["partition_name"]), threading.Lock())
+
+    @contextmanager
+    def stage(self, job_id: str, name: str):
+        semaphore = self._semaphores.get(name)
+        queued_at = time.time()
+        self.store.update_stage(job_id, name, status="waiting")
+        if semaphore is not None:
+            semaphore.acquire()
+        started = time.time()
+        self.store.update_stage(job_id, name, status="running", started_at=started,
+                                wait_seconds=started - queued_at)
+        metrics.record("ingestion_job", f"{name}_wait", started - queued_at)
+        try:
+            yield
+        except Exception:
+            self.store.update_stage(job_id, name, status="failed", seconds=time.time() - started)
+            raise
+        else:
+            self.store.update_stage(job_id, name, status="done", seconds=time.time() - started)
+        finally:
+            metrics.record("ingestion_job", name, time.time() - started)
+            if semaphore is not None:
+                semaphore.release()
+
+    def _run(self, job_id: str):
+        job = self.store.get(job_id)
+        if job is None:
+            return
+        with self._partition_lock(job):
+            with self._lock:
+                self.store.update(job_id, status="running", error=None)
+            started = time.perf_counter()
+            try:
+                result = self.run_job(job, lambda name: self.stage(job_id, name))
+            except Exception as e:
+                logger.exception(f"Ingestion job {job_id} failed")
+                self.store.update(job_id, status="failed", error=str(e))
+                return
+            result = dict(result or {})
+            result["total_seconds"] = time.perf_counter() - started
+            self.store.update(job_id, status="done", stage=None, result=result)
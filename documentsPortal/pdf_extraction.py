@@ -0,0 +1,60 @@
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from PyPDF2 import PdfReader
+
+
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+PAGES_PER_TASK = int(os.environ.get("PDF_PAGES_PER_TASK", "8"))
+
+# Each worker process opens the PDF once and keeps the reader for all its tasks.
+# Only worker processes set it; in-process extraction uses a local reader, since
+# several ingestion threads may parse different PDFs at the same time.
+_reader = None
+
+
+def _init_worker(file_path: str):
+    global _reader
+    _reader = PdfReader(file_path)
+
+
+def _extract_range(start: int, stop: int, reader: PdfReader = None) -> list:
+    reader = reader or _reader
+    return [(n + 1, reader.pages[n].extract_text() or "") for n in range(start, stop)]
+
+
+def iter_pdf_pages(file_path: str, workers: int = PDF_WORKERS, pages_per_task: int = PAGES_PER_TASK):
+    """
+    Yield `(page_number, text)` for every page of a PDF, in page order.
+
+    Pages are extracted in parallel by a process pool, `pages_per_task` pages
+    per task. At most `2 * workers` tasks are in flight, so memory stays
+    bounded however many pages the document has, and the caller can start
+    chunking the first pages while later ones are still being parsed.
+
+    Workers are started with "spawn": the API process holds torch, SQLite and
+    Milvus threads that a forked child would inherit in an undefined state.
+    """
+    reader = PdfReader(file_path)
+    num_pages = len(reader.pages)
+
+    if workers <= 1 or num_pages <= pages_per_task:
+        for start in range(0, num_pages, pages_per_task):
+            yield from _extract_range(start, min(start + pages_per_task, num_pages), reader)
+        return
+    # the workers open their own readers
+    del reader
+
+    ranges = deque(
+        (start, min(start + pages_per_task, num_pages)) for start in range(0, num_pages, pages_per_task)
+    )
+    max_in_flight = 2 * workers
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker, initargs=(file_path,)) as pool:
+        in_flight = deque()
+        while ranges or in_flight:
+            while ranges and len(in_flight) < max_in_flight:
+                in_flight.append(pool.submit(_extract_range, *ranges.popleft()))
+            yield from in_flight.popleft().result()
@@ -0,0 +1,189 @@
+import json
+import logging
+import os
+import platform
+import re
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+
+# "torch" (float32 PyTorch), "onnx" (ONNX Runtime, float32) or "onnx-int8" (dynamically quantized weights).
+BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch").lower()
+BACKENDS = ("torch", "onnx", "onnx-int8")
+# Where exported ONNX models are kept, one directory per model.
+ONNX_DIR = os.environ.get("EMBEDDING_ONNX_DIR", os.path.join("uploaded_files", "onnx_models"))
+# Instruction set the int8 kernels target: arm64, avx2, avx512 or avx512_vnni; detected when unset.
+QUANTIZATION = os.environ.get("EMBEDDING_QUANTIZATION", "")
+# Inference threads per ONNX session (and per pool worker for PyTorch); 0 keeps the library default (all cores).
+THREADS = int(os.environ.get("EMBEDDING_THREADS", "0"))
+# Lowest mean cosine similarity to the PyTorch embeddings an exported model may have;
+# below it the model is not used and the registry falls back to PyTorch.
+MIN_COSINE = float(os.environ.get("EMBEDDING_MIN_COSINE", "0.98"))
+
+PROBE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          "data", "Bank_of_Beirut", "Bank_of_Beirut_Policies.txt")
+PROBE_COUNT = 64
+
+logger = logging.getLogger(__name__)
+
+
+def default_quantization() -> str:
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return "arm64"
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = f.read()
+    except OSError:
+        return "avx2"
+    if "avx512_vnni" in flags:
+        return "avx512_vnni"
+    return "avx512" if "avx512f" in flags else "avx2"
+
+
+def model_id(model_name: str, backend: str = None) -> str:
+    """
+    Name under which a model's embeddings are cached; PyTorch keeps the plain model name.
+
+    Names the backend `load_model` actually uses, so vectors from a PyTorch
+    fallback are not cached as ONNX ones.
+    """
+    backend = resolve_backend(model_name, backend)
+    if backend == "torch":
+        return model_name
+    if backend == "onnx-int8":
+        return f"{model_name}@onnx-int8-{QUANTIZATION or default_quantization()}"
+    return f"{model_name}@{backend}"
+
+
+def probe_texts(count: int = PROBE_COUNT) -> list:
+    """Paragraphs of the bundled policy document, used to compare backends."""
+    try:
+        with open(PROBE_FILE, "r", encoding="utf-8") as f:
+            paragraphs = [line.strip() for line in f if len(line.strip()) > 20]
+    except OSError:
+        paragraphs = []
+    return paragraphs[:count] or ["The board meets at least quarterly.", "Fees are charged per transaction."]
+
+
+def cosine_agreement(reference: np.ndarray, candidate: np.ndarray) -> dict:
+    """Row-wise cosine similarity between two embedding matrices of the same texts."""
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    candidate = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    cosine = np.sum(reference * candidate, axis=1)
+    return {
+        "texts": len(cosine),
+        "mean_cosine": float(cosine.mean()),
+        "min_cosine": float(cosine.min()),
+        "p01_cosine": float(np.percentile(cosine, 1)),
+    }
+
+
+def check_fidelity(reference: SentenceTransformer, candidate: SentenceTransformer, texts: list = None) -> dict:
+    texts = texts or probe_texts()
+    report = cosine_agreement(reference.encode(texts, convert_to_numpy=True),
+                              candidate.encode(texts, convert_to_numpy=True))
+    report["passed"] = report["mean_cosine"] >= MIN_COSINE
+    return report
+
+
+def _onnx_kwargs(threads: int, file_name: str = None) -> dict:
+    import onnxruntime
+
+    kwargs = {"provider": "CPUExecutionProvider"}
+    if threads:
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        kwargs["session_options"] = options
+    if file_name:
+        kwargs["file_name"] = file_name
+    return kwargs
+
+
+def _export(model_name: str, backend: str, directory: str, file_name: str):
+    """Export `model_name` to ONNX under `directory` (quantized if asked) and record its fidelity."""
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+
+    if os.path.exists(os.path.join(directory, "onnx", "model.onnx")):
+        model = SentenceTransformer(directory, backend="onnx", model_kwargs=_onnx_kwargs(0, "onnx/model.onnx"))
+    else:
+        model = SentenceTransformer(model_name, backend="onnx", model_kwargs=_onnx_kwargs(0))
+        model.save_pretrained(directory)
+    if backend == "onnx-int8":
+        quantization = QUANTIZATION or default_quantization()
+        export_dynamic_quantized_onnx_model(model, quantization, directory, file_suffix=f"qint8_{quantization}")
+
+    exported = SentenceTransformer(directory, backend="onnx", model_kwargs=_onnx_kwargs(0, file_name))
+    report = check_fidelity(SentenceTransformer(model_name, backend="torch"), exported)
+    report.update(model=model_name, backend=backend, file_name=file_name, min_cosine_required=MIN_COSINE)
+    with open(os.path.join(directory, f"fidelity-{backend}.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def _onnx_paths(model_name: str, backend: str) -> tuple:
+    directory = os.path.join(ONNX_DIR, re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name))
+    if backend == "onnx-int8":
+        return directory, f"onnx/model_qint8_{QUANTIZATION or default_quantization()}.onnx"
+    return directory, "onnx/model.onnx"
+
+
+def _fidelity(model_name: str, backend: str) -> dict:
+    """Fidelity report of the `backend` export of `model_name`, exporting it first if needed."""
+    directory, file_name = _onnx_paths(model_name, backend)
+    os.makedirs(directory, exist_ok=True)
+    fidelity_path = os.path.join(directory, f"fidelity-{backend}.json")
+    if os.path.exists(os.path.join(directory, file_name)) and os.path.exists(fidelity_path):
+        with open(fidelity_path) as f:
+            report = json.load(f)
+        report["passed"] = report["mean_cosine"] >= MIN_COSINE
+        return report
+    logger.info(f"Exporting {model_name} for the {backend} backend into {directory}")
+    return _export(model_name, backend, directory, file_name)
+
+
+# (model name, requested backend) -> backend used; exports do not change while the process runs
+_resolved = {}
+
+
+def resolve_backend(model_name: str, backend: str = None) -> str:
+    """The backend `load_model` uses: the requested one, or "torch" when its export failed the fidelity check."""
+    backend = backend or BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}'. Expected one of {BACKENDS}.")
+    if backend == "torch":
+        return backend
+    if (model_name, backend) not in _resolved:
+        report = _fidelity(model_name, backend)
+        if not report["passed"]:
+            logger.warning(f"{backend} export of {model_name} has mean cosine {report['mean_cosine']:.4f} "
+                           f"to PyTorch (< {MIN_COSINE}); using PyTorch instead.")
+        _resolved[(model_name, backend)] = backend if report["passed"] else "torch"
+    return _resolved[(model_name, backend)]
+
+
+def limit_torch_threads(threads: int):
+    """Cap PyTorch's intra-op threads. Process-wide, so only for processes that just embed (pool workers)."""
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+
+
+def load_model(model_name: str, backend: str = None, threads: int = THREADS) -> SentenceTransformer:
+    """
+    Load `model_name` with the requested inference backend.
+
+    ONNX models are exported once into ONNX_DIR and reused afterwards. Each
+    export is compared against the PyTorch model on probe texts; if the mean
+    cosine similarity is below MIN_COSINE the PyTorch model is used instead.
+    `threads` sizes ONNX sessions; PyTorch threads are process-wide and set
+    with `limit_torch_threads`.
+    """
+    backend = resolve_backend(model_name, backend)
+    if backend == "torch":
+        return SentenceTransformer(model_name, backend="torch")
+
+    directory, file_name = _onnx_paths(model_name, backend)
+    model = SentenceTransformer(directory, backend="onnx", model_kwargs=_onnx_kwargs(threads, file_name))
+    model.fidelity = _fidelity(model_name, backend)
+    return model
@@ -0,0 +1,309 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from embeddingService import backends, embedding_pool, model_registry
+
+
+CACHE_DIR = os.environ.get("EMBEDDING_CACHE_DIR", os.path.join("uploaded_files", "embedding_cache"))
+# Disk budget per model for cached vectors; 0 turns the cache off.
+MAX_MB = float(os.environ.get("EMBEDDING_CACHE_MAX_MB", "1024"))
+# Share of a full cache evicted at once, so a long ingestion does not evict row by row.
+EVICT_FRACTION = 0.05
+# SQLite's default limit on bound parameters is 999.
+_SQL_BATCH = 500
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class _VectorFile:
+    """Float32 matrix in a memory-mapped file, addressed by slot and grown geometrically."""
+
+    def __init__(self, path: str, dim: int):
+        self.path = path
+        self.dim = dim
+        if not os.path.exists(path):
+            open(path, "wb").close()
+        self._map()
+
+    def _map(self):
+        rows = os.path.getsize(self.path) // (4 * self.dim)
+        if rows:
+            self.data = np.memmap(self.path, dtype=np.float32, mode="r+", shape=(rows, self.dim))
+        else:
+            self.data = np.zeros((0, self.dim), dtype=np.float32)
+
+    def ensure(self, rows: int, limit: int):
+        if rows <= len(self.data):
+            return
+        # another process may already have grown the file
+        self._map()
+        if rows > len(self.data):
+            capacity = min(max(rows, 2 * len(self.data), 1024), max(rows, limit))
+            with open(self.path, "r+b") as f:
+                f.truncate(capacity * 4 * self.dim)
+            self._map()
+
+    def read(self, slots) -> np.ndarray:
+        slots = np.asarray(slots, dtype=np.int64)
+        if len(slots) and slots.max() >= len(self.data):
+            self._map()
+        return np.array(self.data[slots], dtype=np.float32)
+
+    def write(self, slots, matrix: np.ndarray):
+        self.data[np.asarray(slots, dtype=np.int64)] = matrix
+        self.data.flush()
+
+
+class EmbeddingCache:
+    """
+    Content-addressed store of embeddings, persisted across restarts.
+
+    Vectors are keyed by (model name, SHA-256 of the text). Each model has a
+    memory-mapped float32 matrix (`<model>.f32`) and one SQLite index
+    (`index.sqlite3`) maps keys to rows of those matrices and records when each
+    entry was last used. A model's matrix is bounded by `max_mb`; when it is
+    full the least recently used entries are evicted and their rows reused.
+    Vectors are written before their index rows are committed, so readers
+    (including other processes) never see a key without its vector, and
+    lookups read the vectors inside a write transaction, so their rows cannot
+    be evicted and reused meanwhile.
+    """
+
+    def __init__(self, directory: str = CACHE_DIR, max_mb: float = MAX_MB):
+        self.directory = directory
+        self.max_bytes = int(max_mb * 2 ** 20)
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(directory, "index.sqlite3"),
+                                     check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS models (model TEXT PRIMARY KEY, dim INTEGER NOT NULL,
+                                               next_slot INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS entries (model TEXT NOT NULL, key TEXT NOT NULL, slot INTEGER NOT NULL,
+                                                last_used REAL NOT NULL, PRIMARY KEY (model, key));
+            CREATE INDEX IF NOT EXISTS entries_lru ON entries (model, last_used);
+            CREATE TABLE IF NOT EXISTS free_slots (model TEXT NOT NULL, slot INTEGER NOT NULL);
+        """)
+        self._lock = threading.Lock()
+        self._files = {}
+        self._stats = {}
+
+    def _file(self, model_name: str, dim: int) -> _VectorFile:
+        vectors = self._files.get(model_name)
+        if vectors is None:
+            slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+            digest = hashlib.sha1(model_name.encode("utf-8")).hexdigest()[:8]
+            vectors = self._files[model_name] = _VectorFile(os.path.join(self.directory, f"{slug}-{digest}.f32"), dim)
+        return vectors
+
+    def _counters(self, model_name: str) -> dict:
+        return self._stats.setdefault(model_name, {"hits": 0, "misses": 0, "stored": 0, "evictions": 0})
+
+    def _max_rows(self, dim: int) -> int:
+        return max(1, self.max_bytes // (4 * dim))
+
+    def get_many(self, model_name: str, keys: list) -> dict:
+        """{key: vector} for the keys that are cached; their last-used time is refreshed."""
+        with self._lock:
+            # A write transaction, so no other process can evict these entries and reuse their rows
+            # between the SELECT and the read of the vectors (a WAL read snapshot would not stop it).
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                found = self._lookup(model_name, keys)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            counters = self._counters(model_name)
+            counters["hits"] += sum(1 for key in keys if key in found)
+            counters["misses"] += sum(1 for key in keys if key not in found)
+        return found
+
+    def _lookup(self, model_name: str, keys: list) -> dict:
+        found = {}
+        row = self._conn.execute("SELECT dim FROM models WHERE model = ?", (model_name,)).fetchone()
+        if row is not None:
+            slots = {}
+            unique = list(dict.fromkeys(keys))
+            for i in range(0, len(unique), _SQL_BATCH):
+                batch = unique[i:i + _SQL_BATCH]
+                slots.update(self._conn.execute(
+                    f"SELECT key, slot FROM entries WHERE model = ? AND key IN ({','.join('?' * len(batch))})",
+                    (model_name, *batch),
+                ).fetchall())
+            if slots:
+                vectors = self._file(model_name, row[0]).read(list(slots.values()))
+                found = dict(zip(slots, vectors))
+                now = time.time()
+                self._conn.executemany("UPDATE entries SET last_used = ? WHERE model = ? AND key = ?",
+                                       [(now, model_name, key) for key in slots])
+        return found
+
+    def _allocate(self, model_name: str, dim: int, count: int) -> list:
+        """Rows for `count` new entries; runs inside the caller's write transaction."""
+        slots = [slot for (slot,) in self._conn.execute(
+            "SELECT slot FROM free_slots WHERE model = ? LIMIT ?", (model_name, count))]
+        if slots:
+            self._conn.execute(f"DELETE FROM free_slots WHERE model = ? AND slot IN ({','.join('?' * len(slots))})",
+                               (model_name, *slots))
+        (next_slot,) = self._conn.execute("SELECT next_slot FROM models WHERE model = ?", (model_name,)).fetchone()
+        max_rows = self._max_rows(dim)
+        fresh = min(count - len(slots), max_rows - next_slot)
+        slots.extend(range(next_slot, next_slot + fresh))
+        self._conn.execute("UPDATE models SET next_slot = ? WHERE model = ?", (next_slot + fresh, model_name))
+
+        short = count - len(slots)
+        if short > 0:
+            evict = self._conn.execute(
+                "SELECT key, slot FROM entries WHERE model = ? ORDER BY last_used LIMIT ?",
+                (model_name, max(short, int(max_rows * EVICT_FRACTION))),
+            ).fetchall()
+            self._conn.executemany("DELETE FROM entries WHERE model = ? AND key = ?",
+                                   [(model_name, key) for key, _ in evict])
+            evicted = [slot for _, slot in evict]
+            slots.extend(evicted[:short])
+            self._conn.executemany("INSERT INTO free_slots (model, slot) VALUES (?, ?)",
+                                   [(model_name, slot) for slot in evicted[short:]])
+            self._counters(model_name)["evictions"] += len(evict)
+        return slots[:count]
+
+    def put_many(self, model_name: str, keys: list, vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(keys):
+            return
+        dim = vectors.shape[1]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT dim FROM models WHERE model = ?", (model_name,)).fetchone()
+                if row is None:
+                    self._conn.execute("INSERT INTO models (model, dim, next_slot) VALUES (?, ?, 0)",
+                                       (model_name, dim))
+                elif row[0] != dim:
+                    raise ValueError(f"Cached embeddings for '{model_name}' have dim {row[0]}, got {dim}.")
+
+                # skip keys another thread or process stored since our lookup
+                pending = dict(zip(keys, vectors))
+                existing = list(pending)
+                for i in range(0, len(existing), _SQL_BATCH):
+                    batch = existing[i:i + _SQL_BATCH]
+                    for (key,) in self._conn.execute(
+                            f"SELECT key FROM entries WHERE model = ? AND key IN ({','.join('?' * len(batch))})",
+                            (model_name, *batch)):
+                        pending.pop(key, None)
+                keys = list(pending)[:self._max_rows(dim)]
+                if keys:
+                    slots = self._allocate(model_name, dim, len(keys))
+                    vector_file = self._file(model_name, dim)
+                    vector_file.ensure(max(slots) + 1, self._max_rows(dim))
+                    vector_file.write(slots, np.stack([pending[key] for key in keys]))
+                    now = time.time()
+                    self._conn.executemany(
+                        "INSERT INTO entries (model, key, slot, last_used) VALUES (?, ?, ?, ?)",
+                        [(model_name, key, slot, now) for key, slot in zip(keys, slots)],
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._counters(model_name)["stored"] += len(keys)
+
+    def encode(self, texts: list, model_name: str, encode_fn=None) -> np.ndarray:
+        """
+        Embeddings of `texts` in order, encoding only the texts not cached yet.
+
+        `encode_fn(texts)` encodes the missing texts; without one the
+        registry's model named `model_name` is used. The module-level `encode`
+        passes embedding_pool.encode. A fully cached batch never loads a model.
+        """
+        if not len(texts):
+            return np.zeros((0, 0), dtype=np.float32)
+        keys = [text_key(text) for text in texts]
+        found = self.get_many(model_name, keys)
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        if missing:
+            if encode_fn is None:
+                model = model_registry.get_model(model_name)
+                encode_fn = lambda batch: model.encode(batch, convert_to_numpy=True)
+            vectors = np.asarray(encode_fn(list(missing.values())), dtype=np.float32)
+            self.put_many(model_name, list(missing), vectors)
+            found.update(zip(missing, vectors))
+        return np.stack([found[key] for key in keys])
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT m.model, m.dim, m.next_slot, COUNT(e.key) FROM models m "
+                "LEFT JOIN entries e ON e.model = m.model GROUP BY m.model").fetchall()
+            models = {}
+            for model_name, dim, allocated, entries in rows:
+                counters = dict(self._counters(model_name))
+                lookups = counters["hits"] + counters["misses"]
+                counters["hit_rate"] = counters["hits"] / lookups if lookups else 0.0
+                models[model_name] = {
+                    "entries": entries,
+                    "dim": dim,
+                    "bytes": allocated * dim * 4,
+                    "max_entries": self._max_rows(dim),
+                    **counters,
+                }
+            hits = sum(m["hits"] for m in models.values())
+            lookups = hits + sum(m["misses"] for m in models.values())
+            return {
+                "enabled": True,
+                "directory": self.directory,
+                "max_mb_per_model": self.max_bytes / 2 ** 20,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "models": models,
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """The process-wide cache, or None when EMBEDDING_CACHE_MAX_MB is 0."""
+    global _cache
+    if MAX_MB <= 0:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache()
+        return _cache
+
+
+def encode(texts: list, model_name: str, encode_fn=None) -> np.ndarray:
+    """
+    Embed `texts` with `model_name` through the cache (or directly when it is disabled).
+
+    Texts that are not cached are encoded by `encode_fn`, by default
+    embedding_pool.encode, which spreads bulk batches over worker processes.
+    """
+    if encode_fn is None:
+        encode_fn = lambda batch: embedding_pool.encode(batch, model_name)
+    cache = get_cache()
+    if cache is not None:
+        # embeddings from different backends differ slightly, so each backend has its own entries
+        return cache.encode(texts, backends.model_id(model_name), encode_fn)
+    return np.asarray(encode_fn(texts), dtype=np.float32)
+
+
+def cache_stats() -> dict:
+    cache = get_cache()
+    return cache.stats() if cache is not None else {"enabled": False}
@@ -0,0 +1,312 @@
+import atexit
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+from embeddingService import backends, model_registry
+
+
+# Worker processes for bulk embedding; "auto" uses half the cores, at most 4. Fewer than 2 disables the pool.
+WORKERS = os.environ.get("EMBED_POOL_WORKERS", "auto")
+# Calls with fewer texts do not start the pool; the pool is for bulk ingestion and reindexing.
+# Once a model's pool runs, smaller calls (e.g. the last partial batch of the bulk writer) use it
+# too, so the model is not loaded a second time in-process.
+MIN_TEXTS = int(os.environ.get("EMBED_POOL_MIN_TEXTS", "256"))
+TEXTS_PER_TASK = int(os.environ.get("EMBED_POOL_TEXTS_PER_TASK", "64"))
+ENCODE_BATCH_SIZE = int(os.environ.get("EMBED_POOL_BATCH_SIZE", "32"))
+# A worker whose resident memory exceeds this after a task is replaced by a fresh one; 0 means no cap.
+MAX_WORKER_MB = float(os.environ.get("EMBED_POOL_MAX_WORKER_MB", "0"))
+# A task whose worker dies is retried this many times before the call fails.
+MAX_TASK_RETRIES = 2
+# Workers restarted during one call before it fails, e.g. when every replacement crashes.
+MAX_RESTARTS_PER_CALL = 4
+
+logger = logging.getLogger(__name__)
+
+
+def worker_count(setting: str = WORKERS) -> int:
+    if setting == "auto":
+        return min(4, (os.cpu_count() or 1) // 2)
+    return int(setting)
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10
+
+
+def _worker_main(model_name: str, backend: str, threads: int, max_mb: float, tasks, results):
+    """Load one copy of the model, then encode tasks until told to stop or over the memory cap."""
+    pid = os.getpid()
+    try:
+        # this process only embeds, so capping PyTorch's process-wide thread count is safe here
+        backends.limit_torch_threads(threads)
+        model = backends.load_model(model_name, backend, threads=threads)
+    except Exception as e:
+        results.put(("failed", pid, None, f"loading {model_name}: {e!r}"))
+        return
+    results.put(("ready", pid, _rss_mb()))
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        task_id, texts, batch_size = task
+        results.put(("started", pid, task_id))
+        try:
+            vectors = np.asarray(model.encode(texts, batch_size=batch_size, convert_to_numpy=True), dtype=np.float32)
+            results.put(("done", pid, task_id, vectors, _rss_mb()))
+        except Exception as e:
+            results.put(("failed", pid, task_id, repr(e)))
+        if max_mb and _rss_mb() > max_mb:
+            results.put(("retired", pid, _rss_mb()))
+            return
+
+
+class EmbeddingPool:
+    """
+    Encodes large batches of texts on several worker processes, one model copy each.
+
+    Texts are sorted by length and cut into tasks of `texts_per_task`, so the
+    texts padded together in one forward pass have similar lengths; results
+    are put back in input order. Workers are started with "spawn" (no forked
+    OpenMP/ONNX Runtime state) and split the cores between them. A worker
+    above `max_worker_mb` of resident memory after a task is replaced, and
+    the task of a worker that dies is handed to another one. A call fails
+    instead of restarting workers forever when a replacement cannot load the
+    model or more than MAX_RESTARTS_PER_CALL workers die.
+    """
+
+    def __init__(self, model_name: str,
+                 workers: int = None,
+                 texts_per_task: int = TEXTS_PER_TASK,
+                 batch_size: int = ENCODE_BATCH_SIZE,
+                 max_worker_mb: float = MAX_WORKER_MB,
+                 backend: str = None):
+        self.model_name = model_name
+        self.workers = max(1, workers or worker_count())
+        self.texts_per_task = max(1, texts_per_task)
+        self.batch_size = max(1, batch_size)
+        self.max_worker_mb = max_worker_mb
+        self.backend = backend or backends.BACKEND
+        self.threads = backends.THREADS or max(1, (os.cpu_count() or 1) // self.workers)
+        self._context = multiprocessing.get_context("spawn")
+        self._tasks = self._context.Queue()
+        self._results = self._context.Queue()
+        self._processes = {}
+        self._rss = {}
+        self._lock = threading.Lock()
+        self._call = 0
+        self._stats = {"calls": 0, "texts": 0, "tasks": 0, "seconds": 0.0, "recycled": 0, "restarts": 0}
+
+        # the first worker exports the ONNX model if needed; the others then just load it
+        self._spawn()
+        self._wait_ready(1)
+        for _ in range(self.workers - 1):
+            self._spawn()
+        self._wait_ready(self.workers)
+
+    def _spawn(self):
+        process = self._context.Process(
+            target=_worker_main,
+            args=(self.model_name, self.backend, self.threads, self.max_worker_mb, self._tasks, self._results),
+            name=f"embedding-worker-{len(self._processes)}",
+            daemon=True,
+        )
+        process.start()
+        self._processes[process.pid] = process
+
+    def _wait_ready(self, count: int, timeout: float = 600.0):
+        deadline = time.monotonic() + timeout
+        while len(self._rss) < count:
+            try:
+                message = self._results.get(timeout=min(1.0, max(0.1, deadline - time.monotonic())))
+            except queue.Empty:
+                dead = [process for process in self._processes.values() if not process.is_alive()]
+                if dead or time.monotonic() >= deadline:
+                    self.close()
+                    reason = f"exit code {dead[0].exitcode}" if dead else f"not ready after {timeout:.0f}s"
+                    raise RuntimeError(f"Embedding worker could not start: {reason}")
+                continue
+            if message[0] == "failed":
+                self.close()
+                raise RuntimeError(f"Embedding worker could not start: {message[3]}")
+            if message[0] == "ready":
+                self._rss[message[1]] = message[2]
+
+    def _replace(self, pid: int):
+        process = self._processes.pop(pid, None)
+        self._rss.pop(pid, None)
+        if process is not None:
+            process.join(timeout=5)
+        self._spawn()
+
+    def encode(self, texts: list, sort: bool = True) -> np.ndarray:
+        """Embeddings of `texts` in input order; `sort=False` keeps input order inside tasks (for benchmarks)."""
+        if not len(texts):
+            return np.zeros((0, 0), dtype=np.float32)
+        with self._lock:
+            started = time.perf_counter()
+            self._call += 1
+            order = list(range(len(texts)))
+            if sort:
+                order.sort(key=lambda i: len(texts[i]))
+            pending = {}
+            for n, start in enumerate(range(0, len(order), self.texts_per_task)):
+                indices = order[start:start + self.texts_per_task]
+                task_id = (self._call, n)
+                pending[task_id] = (indices, [texts[i] for i in indices])
+                self._tasks.put((task_id, pending[task_id][1], self.batch_size))
+
+            output, running, retries = None, {}, {}
+            remaining = set(pending)
+            restarts_before = self._stats["restarts"]
+            while remaining:
+                try:
+                    message = self._results.get(timeout=1.0)
+                except queue.Empty:
+                    try:
+                        self._recover(running, pending, retries)
+                        if self._stats["restarts"] - restarts_before > MAX_RESTARTS_PER_CALL:
+                            raise RuntimeError(f"Embedding workers restarted more than {MAX_RESTARTS_PER_CALL} "
+                                               f"times during one call.")
+                    except RuntimeError:
+                        self._drop_queued()
+                        raise
+                    continue
+                kind, pid = message[0], message[1]
+                if kind == "ready":
+                    self._rss[pid] = message[2]
+                elif kind == "started":
+                    running[pid] = message[2]
+                elif kind == "done":
+                    task_id, vectors = message[2], message[3]
+                    self._rss[pid] = message[4]
+                    running.pop(pid, None)
+                    if task_id in remaining:
+                        if output is None:
+                            output = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+                        output[pending[task_id][0]] = vectors
+                        remaining.discard(task_id)
+                elif kind == "failed":
+                    running.pop(pid, None)
+                    if message[2] is None:
+                        # a replacement could not load the model and has exited; starting another would too
+                        self._processes.pop(pid, None)
+                        self._drop_queued()
+                        raise RuntimeError(f"Embedding worker could not start: {message[3]}")
+                    if message[2] in remaining:
+                        self._drop_queued()
+                        raise RuntimeError(f"Embedding worker {pid} failed: {message[3]}")
+                elif kind == "retired":
+                    logger.info(f"Embedding worker {pid} at {message[2]:.0f} MB exceeded "
+                                f"{self.max_worker_mb:.0f} MB; starting a fresh one")
+                    self._stats["recycled"] += 1
+                    self._replace(pid)
+
+            self._stats["calls"] += 1
+            self._stats["texts"] += len(texts)
+            self._stats["tasks"] += len(pending)
+            self._stats["seconds"] += time.perf_counter() - started
+            return output
+
+    def _recover(self, running: dict, pending: dict, retries: dict):
+        """Requeue the task of any worker that died mid-task and start a replacement."""
+        for pid, process in list(self._processes.items()):
+            if process.is_alive():
+                continue
+            task_id = running.pop(pid, None)
+            logger.warning(f"Embedding worker {pid} exited with code {process.exitcode}; restarting it")
+            self._stats["restarts"] += 1
+            self._replace(pid)
+            if task_id is not None and task_id in pending:
+                retries[task_id] = retries.get(task_id, 0) + 1
+                if retries[task_id] > MAX_TASK_RETRIES:
+                    raise RuntimeError(f"Embedding task {task_id} failed after {MAX_TASK_RETRIES} retries.")
+                self._tasks.put((task_id, pending[task_id][1], self.batch_size))
+
+    def _drop_queued(self):
+        """Discard tasks no worker has taken yet, after the call they belong to failed."""
+        try:
+            while True:
+                self._tasks.get_nowait()
+        except queue.Empty:
+            pass
+
+    def close(self):
+        for _ in self._processes:
+            self._tasks.put(None)
+        for process in self._processes.values():
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self._processes = {}
+        self._rss = {}
+
+    def stats(self) -> dict:
+        stats = dict(self._stats)
+        stats["texts_per_second"] = stats["texts"] / stats["seconds"] if stats["seconds"] else 0.0
+        stats.update(
+            model=self.model_name,
+            backend=self.backend,
+            workers=len(self._processes),
+            threads_per_worker=self.threads,
+            worker_rss_mb=dict(self._rss),
+            max_worker_mb=self.max_worker_mb,
+        )
+        return stats
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(model_name: str, start: bool = True):
+    """
+    The shared pool for `model_name`, started on first use (unless `start` is
+    False); None when the pool is disabled or the model was registered with
+    model_registry.register_model, since workers could only load the real model.
+    """
+    if worker_count() < 2 or model_registry.is_registered(model_name):
+        return None
+    with _pools_lock:
+        pool = _pools.get(model_name)
+        if pool is None and start:
+            pool = _pools[model_name] = EmbeddingPool(model_name)
+        return pool
+
+
+def encode(texts: list, model_name: str) -> np.ndarray:
+    """Embed `texts`, on the worker pool for bulk calls (or once it runs) and in-process otherwise."""
+    pool = get_pool(model_name, start=len(texts) >= MIN_TEXTS)
+    if pool is None:
+        return model_registry.get_model(model_name).encode(texts, convert_to_numpy=True).astype("float32")
+    return pool.encode(texts)
+
+
+def close_all():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+def pool_stats() -> dict:
+    with _pools_lock:
+        return {
+            "workers_setting": WORKERS,
+            "min_texts": MIN_TEXTS,
+            "pools": {name: pool.stats() for name, pool in _pools.items()},
+        }
+
+
+atexit.register(close_all)
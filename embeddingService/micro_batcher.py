@@ -0,0 +1,185 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+
+import numpy as np
+
+from embeddingService import model_registry
+from monitoring import metrics
+
+
+BATCH_WINDOW_MS = float(os.environ.get("EMBED_BATCH_WINDOW_MS", "5"))
+MAX_BATCH_SIZE = int(os.environ.get("EMBED_MAX_BATCH", "32"))
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+# Each batcher owns a thread and keeps its model resident, so their number is capped.
+MAX_BATCHERS = int(os.environ.get("EMBED_MAX_BATCHERS", "4"))
+# How long a caller waits for its embedding before giving up.
+EMBED_TIMEOUT_SECONDS = float(os.environ.get("EMBED_TIMEOUT_SECONDS", "30"))
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatchEmbedder:
+    """
+    Collects concurrently submitted query texts and encodes them together.
+
+    A background thread waits for the first pending text, then keeps
+    gathering texts for at most `window_ms` milliseconds or until
+    `max_batch_size` texts are queued, and runs a single `model.encode` call
+    for the whole batch. Each caller gets its own row back through a Future;
+    Futures cancelled while queued are skipped.
+    """
+
+    def __init__(self,
+                 model_name: str,
+                 window_ms: float = BATCH_WINDOW_MS,
+                 max_batch_size: int = MAX_BATCH_SIZE):
+        self.model_name = model_name
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._stats = {
+            "batches": 0,
+            "items": 0,
+            "batch_size_histogram": {str(b): 0 for b in BATCH_SIZE_BUCKETS} | {"+Inf": 0},
+            "queue_wait_seconds_total": 0.0,
+            "queue_wait_seconds_max": 0.0,
+            "encode_seconds_total": 0.0,
+        }
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name=f"micro-batcher-{model_name}", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        if self._closed:
+            raise RuntimeError("Micro-batcher is closed.")
+        future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        return future
+
+    def embed(self, text: str, timeout: float = EMBED_TIMEOUT_SECONDS) -> np.ndarray:
+        return self.submit(text).result(timeout=timeout)
+
+    def close(self):
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def _collect(self, first) -> list:
+        batch = [first]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            # cancelled requests are dropped; the others can no longer be cancelled
+            batch = [item for item in self._collect(first) if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            started = time.perf_counter()
+            texts = [text for text, _, _ in batch]
+            try:
+                model = model_registry.get_model(self.model_name)
+                vectors = model.encode(texts, convert_to_numpy=True).astype("float32")
+            except Exception as e:
+                logger.exception(f"Batch embedding failed for {len(texts)} texts")
+                for _, future, _ in batch:
+                    _resolve(future.set_exception, e)
+                continue
+            encode_seconds = time.perf_counter() - started
+            metrics.record("embedding", "query_batch_encode", encode_seconds)
+
+            for i, (_, future, _) in enumerate(batch):
+                _resolve(future.set_result, vectors[i])
+            self._record(batch, started, encode_seconds)
+
+    def _record(self, batch, started, encode_seconds):
+        waits = [started - enqueued for _, _, enqueued in batch]
+        bucket = next((str(b) for b in BATCH_SIZE_BUCKETS if len(batch) <= b), "+Inf")
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["items"] += len(batch)
+            self._stats["batch_size_histogram"][bucket] += 1
+            self._stats["queue_wait_seconds_total"] += sum(waits)
+            self._stats["queue_wait_seconds_max"] = max(self._stats["queue_wait_seconds_max"], max(waits))
+            self._stats["encode_seconds_total"] += encode_seconds
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["batch_size_histogram"] = dict(self._stats["batch_size_histogram"])
+        stats["window_ms"] = self.window * 1000
+        stats["max_batch_size"] = self.max_batch_size
+        stats["queued"] = self._queue.qsize()
+        stats["mean_batch_size"] = stats["items"] / stats["batches"] if stats["batches"] else 0.0
+        stats["mean_queue_wait_ms"] = (
+            stats["queue_wait_seconds_total"] / stats["items"] * 1000 if stats["items"] else 0.0
+        )
+        return stats
+
+
+def _resolve(setter, value):
+    # a Future that is already done must not take down the batcher thread
+    try:
+        setter(value)
+    except InvalidStateError:
+        pass
+
+
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+
+def get_batcher(model_name: str = "all-MiniLM-L6-v2") -> MicroBatchEmbedder:
+    """The shared batcher for `model_name`; only allowed models get one, and at most MAX_BATCHERS exist."""
+    if not model_registry.is_allowed(model_name):
+        raise ValueError(f"Embedding model '{model_name}' is not allowed. Allowed: {model_registry.ALLOWED_MODELS}")
+    with _batchers_lock:
+        batcher = _batchers.get(model_name)
+        if batcher is None:
+            if len(_batchers) >= MAX_BATCHERS:
+                raise RuntimeError(f"Already running {MAX_BATCHERS} embedding batchers; not starting one for "
+                                   f"'{model_name}'.")
+            batcher = MicroBatchEmbedder(model_name)
+            _batchers[model_name] = batcher
+        return batcher
+
+
+def embed_query(text: str, model_name: str = "all-MiniLM-L6-v2") -> np.ndarray:
+    """Embed a single query through the shared micro-batcher for `model_name`."""
+    return get_batcher(model_name).embed(text)
+
+
+def batcher_stats() -> dict:
+    with _batchers_lock:
+        batchers = dict(_batchers)
+    return {name: batcher.stats() for name, batcher in batchers.items()}
+
+
+def close_all():
+    with _batchers_lock:
+        batchers = list(_batchers.values())
+        _batchers.clear()
+    for batcher in batchers:
+        batcher.close()
@@ -0,0 +1,140 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from embeddingService import backends
+from monitoring import metrics
+
+
+DEFAULT_MAX_MODELS = int(os.environ.get("EMBEDDING_MAX_MODELS", "2"))
+# Comma-separated models that requests may ask for; anything else is rejected before it is loaded.
+ALLOWED_MODELS = tuple(name.strip() for name in os.environ.get("EMBEDDING_ALLOWED_MODELS",
+                                                               "all-MiniLM-L6-v2").split(",") if name.strip())
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of SentenceTransformer models keyed by model name.
+
+    Models are loaded with the inference backend chosen by EMBEDDING_BACKEND
+    (PyTorch, ONNX Runtime or int8-quantized ONNX; see backends.py).
+
+    Models are loaded lazily the first time they are requested and kept
+    resident until more than `max_models` distinct models have been used,
+    at which point the least recently used one is evicted. Models given to
+    `register` cannot be reloaded, so they are kept apart and never evicted.
+    """
+
+    def __init__(self, max_models: int = DEFAULT_MAX_MODELS):
+        self.max_models = max(1, max_models)
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._registered = {}
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "load_seconds": {},
+        }
+
+    def get(self, model_name: str):
+        with self._lock:
+            model = self._registered.get(model_name)
+            if model is not None:
+                self._stats["hits"] += 1
+                return model
+            model = self._models.get(model_name)
+            if model is not None:
+                self._models.move_to_end(model_name)
+                self._stats["hits"] += 1
+                return model
+            load_lock = self._load_locks.setdefault(model_name, threading.Lock())
+
+        # Only one thread loads a given model; concurrent callers wait for it.
+        with load_lock:
+            with self._lock:
+                model = self._models.get(model_name)
+                if model is not None:
+                    self._models.move_to_end(model_name)
+                    self._stats["hits"] += 1
+                    return model
+                self._stats["misses"] += 1
+
+            start = time.perf_counter()
+            model = backends.load_model(model_name)
+            elapsed = time.perf_counter() - start
+            metrics.record("embedding", "model_load", elapsed)
+
+            with self._lock:
+                self._stats["load_seconds"][model_name] = elapsed
+                self._models[model_name] = model
+                self._models.move_to_end(model_name)
+                while len(self._models) > self.max_models:
+                    self._models.popitem(last=False)
+                    self._stats["evictions"] += 1
+            return model
+
+    def register(self, model_name: str, model):
+        """Make `model` the resident instance for `model_name` without loading anything."""
+        with self._lock:
+            self._registered[model_name] = model
+            self._models.pop(model_name, None)
+
+    def is_registered(self, model_name: str) -> bool:
+        with self._lock:
+            return model_name in self._registered
+
+    def clear(self):
+        """Drop the loaded models; registered ones stay."""
+        with self._lock:
+            self._models.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            resident = {**self._models, **self._registered}
+            return {
+                "resident_models": list(resident),
+                "registered_models": list(self._registered),
+                "backend": backends.BACKEND,
+                "fidelity": {name: getattr(model, "fidelity", None) for name, model in resident.items()},
+                "max_models": self.max_models,
+                "hits": self._stats["hits"],
+                "misses": self._stats["misses"],
+                "evictions": self._stats["evictions"],
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+                "load_seconds": dict(self._stats["load_seconds"]),
+            }
+
+
+_registry = ModelRegistry()
+
+
+def get_model(model_name: str = "all-MiniLM-L6-v2"):
+    """Return the shared model instance for `model_name`, loading it on first use."""
+    return _registry.get(model_name)
+
+
+def register_model(model_name: str, model):
+    """
+    Serve `model` for `model_name` from now on. Anything with SentenceTransformer's
+    `encode` and `get_sentence_embedding_dimension` works, e.g. a stand-in encoder
+    for offline benchmarks.
+    """
+    _registry.register(model_name, model)
+
+
+def is_registered(model_name: str) -> bool:
+    """Whether `model_name` is served by an instance given to `register_model` (it exists in this process only)."""
+    return _registry.is_registered(model_name)
+
+
+def is_allowed(model_name: str) -> bool:
+    """Whether `model_name` is in EMBEDDING_ALLOWED_MODELS or was registered with `register_model`."""
+    return model_name in ALLOWED_MODELS or _registry.is_registered(model_name)
+
+
+def registry_stats() -> dict:
+    return _registry.stats()
@@ -50,9 +50,25 @@ export default function UploadForm() {
 
       if (!processRes.ok) throw new Error("Failed to process document.");
       const processData = await processRes.json();
+      if (processData.error) throw new Error(processData.error);
+
+      // 4) Poll the ingestion job until it finishes
+      let job = { status: processData.status };
+      while (job.status === "queued" || job.status === "running") {
+        setStatus(
+          `Bank: ${bankData.bank_name} | File: ${uploadedFilename} | ${job.status}${
+            job.stage ? ` (${job.stage})` : ""
+          }...`
+        );
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        const jobRes = await fetch(`http://localhost:8000/jobs/${processData.job_id}`);
+        if (!jobRes.ok) throw new Error("Failed to fetch job status.");
+        job = await jobRes.json();
+      }
+      if (job.status === "failed") throw new Error(`Processing failed: ${job.error}`);
 
       setStatus(
-        `Bank: ${bankData.bank_name} | File: ${uploadedFilename} | ${processData.message}`
+        `Bank: ${bankData.bank_name} | File: ${uploadedFilename} | Document processed and stored in database.`
       );
     } catch (err) {
       console.error(err);
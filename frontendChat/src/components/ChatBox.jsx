@@ -17,15 +17,45 @@ export default function ChatBox() {
 
     try {
       const res = await fetch(
-        `http://localhost:8000/chat/${encodeURIComponent(input)}?bank_name=${database}`
+        `http://localhost:8000/chat/${encodeURIComponent(input)}/stream?bank_name=${database}`
       );
-      const data = await res.json();
+      if (!res.ok || !res.body) throw new Error("Bad response");
 
-      const botMessage = {
-        sender: "bot",
-        text: data.response || "No response from server.",
-      };
-      setMessages((prev) => [...prev, botMessage]);
+      // Append an empty bot message and grow it as tokens arrive (SSE).
+      setMessages((prev) => [...prev, { sender: "bot", text: "" }]);
+      setLoading(false);
+
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let received = false;
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split("\n\n");
+        buffer = events.pop();
+        for (const raw of events) {
+          const dataLine = raw.split("\n").find((l) => l.startsWith("data: "));
+          if (!dataLine) continue;
+          const event = JSON.parse(dataLine.slice(6));
+          if (event.type !== "token") continue;
+          received = true;
+          setMessages((prev) => {
+            const updated = [...prev];
+            const last = updated[updated.length - 1];
+            updated[updated.length - 1] = { ...last, text: last.text + event.content };
+            return updated;
+          });
+        }
+      }
+      if (!received) {
+        setMessages((prev) => {
+          const updated = [...prev];
+          updated[updated.length - 1] = { sender: "bot", text: "No response from server." };
+          return updated;
+        });
+      }
     } catch (err) {
       setMessages((prev) => [
         ...prev,
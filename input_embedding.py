@@ -1,91 +1,258 @@
-from sentence_transformers import SentenceTransformer
 from pymilvus import connections, Collection, MilvusClient
-from ollama import chat, ChatResponse
+from ollama import chat, ChatResponse, AsyncClient
 import numpy as np
+import asyncio
+import contextvars
+import functools
+import time
 import sys
 import os
 from prompt import systemprompt
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from databaseHandling import database_handling
+from embeddingService import micro_batcher
+from monitoring import metrics
+from retrieval import answer_cache, context_packing, federated_search, hybrid_search, scoping, search_profiles
 
 
+def search_context(query_vector, bank_name: str, search_limit: int = 5,
+                   search_profile: str = search_profiles.DEFAULT_PROFILE,
+                   scope: dict = None,
+                   query: str = None,
+                   retrieval_mode: str = hybrid_search.DEFAULT_MODE,
+                   context_tokens: int = context_packing.TOKEN_BUDGET):
+    """
+    Search the bank's collection for `query_vector` and pack the hits into a context string.
+
+    `bank_name` may also list several collections ("Bank_of_Beirut,BankMed") or be
+    "*"/"all"; those are searched concurrently and merged. `scope` limits the
+    search to a document's partition and/or metadata filters. Returns the context
+    string and the retrieval details (hits, per-collection status, partial flag,
+    search time, context packing stats). In "hybrid" mode the vector hits are
+    fused with BM25 hits for the `query` text. Duplicate and overlapping chunks
+    are merged and the result is packed into `context_tokens` (0 = join all hits).
+    """
+    if retrieval_mode == "hybrid":
+        search_fn = functools.partial(hybrid_search.search_collection, query_text=query)
+    else:
+        search_fn = federated_search.search_collection
+    collections = federated_search.parse_bank_names(bank_name)
+    with metrics.stage("chat", "search"):
+        if len(collections) == 1:
+            started = time.perf_counter()
+            hits = search_fn(collections[0], query_vector, search_limit, search_profile,
+                             output_fields=context_packing.OUTPUT_FIELDS, scope=scope)
+            retrieval = {"hits": hits, "partial": False, "collections": {collections[0]: "ok"},
+                         "search_ms": (time.perf_counter() - started) * 1000}
+        else:
+            retrieval = federated_search.federated_search(query_vector, collections, search_limit, search_profile,
+                                                          output_fields=context_packing.OUTPUT_FIELDS,
+                                                          scope=scope, search_fn=search_fn)
+
+    with metrics.stage("chat", "context_pack"):
+        packed = context_packing.pack(retrieval["hits"], context_tokens)
+    retrieval["context"] = packed["stats"]
+    metrics.TOKENS.inc(packed["stats"]["packed_tokens"], kind="context_packed")
+    metrics.TOKENS.inc(packed["stats"]["tokens_saved"], kind="context_saved")
+    context_str = packed["text"] if retrieval["hits"] else "No relevant context found."
+    return context_str, retrieval
+
+
+def build_messages(query: str, context_str: str) -> list:
+    with metrics.stage("chat", "prompt_build"):
+        return [
+            {"role": "system", "content": systemprompt(context_str)},
+            {"role": "user", "content": query}
+        ]
+
+
+def record_llm_usage(response):
+    """Count prompt/completion tokens from Ollama's final response (or last streamed part)."""
+    for kind, key in (("prompt", "prompt_eval_count"), ("completion", "eval_count")):
+        if response.get(key):
+            metrics.TOKENS.inc(response[key], kind=kind)
 
 
 def chatrag(query: str,
             bank_name: str,
             search_limit: int = 5,
             embedding_model: str = 'all-MiniLM-L6-v2',
-            llm_model: str = "gpt-oss:20b") -> str:
+            llm_model: str = "gpt-oss:20b",
+            search_profile: str = search_profiles.DEFAULT_PROFILE,
+            scope: dict = None,
+            retrieval_mode: str = hybrid_search.DEFAULT_MODE,
+            context_tokens: int = context_packing.TOKEN_BUDGET) -> str:
     """
     Perform semantic search over Milvus FAQ collection and generate an LLM-based answer.
 
     Args:
         query (str): The user's input question.
-        collection_name (str): Milvus collection name. Defaults to "bob_faqs".
-        host (str): Milvus host address. Defaults to localhost.
-        port (str): Milvus port. Defaults to 19530.
-        llm_model (str): LLM model name for Ollama chat. Defaults to gpt-oss:latest.
+        bank_name (str): Milvus collection to search, named after the bank.
+        search_limit (int): Number of chunks to retrieve. Defaults to 5.
+        embedding_model (str): SentenceTransformer model used for the query.
+        llm_model (str): LLM model name for Ollama chat. Defaults to gpt-oss:20b.
+        search_profile (str): "fast", "balanced" or "exhaustive" search quality.
+        scope (dict): Partition/metadata filters from `scoping.search_scope`.
+        retrieval_mode (str): "vector", or "hybrid" to fuse in BM25 matches.
+        context_tokens (int): Token budget for retrieved context; 0 disables packing.
 
     Returns:
         str: The generated LLM response.
     """
 
-    client = MilvusClient(
-        uri="http://localhost:19530",
-        token="root:Milvus",
-    )
+    cache = answer_cache.get_cache()
+    scope_key = scoping.scope_key(scope)
+    # taken before the lookup, so an answer built while the bank is re-ingested is not cached
+    cache_version = cache.version(bank_name)
+    with metrics.stage("chat", "answer_cache"):
+        cached = cache.get_exact(bank_name, llm_model, query, scope_key)
+    if cached is not None:
+        return cached
 
-    client.use_database("Banks_DB")
+    # embed query; concurrent /chat requests share one encode call through the micro-batcher
+    with metrics.stage("chat", "embed"):
+        query_vector = micro_batcher.embed_query(query, embedding_model)
 
+    with metrics.stage("chat", "answer_cache"):
+        cached = cache.get_semantic(bank_name, llm_model, embedding_model, query_vector, scope_key, query)
+    if cached is not None:
+        return cached
 
-    # embed query
-    model = SentenceTransformer(embedding_model)
-    embedded_input = model.encode([query]).tolist()
+    context_str, retrieval = search_context(query_vector, bank_name, search_limit, search_profile, scope,
+                                            query, retrieval_mode, context_tokens)
 
-    results = client.search(
-        collection_name=bank_name,
-        data=embedded_input,
-        anns_field="embedding",
-        search_param={"metric_type": "L2", "params": {"nprobe": 10}},
-        limit=search_limit,
-        output_fields=["text", "source"]
-    )
+    # chat with LLM
+    messages = build_messages(query, context_str)
+    with metrics.stage("chat", "llm_generate"):
+        response: ChatResponse = chat(
+            model=llm_model,
+            messages=messages
+        )
+    record_llm_usage(response)
 
+    answer = response["message"]["content"]
+    if not retrieval["partial"]:
+        cache.put(bank_name, llm_model, embedding_model, query, query_vector, answer, scope_key, cache_version)
+    return answer
 
-    # # search in Milvus
-    # collections_list = database_handling.list_collections(client, db_name=database_name)
-    # if not collections_list:
-    #     return "No collections found in the specified database."
-    # results = []
-    # for coll in collections_list:
-    #     collection = Collection(name=coll, using="default", db_name=database_name)
-    #     collection.load()
-    #     results.extend(collection.search(
-    #         data=embedded_input,
-    #         anns_field="question_embedding",
-    #         param={"metric_type": "L2", "params": {"nprobe": 10}},
-    #         limit=search_limit,
-    #         output_fields=["question", "answer"]
-    #     ))
-
-    # print(results)
-    context = [item["entity"]["text"] for sublist in results for item in sublist]
-    context_str = "\n\n".join(context) if context else "No relevant context found."
-
-    # build system prompt
-    system_prompt = systemprompt(context_str)
 
-    # chat with LLM
-    response: ChatResponse = chat(
-        model=llm_model,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": query}
+_async_ollama = None
+
+
+def get_async_ollama() -> AsyncClient:
+    global _async_ollama
+    if _async_ollama is None:
+        _async_ollama = AsyncClient()
+    return _async_ollama
+
+
+async def chatrag_stream(query: str,
+                         bank_name: str,
+                         search_limit: int = 5,
+                         embedding_model: str = 'all-MiniLM-L6-v2',
+                         llm_model: str = "gpt-oss:20b",
+                         search_profile: str = search_profiles.DEFAULT_PROFILE,
+                         scope: dict = None,
+                         retrieval_mode: str = hybrid_search.DEFAULT_MODE,
+                         context_tokens: int = context_packing.TOKEN_BUDGET):
+    """
+    Async version of `chatrag` that yields the answer while Ollama generates it.
+
+    Embedding runs on the micro-batcher thread and the Milvus search on the
+    default executor, so the event loop is never blocked. Yields dicts:
+    `{"type": "token", "content": ...}` for every streamed piece, then a final
+    `{"type": "done", ...}` with time-to-first-token and total latency in ms,
+    the context packing stats and Ollama's prompt token count and prefill time.
+    """
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    cache = answer_cache.get_cache()
+    scope_key = scoping.scope_key(scope)
+    cache_version = cache.version(bank_name)
+
+    def cached_events(answer, tier):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        return [
+            {"type": "token", "content": answer},
+            {"type": "done", "cache": tier, "partial": False, "collections": {}, "retrieval_ms": 0.0,
+             "search_ms": 0.0, "scope": scope, "context": None, "prompt_tokens": None, "prompt_eval_ms": None,
+             "time_to_first_token_ms": elapsed_ms, "total_ms": elapsed_ms},
         ]
+
+    with metrics.stage("chat", "answer_cache"):
+        cached = cache.get_exact(bank_name, llm_model, query, scope_key)
+    if cached is not None:
+        for event in cached_events(cached, "exact"):
+            yield event
+        return
+
+    with metrics.stage("chat", "embed"):
+        # shielded: a client disconnect cancels this coroutine, not the batcher's Future
+        query_vector = await asyncio.wait_for(
+            asyncio.shield(asyncio.wrap_future(micro_batcher.get_batcher(embedding_model).submit(query))),
+            micro_batcher.EMBED_TIMEOUT_SECONDS,
+        )
+    with metrics.stage("chat", "answer_cache"):
+        cached = cache.get_semantic(bank_name, llm_model, embedding_model, query_vector, scope_key, query)
+    if cached is not None:
+        for event in cached_events(cached, "semantic"):
+            yield event
+        return
+
+    # a copy of the context carries the request trace into the executor thread
+    context_str, retrieval = await loop.run_in_executor(
+        None, contextvars.copy_context().run, search_context, query_vector, bank_name, search_limit,
+        search_profile, scope, query, retrieval_mode, context_tokens
     )
+    retrieval_ms = (time.perf_counter() - started) * 1000
+
+    first_token_ms = None
+    prompt_tokens = prompt_eval_ms = None
+    tokens = []
+    messages = build_messages(query, context_str)
+    llm_started = time.perf_counter()
+    stream = await get_async_ollama().chat(
+        model=llm_model,
+        messages=messages,
+        stream=True,
+    )
+    async for part in stream:
+        if part.get("done"):
+            record_llm_usage(part)
+            prompt_tokens = part.get("prompt_eval_count")
+            if part.get("prompt_eval_duration") is not None:
+                prompt_eval_ms = part["prompt_eval_duration"] / 1e6
+        content = part["message"]["content"]
+        if not content:
+            continue
+        if first_token_ms is None:
+            first_token_ms = (time.perf_counter() - started) * 1000
+            metrics.record("chat", "llm_first_token", time.perf_counter() - llm_started)
+        tokens.append(content)
+        yield {"type": "token", "content": content}
+    metrics.record("chat", "llm_generate", time.perf_counter() - llm_started)
+
+    # only complete generations over complete retrievals are cached;
+    # a client disconnect stops the loop above
+    if not retrieval["partial"]:
+        cache.put(bank_name, llm_model, embedding_model, query, query_vector, "".join(tokens), scope_key,
+                  cache_version)
 
-    return response["message"]["content"]
+    yield {
+        "type": "done",
+        "cache": None,
+        "partial": retrieval["partial"],
+        "collections": retrieval["collections"],
+        "retrieval_ms": retrieval_ms,
+        "search_ms": retrieval["search_ms"],
+        "scope": scope,
+        "context": retrieval["context"],
+        "prompt_tokens": prompt_tokens,
+        "prompt_eval_ms": prompt_eval_ms,
+        "time_to_first_token_ms": first_token_ms,
+        "total_ms": (time.perf_counter() - started) * 1000,
+    }
 
 
 # Example usage:
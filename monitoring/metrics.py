@@ -0,0 +1,200 @@
+import bisect
+import contextvars
+import functools
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Seconds; spans sub-millisecond cache lookups up to multi-minute ingestions.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+                   60.0, 300.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in (*zip(names, values), *extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus text format."""
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            series["counts"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip((*self.buckets, math.inf), series["counts"]):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', _number(bound))])} "
+                                 f"{cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(series['sum'])}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {series['count']}")
+        return lines
+
+
+class Gauge:
+    """A gauge read from `collect()` (returning {label tuple: value}) at scrape time."""
+
+    def __init__(self, name: str, documentation: str, labelnames, collect):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for key, value in sorted(self.collect().items()):
+            if value is not None:
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+_metrics = []
+_metrics_lock = threading.Lock()
+
+
+def register(metric):
+    with _metrics_lock:
+        _metrics.append(metric)
+    return metric
+
+
+def render() -> str:
+    """Every registered metric in the Prometheus text exposition format (0.0.4)."""
+    with _metrics_lock:
+        metrics = list(_metrics)
+    lines = []
+    for metric in metrics:
+        try:
+            lines.extend(metric.render())
+        except Exception as e:
+            lines.append(f"# {metric.name} unavailable: {_escape(e)}")
+    return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = register(Histogram(
+    "ragflow_stage_duration_seconds",
+    "Wall time of one pipeline stage.",
+    ("pipeline", "stage"),
+))
+TOKENS = register(Counter(
+    "ragflow_tokens_total",
+    "Tokens processed, by kind (prompt, completion, context_packed, context_saved).",
+    ("kind",),
+))
+ROWS = register(Counter(
+    "ragflow_ingested_chunks_total",
+    "Chunks handled by ingestion, by outcome (total, embedded, reused, deleted).",
+    ("outcome",),
+))
+CHAT_REQUESTS = register(Counter(
+    "ragflow_chat_requests_total",
+    "Chat requests, by endpoint and answer-cache outcome.",
+    ("endpoint", "cache"),
+))
+
+
+# ---------------------------------------------------------------- per-request traces
+
+_trace = contextvars.ContextVar("ragflow_trace", default=None)
+
+
+@contextmanager
+def trace():
+    """
+    Collect the stages timed inside this block (in this context) as {stage: ms}.
+
+    Work handed to threads only shows up when it runs in a copy of the
+    context, e.g. `loop.run_in_executor(None, contextvars.copy_context().run, fn)`.
+    """
+    spans = {}
+    token = _trace.set(spans)
+    try:
+        yield spans
+    finally:
+        _trace.reset(token)
+
+
+def record(pipeline: str, name: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, pipeline=pipeline, stage=name)
+    spans = _trace.get()
+    if spans is not None:
+        spans[name] = spans.get(name, 0.0) + seconds * 1000
+
+
+@contextmanager
+def stage(pipeline: str, name: str):
+    """Time a block into the stage histogram and the current request trace, if any."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(pipeline, name, time.perf_counter() - started)
+
+
+def timed(pipeline: str, name: str):
+    """Decorator form of `stage`."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(pipeline, name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def server_timing(spans: dict) -> str:
+    """Format a trace as a Server-Timing header value."""
+    return ", ".join(f"{name};dur={ms:.2f}" for name, ms in spans.items())
@@ -0,0 +1,181 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from retrieval import lexical_index
+
+
+MAX_ENTRIES = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", "1024"))
+TTL_SECONDS = float(os.environ.get("ANSWER_CACHE_TTL_SECONDS", "3600"))
+# Cosine distance under which two queries are treated as the same question (if their key terms also match).
+MAX_DISTANCE = float(os.environ.get("ANSWER_CACHE_MAX_DISTANCE", "0.05"))
+
+
+def normalize_query(query: str) -> str:
+    query = query.lower().strip()
+    query = re.sub(r"\s+", " ", query)
+    return query.rstrip("?!. ")
+
+
+def key_terms(query: str) -> frozenset:
+    """Content words of `query`; "fees for Visa Gold" and "fees for Visa Platinum" differ here."""
+    return frozenset(lexical_index.tokenize(query))
+
+
+class AnswerCache:
+    """
+    Two-tier cache of generated answers.
+
+    Tier one is an exact lookup on (bank_name, llm_model, normalized query),
+    plus the retrieval `scope` (partition/metadata filters) when one is used.
+    Tier two compares the query embedding against cached queries for the same
+    bank, scope, LLM and embedding model and reuses the closest answer when its
+    cosine distance is below `max_distance` and both queries have the same key
+    terms, since embeddings barely separate questions that differ in one entity.
+    Entries expire after `ttl_seconds` and the least recently used entry is
+    evicted beyond `max_entries`.
+
+    Every `invalidate_bank` bumps the bank's version. Callers take `version()`
+    before looking up and pass it to `put`, which drops answers generated from
+    documents that were re-ingested in the meantime.
+    """
+
+    def __init__(self,
+                 max_entries: int = MAX_ENTRIES,
+                 ttl_seconds: float = TTL_SECONDS,
+                 max_distance: float = MAX_DISTANCE):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.max_distance = max_distance
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0,
+                       "evictions": 0, "expirations": 0, "invalidations": 0, "stale_puts": 0}
+
+    def _version(self, bank_name: str) -> tuple:
+        if bank_name.strip().lower() in ("*", "all"):
+            # every invalidation affects an answer drawn from all collections
+            return (self._generation,)
+        return tuple(self._versions.get(name.strip(), 0) for name in bank_name.split(","))
+
+    def version(self, bank_name: str) -> tuple:
+        with self._lock:
+            return self._version(bank_name)
+
+    def _expired(self, entry) -> bool:
+        return time.monotonic() - entry["created"] > self.ttl_seconds
+
+    def _drop(self, key):
+        self._entries.pop(key, None)
+
+    def get_exact(self, bank_name: str, llm_model: str, query: str, scope: str = ""):
+        key = (bank_name, llm_model, normalize_query(query), scope)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry):
+                self._drop(key)
+                self._stats["expirations"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["exact_hits"] += 1
+            return entry["answer"]
+
+    def get_semantic(self, bank_name: str, llm_model: str, embedding_model: str, query_vector, scope: str = "",
+                     query: str = None):
+        query_vector = _unit(query_vector)
+        terms = key_terms(query) if query is not None else None
+        with self._lock:
+            candidates = []
+            for key, entry in list(self._entries.items()):
+                if key[0] != bank_name or key[1] != llm_model or key[3] != scope \
+                        or entry["embedding_model"] != embedding_model \
+                        or (terms is not None and entry["terms"] != terms):
+                    continue
+                if self._expired(entry):
+                    self._drop(key)
+                    self._stats["expirations"] += 1
+                    continue
+                candidates.append(key)
+
+            if candidates:
+                matrix = np.stack([self._entries[key]["vector"] for key in candidates])
+                distances = 1.0 - matrix @ query_vector
+                best = int(np.argmin(distances))
+                if distances[best] <= self.max_distance:
+                    key = candidates[best]
+                    self._entries.move_to_end(key)
+                    self._stats["semantic_hits"] += 1
+                    return self._entries[key]["answer"]
+
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, bank_name: str, llm_model: str, embedding_model: str, query: str, query_vector, answer: str,
+            scope: str = "", version: tuple = None):
+        key = (bank_name, llm_model, normalize_query(query), scope)
+        with self._lock:
+            # the bank was re-ingested while this answer was generated; don't cache it
+            if version is not None and version != self._version(bank_name):
+                self._stats["stale_puts"] += 1
+                return
+            self._entries[key] = {
+                "answer": answer,
+                "vector": _unit(query_vector),
+                "terms": key_terms(query),
+                "embedding_model": embedding_model,
+                "created": time.monotonic(),
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate_bank(self, bank_name: str):
+        """Forget every answer generated from `bank_name`'s collection, including federated ones."""
+        with self._lock:
+            self._versions[bank_name] = self._versions.get(bank_name, 0) + 1
+            self._generation += 1
+            stale = [key for key in self._entries if _covers(key[0], bank_name)]
+            for key in stale:
+                self._drop(key)
+            self._stats["invalidations"] += len(stale)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        hits = stats["exact_hits"] + stats["semantic_hits"]
+        lookups = hits + stats["misses"]
+        stats["hit_rate"] = hits / lookups if lookups else 0.0
+        stats["max_entries"] = self.max_entries
+        stats["ttl_seconds"] = self.ttl_seconds
+        stats["max_distance"] = self.max_distance
+        return stats
+
+
+def _covers(cached_bank_name: str, bank_name: str) -> bool:
+    """Whether answers cached under `cached_bank_name` ("A", "A,B" or "*") drew on `bank_name`."""
+    if cached_bank_name.strip().lower() in ("*", "all"):
+        return True
+    return bank_name in (name.strip() for name in cached_bank_name.split(","))
+
+
+def _unit(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype="float32").ravel()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+_cache = AnswerCache()
+
+
+def get_cache() -> AnswerCache:
+    return _cache
@@ -0,0 +1,156 @@
+import hashlib
+import os
+import re
+import time
+
+
+# Prompt tokens available for retrieved context; 0 disables packing.
+TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "1500"))
+# Shortest suffix/prefix match accepted as overlap of consecutive chunks when offsets are missing.
+MIN_TEXT_OVERLAP = 20
+# Longest overlap searched for; the splitter overlap is 100 characters.
+MAX_TEXT_OVERLAP = 400
+# Fields the packer uses besides text; requested from the search when the collection has them.
+OUTPUT_FIELDS = ("text", "source", "chunk_type", "page", "start_offset", "end_offset", "chunk_index")
+
+
+def estimate_tokens(text: str) -> int:
+    """About four characters per token for English text; no tokenizer for the Ollama model is at hand."""
+    return (len(text) + 3) // 4
+
+
+def _fingerprint(text: str) -> str:
+    return hashlib.sha1(re.sub(r"\s+", " ", text).strip().lower().encode("utf-8")).hexdigest()
+
+
+def _text_overlap(left: str, right: str) -> int:
+    """Length of the longest suffix of `left` that is a prefix of `right` (0 if shorter than MIN_TEXT_OVERLAP)."""
+    tail = left[-MAX_TEXT_OVERLAP:]
+    probe = right[:MIN_TEXT_OVERLAP]
+    if len(probe) < MIN_TEXT_OVERLAP:
+        return 0
+    start = tail.find(probe)
+    while start != -1:
+        if right.startswith(tail[start:]):
+            return len(tail) - start
+        start = tail.find(probe, start + 1)
+    return 0
+
+
+def _group_key(hit: dict) -> tuple:
+    entity = hit["entity"]
+    # offsets are relative to the page for PDFs and to the description text for images
+    return (hit.get("collection"), entity.get("source"), entity.get("page"),
+            entity.get("chunk_type") == "image_description")
+
+
+def _merge_group(hits: list) -> list:
+    """Merge overlapping or touching chunks of one source into contiguous blocks."""
+    with_offsets = all(h["entity"].get("start_offset") is not None and h["entity"].get("end_offset") is not None
+                       for h in hits)
+    with_index = all(h["entity"].get("chunk_index") is not None for h in hits)
+    if with_offsets:
+        hits = sorted(hits, key=lambda h: (h["entity"]["start_offset"], -h["entity"]["end_offset"]))
+    elif with_index:
+        hits = sorted(hits, key=lambda h: h["entity"]["chunk_index"])
+    else:
+        # nothing tells where the chunks sit in the document (primary keys do not follow it
+        # once a document is re-ingested incrementally), so they are kept apart
+        return [{"text": h["entity"].get("text") or "", "score": h["score"], "chunks": 1, "end": None}
+                for h in hits]
+
+    blocks = []
+    for hit in hits:
+        text = hit["entity"].get("text") or ""
+        if blocks:
+            block = blocks[-1]
+            if with_offsets:
+                start, end = hit["entity"]["start_offset"], hit["entity"]["end_offset"]
+                overlap = block["end"] - start
+                if end <= block["end"]:
+                    # contained in the block (the text check guards against mismatched offsets)
+                    mergeable = text in block["text"]
+                else:
+                    mergeable = overlap >= 0 and block["text"].endswith(text[:overlap])
+                if mergeable:
+                    if end > block["end"]:
+                        block["text"] += text[overlap:]
+                        block["end"] = end
+                    block["score"] = max(block["score"], hit["score"])
+                    block["chunks"] += 1
+                    continue
+            elif hit["entity"]["chunk_index"] == block["index"] + 1:
+                overlap = _text_overlap(block["text"], text)
+                if overlap:
+                    block["text"] += text[overlap:]
+                    block["score"] = max(block["score"], hit["score"])
+                    block["chunks"] += 1
+                    block["index"] += 1
+                    continue
+        blocks.append({
+            "text": text,
+            "score": hit["score"],
+            "chunks": 1,
+            "end": hit["entity"].get("end_offset") if with_offsets else None,
+            "index": hit["entity"].get("chunk_index"),
+        })
+    return blocks
+
+
+def pack(hits: list, token_budget: int = TOKEN_BUDGET) -> dict:
+    """
+    Assemble retrieved hits into the prompt context.
+
+    Exact duplicates (same text in several partitions or collections) are
+    dropped. Chunks of the same source that overlap or touch are merged,
+    by stored character offsets when present, otherwise consecutive chunks
+    (by stored `chunk_index`) whose text overlaps; chunks with neither are
+    not merged. The merged blocks are then added best score first
+    while they fit in `token_budget`; when even the best block does not fit
+    it is truncated. Returns the context text and the token accounting.
+    """
+    started = time.perf_counter()
+    raw_text = "\n\n".join(hit["entity"].get("text") or "" for hit in hits)
+    stats = {"chunks_in": len(hits), "raw_tokens": estimate_tokens(raw_text) if hits else 0}
+
+    if token_budget <= 0:
+        stats.update(blocks=len(hits), duplicates_dropped=0, chunks_merged=0, blocks_dropped=0,
+                     packed_tokens=stats["raw_tokens"], tokens_saved=0,
+                     pack_ms=(time.perf_counter() - started) * 1000)
+        return {"text": raw_text, "stats": stats}
+
+    seen, unique = set(), []
+    for hit in hits:
+        fingerprint = _fingerprint(hit["entity"].get("text") or "")
+        if fingerprint not in seen:
+            seen.add(fingerprint)
+            unique.append(hit)
+
+    groups = {}
+    for hit in unique:
+        groups.setdefault(_group_key(hit), []).append(hit)
+    blocks = [block for group in groups.values() for block in _merge_group(group)]
+    blocks.sort(key=lambda block: block["score"], reverse=True)
+
+    selected, used = [], 0
+    separator_tokens = estimate_tokens("\n\n")
+    for block in blocks:
+        tokens = estimate_tokens(block["text"]) + (separator_tokens if selected else 0)
+        if used + tokens <= token_budget:
+            selected.append(block["text"])
+            used += tokens
+    if not selected and blocks:
+        selected.append(blocks[0]["text"][:token_budget * 4])
+
+    text = "\n\n".join(selected)
+    packed_tokens = estimate_tokens(text) if selected else 0
+    stats.update(
+        blocks=len(selected),
+        duplicates_dropped=len(hits) - len(unique),
+        chunks_merged=len(unique) - len(blocks),
+        blocks_dropped=len(blocks) - len(selected),
+        packed_tokens=packed_tokens,
+        tokens_saved=stats["raw_tokens"] - packed_tokens,
+        pack_ms=(time.perf_counter() - started) * 1000,
+    )
+    return {"text": text, "stats": stats}
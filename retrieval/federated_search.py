@@ -0,0 +1,187 @@
+import heapq
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from databaseHandling import index_manager
+from databaseHandling.connection_manager import get_manager, DATABASE_NAME
+from retrieval import search_cache, search_profiles
+
+
+COLLECTION_TIMEOUT_SECONDS = float(os.environ.get("FEDERATED_TIMEOUT_SECONDS", "2.0"))
+MAX_WORKERS = int(os.environ.get("FEDERATED_MAX_WORKERS", "8"))
+COLLECTION_LIST_TTL_SECONDS = 30.0
+# Cached schemas are re-read after this long, in case another process recreated the collection.
+SCHEMA_TTL_SECONDS = 30.0
+ALL_COLLECTIONS = ("*", "all")
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="federated-search")
+_collections_cache = {"names": None, "fetched": 0.0}
+_collections_lock = threading.Lock()
+_schema_fields = {}
+
+
+def list_bank_collections(db_name: str = DATABASE_NAME) -> list:
+    with _collections_lock:
+        if _collections_cache["names"] is not None and \
+                time.monotonic() - _collections_cache["fetched"] < COLLECTION_LIST_TTL_SECONDS:
+            return list(_collections_cache["names"])
+    with get_manager().client(db_name) as client:
+        # collections are listed under the alias they are searched by
+        names = index_manager.public_names(client.list_collections())
+    with _collections_lock:
+        _collections_cache.update(names=names, fetched=time.monotonic())
+    return list(names)
+
+
+def parse_bank_names(bank_name: str) -> list:
+    """Collections named by `bank_name`: one name, a comma-separated list, or "*"/"all" for every collection."""
+    if bank_name.strip().lower() in ALL_COLLECTIONS:
+        return list_bank_collections()
+    return [name.strip() for name in bank_name.split(",") if name.strip()]
+
+
+def available_fields(client, collection_name: str, requested) -> list:
+    """
+    The `requested` output fields the collection can return: its schema fields
+    plus, when dynamic fields are enabled, any other key (missing ones are
+    simply absent from hits). Older collections reject unknown fields.
+    """
+    cached = _schema_fields.get(collection_name)
+    if cached is None or time.monotonic() - cached[2] >= SCHEMA_TTL_SECONDS:
+        description = client.describe_collection(collection_name=collection_name)
+        cached = _schema_fields[collection_name] = (
+            {field["name"] for field in description["fields"]},
+            bool(description.get("enable_dynamic_field")),
+            time.monotonic(),
+        )
+    fields, dynamic, _ = cached
+    return [name for name in requested if dynamic or name in fields]
+
+
+def invalidate_schema(collection_name: str):
+    """Forget the cached schema of a collection that was (re)created or changed."""
+    _schema_fields.pop(collection_name, None)
+
+
+def similarity(distance: float, metric_type: str) -> float:
+    """Put scores from different metrics on one higher-is-better scale."""
+    if search_profiles.higher_is_better(metric_type):
+        return distance
+    # Milvus L2 is the squared distance; for unit vectors cosine = 1 - d / 2
+    return 1.0 - distance / 2.0
+
+
+def search_collection(collection_name: str, query_vector, limit: int,
+                      profile: str = search_profiles.DEFAULT_PROFILE,
+                      output_fields=("text", "source"),
+                      scope: dict = None) -> list:
+    """
+    Search one collection through the search cache; hits are plain dicts tagged with their collection.
+
+    `scope` (see retrieval.scoping.search_scope) restricts the search to some
+    partitions and/or a scalar filter expression. A collection that lacks the
+    requested partitions simply has no hits.
+    """
+    scope = scope or {}
+    partition_names = scope.get("partition_names") or None
+    filter_expr = scope.get("filter") or ""
+    cache = search_cache.get_cache()
+    with get_manager().client(DATABASE_NAME) as client:
+        if partition_names:
+            partition_names = [name for name in partition_names
+                               if client.has_partition(collection_name=collection_name, partition_name=name)]
+            if not partition_names:
+                return []
+        output_fields = available_fields(client, collection_name, output_fields)
+        # metric and nprobe/ef follow the collection's actual index
+        search_param = search_profiles.resolve(client, collection_name, profile, limit)
+        cache_key = cache.make_key(collection_name, query_vector, limit, search_param,
+                                   output_fields=list(output_fields),
+                                   partition_names=partition_names, filter=filter_expr)
+        results = cache.get(cache_key)
+        if results is None:
+            results = client.search(
+                collection_name=collection_name,
+                data=[query_vector.tolist()],
+                filter=filter_expr,
+                anns_field="embedding",
+                search_params=search_param,
+                limit=limit,
+                output_fields=list(output_fields),
+                partition_names=partition_names,
+            )
+            results = search_cache.to_plain_results(results)
+            cache.put(cache_key, results)
+
+    hits = []
+    for hit in results[0] if results else []:
+        hits.append({
+            **hit,
+            "collection": collection_name,
+            "score": similarity(hit["distance"], search_param["metric_type"]),
+        })
+    return hits
+
+
+def federated_search(query_vector, collections: list, limit: int,
+                     profile: str = search_profiles.DEFAULT_PROFILE,
+                     timeout: float = COLLECTION_TIMEOUT_SECONDS,
+                     output_fields=("text", "source"),
+                     scope: dict = None,
+                     search_fn=search_collection) -> dict:
+    """
+    Search several collections concurrently and merge their top-k hits.
+
+    Every collection gets `timeout` seconds from when a worker picks it up
+    (and may wait as long again for a free worker); collections that time
+    out or fail are left out instead of stalling the answer, and `partial`
+    is set so the caller can tell. Hits are merged with a heap on a common similarity scale.
+    `search_fn` searches one collection (e.g. the hybrid search) and takes
+    `search_collection`'s arguments.
+    """
+    started = time.perf_counter()
+    submitted = time.monotonic()
+    started_at = {}
+
+    def run(name):
+        started_at[name] = time.monotonic()
+        return search_fn(name, query_vector, limit, profile, output_fields, scope)
+
+    def deadline(name):
+        # queued collections wait at most `timeout` for a worker, then get `timeout` to search
+        return started_at.get(name, submitted + timeout) + timeout
+
+    futures = {_executor.submit(run, name): name for name in collections}
+    statuses = {}
+    per_collection = []
+    pending = set(futures)
+    while pending:
+        next_deadline = min(deadline(futures[future]) for future in pending)
+        done, pending = wait(pending, timeout=max(0.0, next_deadline - time.monotonic()),
+                             return_when=FIRST_COMPLETED)
+        for future in done:
+            name = futures[future]
+            try:
+                per_collection.append(future.result())
+                statuses[name] = "ok"
+            except Exception as e:
+                logger.warning(f"Federated search failed on '{name}': {e}")
+                statuses[name] = f"error: {e}"
+        now = time.monotonic()
+        for future in [future for future in pending if deadline(futures[future]) <= now]:
+            future.cancel()
+            statuses[futures[future]] = "timeout"
+            pending.discard(future)
+
+    merged = heapq.nlargest(limit, (hit for hits in per_collection for hit in hits), key=lambda hit: hit["score"])
+    return {
+        "hits": merged,
+        "partial": any(status != "ok" for status in statuses.values()),
+        "collections": statuses,
+        "search_ms": (time.perf_counter() - started) * 1000,
+    }
@@ -0,0 +1,91 @@
+import heapq
+import os
+
+from databaseHandling.connection_manager import get_manager, DATABASE_NAME
+from retrieval import federated_search, lexical_index, search_profiles
+
+
+RETRIEVAL_MODES = ("vector", "hybrid")
+DEFAULT_MODE = os.environ.get("RETRIEVAL_MODE", "hybrid")
+# Standard RRF damping constant; higher values flatten the rank contribution.
+RRF_K = int(os.environ.get("RRF_K", "60"))
+# Each ranker contributes this many candidates per requested hit.
+CANDIDATE_FACTOR = int(os.environ.get("HYBRID_CANDIDATE_FACTOR", "2"))
+# The BM25 index cannot apply scalar filters; with one, it returns this many times more candidates.
+FILTER_OVERFETCH = int(os.environ.get("HYBRID_FILTER_OVERFETCH", "4"))
+
+
+def reciprocal_rank_fusion(rankings: list, k: int = RRF_K) -> dict:
+    """Fuse ranked id lists: score(id) = sum over rankers of 1 / (k + rank)."""
+    scores = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return scores
+
+
+def _fetch_entities(collection_name: str, ids: list, output_fields, filter_expr: str) -> dict:
+    """Stored fields of lexical-only hits; chunks excluded by the scope filter are left out."""
+    expr = f"chunk_id in {list(ids)}"
+    if filter_expr:
+        expr = f"({expr}) and ({filter_expr})"
+    with get_manager().client(DATABASE_NAME) as client:
+        output_fields = federated_search.available_fields(client, collection_name, output_fields)
+        rows = client.query(collection_name=collection_name, filter=expr,
+                            output_fields=["chunk_id", *output_fields])
+    return {row["chunk_id"]: {field: row[field] for field in output_fields if field in row} for row in rows}
+
+
+def search_collection(collection_name: str, query_vector, limit: int,
+                      profile: str = search_profiles.DEFAULT_PROFILE,
+                      output_fields=("text", "source"),
+                      scope: dict = None,
+                      query_text: str = None) -> list:
+    """
+    Vector search fused with the collection's BM25 index by reciprocal rank fusion.
+
+    Both rankers return `limit * CANDIDATE_FACTOR` candidates, so exact-token
+    matches (product names, fee codes, card types) that MiniLM ranks low can
+    still make the top `limit` without inflating the vector search. Without
+    query text this is plain vector search; a collection that has no lexical
+    index yet is ranked by the vector hits alone, on the same RRF scale.
+    The BM25 ranker over-fetches when the scope has a filter, and its
+    candidates outside the scope are dropped before fusion.
+    """
+    if not query_text:
+        return federated_search.search_collection(collection_name, query_vector, limit, profile,
+                                                  output_fields, scope)
+
+    scope = scope or {}
+    candidates = limit * max(1, CANDIDATE_FACTOR)
+    vector_hits = federated_search.search_collection(collection_name, query_vector, candidates, profile,
+                                                     output_fields, scope)
+    lexical_hits = lexical_index.get_index(collection_name).search(
+        query_text, candidates * (max(1, FILTER_OVERFETCH) if scope.get("filter") else 1),
+        partition_names=scope.get("partition_names"))
+
+    by_id = {hit["id"]: hit for hit in vector_hits}
+    # the vector hits already match the scope; lexical-only candidates are checked before the top-k cut,
+    # so chunks outside the scope (or deleted since indexing) cannot push matching ones out
+    missing = [chunk_id for chunk_id, _ in lexical_hits if chunk_id not in by_id]
+    entities = _fetch_entities(collection_name, missing, output_fields, scope.get("filter")) if missing else {}
+
+    vector_ranking = [hit["id"] for hit in vector_hits]
+    lexical_ranking = [chunk_id for chunk_id, _ in lexical_hits
+                       if chunk_id in by_id or chunk_id in entities][:candidates]
+    fused = reciprocal_rank_fusion([vector_ranking, lexical_ranking])
+    top = heapq.nlargest(limit, fused.items(), key=lambda item: item[1])
+
+    vector_rank = {chunk_id: rank for rank, chunk_id in enumerate(vector_ranking, start=1)}
+    lexical_rank = {chunk_id: rank for rank, chunk_id in enumerate(lexical_ranking, start=1)}
+    hits = []
+    for chunk_id, score in top:
+        if chunk_id in by_id:
+            hit = dict(by_id[chunk_id])
+        else:
+            hit = {"id": chunk_id, "distance": None, "entity": entities[chunk_id], "collection": collection_name}
+        hit["score"] = score
+        hit["vector_rank"] = vector_rank.get(chunk_id)
+        hit["lexical_rank"] = lexical_rank.get(chunk_id)
+        hits.append(hit)
+    return hits
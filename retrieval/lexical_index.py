@@ -0,0 +1,384 @@
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+
+import numpy as np
+
+
+INDEX_DIR = os.environ.get("BM25_INDEX_DIR", os.path.join("uploaded_files", "bm25"))
+BM25_K1 = float(os.environ.get("BM25_K1", "1.2"))
+BM25_B = float(os.environ.get("BM25_B", "0.75"))
+# Segments of one partition are merged once there are more than this many.
+MAX_SEGMENTS_PER_PARTITION = int(os.environ.get("BM25_MAX_SEGMENTS_PER_PARTITION", "4"))
+
+# Keeps codes like "fx-200", "e.g." or "visa_platinum" together as one token.
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it my of on or our the to we what when "
+    "where which who will with you your".split()
+)
+
+logger = logging.getLogger(__name__)
+
+
+def tokenize(text: str) -> list:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def _load_array(path: str) -> np.ndarray:
+    try:
+        return np.load(path, mmap_mode="r")
+    except ValueError:
+        # numpy cannot mmap an empty array
+        return np.load(path)
+
+
+class Segment:
+    """
+    One immutable, on-disk batch of indexed chunks.
+
+    Postings of all terms are stored back to back in `<name>.docs.npy`
+    (segment-local doc numbers) and `<name>.tfs.npy` (term frequencies); the
+    term dictionary in `<name>.json` maps each term to its (start, count)
+    slice. The arrays are memory-mapped, so only the pages of queried terms
+    are read.
+    """
+
+    def __init__(self, directory: str, name: str):
+        self.name = name
+        base = os.path.join(directory, name)
+        with open(base + ".json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.partition_name = meta["partition_name"]
+        self.total_length = meta["total_length"]
+        self.terms = meta["terms"]
+        self.ids = _load_array(base + ".ids.npy")
+        self.lengths = _load_array(base + ".lengths.npy")
+        self.docs = _load_array(base + ".docs.npy")
+        self.tfs = _load_array(base + ".tfs.npy")
+
+    @property
+    def size(self) -> int:
+        return len(self.ids)
+
+    def postings(self, term: str):
+        entry = self.terms.get(term)
+        if entry is None:
+            return None, None
+        start, count = entry
+        return self.docs[start:start + count], self.tfs[start:start + count]
+
+    def document_frequency(self, term: str) -> int:
+        entry = self.terms.get(term)
+        return entry[1] if entry else 0
+
+    @staticmethod
+    def write(directory: str, name: str, partition_name: str, ids, lengths, postings: dict) -> "Segment":
+        """Persist `postings` ({term: [(doc, tf), ...]}) for docs `ids` as segment `name`."""
+        terms, docs, tfs = {}, [], []
+        for term in sorted(postings):
+            entries = postings[term]
+            terms[term] = [len(docs), len(entries)]
+            for doc, tf in entries:
+                docs.append(doc)
+                tfs.append(tf)
+
+        base = os.path.join(directory, name)
+        np.save(base + ".ids.npy", np.asarray(ids, dtype=np.int64))
+        np.save(base + ".lengths.npy", np.asarray(lengths, dtype=np.int32))
+        np.save(base + ".docs.npy", np.asarray(docs, dtype=np.int32))
+        np.save(base + ".tfs.npy", np.minimum(np.asarray(tfs, dtype=np.int64), 65535).astype(np.uint16))
+        # the dictionary is written last; a segment without it is never listed in the manifest
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump({"partition_name": partition_name, "total_length": int(sum(lengths)), "terms": terms}, f)
+        return Segment(directory, name)
+
+    def delete_files(self, directory: str):
+        for suffix in (".json", ".ids.npy", ".lengths.npy", ".docs.npy", ".tfs.npy"):
+            try:
+                os.remove(os.path.join(directory, self.name + suffix))
+            except FileNotFoundError:
+                pass
+
+
+class SegmentBuilder:
+    """Accumulates chunks of one ingestion in memory until they are committed as a segment."""
+
+    def __init__(self, partition_name: str):
+        self.partition_name = partition_name
+        self.ids = []
+        self.lengths = []
+        self.postings = defaultdict(list)
+
+    def add(self, ids, texts):
+        for chunk_id, text in zip(ids, texts):
+            tokens = tokenize(text)
+            doc = len(self.ids)
+            self.ids.append(int(chunk_id))
+            self.lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                self.postings[term].append((doc, tf))
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class LexicalIndex:
+    """
+    BM25 index over the chunks of one collection, kept next to its Milvus data.
+
+    Every ingestion adds a segment for the partition it wrote (built from the
+    primary keys the bulk writer got back), deleted chunks are tombstoned, and
+    a recreated partition drops its segments. When a partition collects more
+    than MAX_SEGMENTS_PER_PARTITION segments they are merged into one and the
+    tombstoned chunks are purged. Until then they are left out of the results
+    and of the BM25 statistics. `manifest.json` lists the live segments and
+    is replaced atomically.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+        manifest = self._read_json("manifest.json", {"segments": [], "next_segment": 0})
+        self._next_segment = manifest["next_segment"]
+        self._segments = [Segment(directory, name) for name in manifest["segments"]]
+        self._tombstones = set(self._read_json("tombstones.json", []))
+        # segment name -> mask of its tombstoned docs (None if there are none), until the tombstones change
+        self._dead = {}
+
+    def _read_json(self, filename: str, default):
+        path = os.path.join(self.directory, filename)
+        if not os.path.exists(path):
+            return default
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_json(self, filename: str, value):
+        path = os.path.join(self.directory, filename)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(value, f)
+        os.replace(path + ".tmp", path)
+
+    def _save_manifest(self):
+        self._write_json("manifest.json", {
+            "segments": [segment.name for segment in self._segments],
+            "next_segment": self._next_segment,
+        })
+
+    def _save_tombstones(self):
+        self._write_json("tombstones.json", sorted(self._tombstones))
+        self._dead.clear()
+
+    def _dead_docs(self, segments) -> dict:
+        tombstones = None
+        for segment in segments:
+            if segment.name not in self._dead:
+                if tombstones is None:
+                    tombstones = np.fromiter(self._tombstones, dtype=np.int64, count=len(self._tombstones))
+                mask = np.isin(segment.ids, tombstones) if len(tombstones) else None
+                self._dead[segment.name] = mask if mask is not None and mask.any() else None
+        return {segment.name: self._dead[segment.name] for segment in segments}
+
+    def _new_segment_name(self) -> str:
+        name = f"seg-{self._next_segment:06d}"
+        self._next_segment += 1
+        return name
+
+    def commit(self, builder: SegmentBuilder):
+        """Persist a builder's chunks as a new segment."""
+        if not len(builder):
+            return
+        with self._lock:
+            segment = Segment.write(self.directory, self._new_segment_name(), builder.partition_name,
+                                    builder.ids, builder.lengths, builder.postings)
+            self._segments.append(segment)
+            self._save_manifest()
+            if sum(s.partition_name == builder.partition_name for s in self._segments) > MAX_SEGMENTS_PER_PARTITION:
+                self._merge_partition(builder.partition_name)
+
+    def add(self, partition_name: str, ids, texts):
+        builder = SegmentBuilder(partition_name)
+        builder.add(ids, texts)
+        self.commit(builder)
+
+    def delete(self, ids):
+        with self._lock:
+            self._tombstones.update(int(chunk_id) for chunk_id in ids)
+            self._save_tombstones()
+
+    def drop_partition(self, partition_name: str):
+        with self._lock:
+            dropped = [s for s in self._segments if s.partition_name == partition_name]
+            if not dropped:
+                return
+            self._segments = [s for s in self._segments if s.partition_name != partition_name]
+            self._save_manifest()
+            for segment in dropped:
+                self._tombstones.difference_update(int(chunk_id) for chunk_id in segment.ids)
+                segment.delete_files(self.directory)
+            self._save_tombstones()
+
+    def remap_ids(self, old_ids, new_ids):
+        """
+        Move every chunk to a new primary key (`old_ids[i]` -> `new_ids[i]`), as
+        after the collection was copied. Chunks missing from `old_ids` are gone
+        from the copy and are dropped, so the tombstones are cleared too.
+        """
+        old_ids = np.asarray(old_ids, dtype=np.int64)
+        order = np.argsort(old_ids)
+        id_map = (old_ids[order], np.asarray(new_ids, dtype=np.int64)[order])
+        with self._lock:
+            for partition_name in dict.fromkeys(s.partition_name for s in self._segments):
+                self._merge_partition(partition_name, id_map)
+            self._tombstones.clear()
+            self._save_tombstones()
+
+    def _merge_partition(self, partition_name: str, id_map=None):
+        # `id_map` is a (sorted old ids, new ids) pair; unmapped chunks are purged like tombstoned ones
+        sources = [s for s in self._segments if s.partition_name == partition_name]
+        tombstones = np.fromiter(self._tombstones, dtype=np.int64, count=len(self._tombstones))
+        ids, lengths, postings = [], [], defaultdict(list)
+        kept = set()
+        for segment in sources:
+            alive = ~np.isin(segment.ids, tombstones)
+            chunk_ids = segment.ids
+            if id_map is not None:
+                old, new = id_map
+                at = np.minimum(np.searchsorted(old, segment.ids), len(old) - 1)
+                if len(old):
+                    alive &= old[at] == segment.ids
+                    chunk_ids = new[at]
+                else:
+                    alive[:] = False
+            kept.update(int(chunk_id) for chunk_id in segment.ids[alive])
+            # segment-local doc number -> merged doc number (-1 for purged docs)
+            remap = np.full(segment.size, -1, dtype=np.int64)
+            remap[alive] = np.arange(len(ids), len(ids) + int(alive.sum()))
+            ids.extend(int(chunk_id) for chunk_id in chunk_ids[alive])
+            lengths.extend(int(length) for length in segment.lengths[alive])
+            for term in segment.terms:
+                docs, tfs = segment.postings(term)
+                new_docs = remap[docs]
+                keep = new_docs >= 0
+                postings[term].extend(zip(new_docs[keep].tolist(), tfs[keep].tolist()))
+
+        merged = Segment.write(self.directory, self._new_segment_name(), partition_name, ids, lengths, postings)
+        self._segments = [s for s in self._segments if s.partition_name != partition_name] + [merged]
+        self._save_manifest()
+        purged = {int(chunk_id) for segment in sources for chunk_id in segment.ids} - kept
+        self._tombstones.difference_update(purged)
+        self._save_tombstones()
+        for segment in sources:
+            segment.delete_files(self.directory)
+        logger.info(f"Merged {len(sources)} BM25 segments of '{partition_name}' ({len(ids)} chunks)")
+
+    def search(self, query: str, limit: int, partition_names=None) -> list:
+        """Top `limit` (chunk_id, bm25_score) pairs, best first."""
+        terms = set(tokenize(query))
+        with self._lock:
+            segments = list(self._segments)
+            dead = self._dead_docs(segments)
+        if not terms or not segments:
+            return []
+
+        # collection-wide statistics over live docs, so scores are comparable across segments and partitions
+        doc_count = sum(s.size - (int(dead[s.name].sum()) if dead[s.name] is not None else 0) for s in segments)
+        total_length = sum(s.total_length - (int(s.lengths[dead[s.name]].sum()) if dead[s.name] is not None else 0)
+                           for s in segments)
+        avg_length = total_length / max(1, doc_count)
+        idf = {}
+        for term in terms:
+            df = 0
+            for segment in segments:
+                mask = dead[segment.name]
+                if mask is None:
+                    df += segment.document_frequency(term)
+                else:
+                    docs, _ = segment.postings(term)
+                    if docs is not None:
+                        df += len(docs) - int(mask[docs].sum())
+            if df:
+                idf[term] = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+
+        if partition_names:
+            segments = [s for s in segments if s.partition_name in partition_names]
+        best = []
+        for segment in segments:
+            scores = np.zeros(segment.size, dtype=np.float32)
+            for term, weight in idf.items():
+                docs, tfs = segment.postings(term)
+                if docs is None:
+                    continue
+                tf = tfs.astype(np.float32)
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * segment.lengths[docs] / max(avg_length, 1e-9))
+                scores[docs] += weight * tf * (BM25_K1 + 1) / (tf + norm)
+            candidates = np.flatnonzero(scores)
+            if dead[segment.name] is not None:
+                candidates = candidates[~dead[segment.name][candidates]]
+            if len(candidates) > limit:
+                candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+            best.extend((int(segment.ids[doc]), float(scores[doc])) for doc in candidates)
+        return heapq.nlargest(limit, best, key=lambda hit: hit[1])
+
+    def stats(self) -> dict:
+        with self._lock:
+            partitions = Counter(s.partition_name for s in self._segments)
+            return {
+                "segments": len(self._segments),
+                "chunks": sum(s.size for s in self._segments),
+                "terms": sum(len(s.terms) for s in self._segments),
+                "tombstones": len(self._tombstones),
+                "segments_per_partition": dict(partitions),
+            }
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(collection_name: str) -> LexicalIndex:
+    with _indexes_lock:
+        index = _indexes.get(collection_name)
+        if index is None:
+            index = LexicalIndex(os.path.join(INDEX_DIR, collection_name))
+            _indexes[collection_name] = index
+        return index
+
+
+def backfill(client, collection_name: str, batch_size: int = 1000) -> int:
+    """Index a collection that was ingested before the lexical index existed, one segment per partition."""
+    index = get_index(collection_name)
+    indexed = 0
+    for partition_name in client.list_partitions(collection_name=collection_name):
+        index.drop_partition(partition_name)
+        builder = SegmentBuilder(partition_name)
+        iterator = client.query_iterator(
+            collection_name=collection_name,
+            batch_size=batch_size,
+            filter="chunk_id >= 0",
+            output_fields=["chunk_id", "text"],
+            partition_names=[partition_name],
+        )
+        try:
+            while True:
+                batch = iterator.next()
+                if not batch:
+                    break
+                builder.add([row["chunk_id"] for row in batch], [row["text"] for row in batch])
+        finally:
+            iterator.close()
+        index.commit(builder)
+        indexed += len(builder)
+    return indexed
+
+
+def stats() -> dict:
+    with _indexes_lock:
+        indexes = dict(_indexes)
+    return {name: index.stats() for name, index in indexes.items()}
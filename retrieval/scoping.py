@@ -0,0 +1,43 @@
+import json
+import os
+
+
+def partition_for(document: str) -> str:
+    """Partition a file is ingested into: its base name without extension (see /documents/{filename}/process)."""
+    name, _ = os.path.splitext(os.path.basename(document))
+    return name
+
+
+def _literal(value: str) -> str:
+    # JSON string escaping matches Milvus expression string literals
+    return json.dumps(str(value))
+
+
+def filter_expression(chunk_type: str = None, source: str = None) -> str:
+    """Milvus boolean expression for the scalar metadata filters that are set."""
+    clauses = []
+    if chunk_type:
+        clauses.append(f"chunk_type == {_literal(chunk_type)}")
+    if source:
+        clauses.append(f"source == {_literal(source)}")
+    return " and ".join(clauses)
+
+
+def search_scope(document: str = None, chunk_type: str = None, source: str = None) -> dict:
+    """
+    Translate /chat filters into Milvus search arguments.
+
+    `document` narrows the search to that file's partition, so only its
+    segments are scanned; `chunk_type` and `source` become a scalar filter.
+    """
+    return {
+        "partition_names": [partition_for(document)] if document else None,
+        "filter": filter_expression(chunk_type, source),
+    }
+
+
+def scope_key(scope: dict) -> str:
+    """Stable string form of a scope, used in cache keys ("" when unscoped)."""
+    if not scope or (not scope.get("partition_names") and not scope.get("filter")):
+        return ""
+    return json.dumps(scope, sort_keys=True)
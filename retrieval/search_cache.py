@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+MAX_ENTRIES = int(os.environ.get("SEARCH_CACHE_MAX_ENTRIES", "2048"))
+# Embeddings are rounded to this step before hashing, so the tiny float
+# differences between batched and single encodes still hit the same entry.
+QUANTIZATION_STEP = float(os.environ.get("SEARCH_CACHE_QUANTIZATION_STEP", "0.001"))
+
+
+class SearchCache:
+    """
+    In-process cache of Milvus search results.
+
+    Keys combine the collection name, its current version, the quantized query
+    embedding, the result limit and the search params. Every write to a
+    collection bumps its version (`bump_version`), so entries cached before the
+    write can never be served again; they are also purged eagerly.
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, quantization_step: float = QUANTIZATION_STEP):
+        self.max_entries = max(1, max_entries)
+        self.quantization_step = quantization_step
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def version(self, collection_name: str) -> int:
+        with self._lock:
+            return self._versions.get(collection_name, 0)
+
+    def bump_version(self, collection_name: str) -> int:
+        with self._lock:
+            version = self._versions.get(collection_name, 0) + 1
+            self._versions[collection_name] = version
+            stale = [key for key in self._entries if key[0] == collection_name]
+            for key in stale:
+                del self._entries[key]
+            self._stats["invalidations"] += len(stale)
+            return version
+
+    def make_key(self, collection_name: str, query_vector, limit: int, search_params: dict, **extra) -> tuple:
+        quantized = np.round(np.asarray(query_vector, dtype="float32") / self.quantization_step).astype("int32")
+        digest = hashlib.sha1(quantized.tobytes()).hexdigest()
+        params = json.dumps({"search": search_params, **extra}, sort_keys=True, default=str)
+        return (collection_name, self.version(collection_name), digest, limit, params)
+
+    def get(self, key: tuple):
+        with self._lock:
+            results = self._entries.get(key)
+            if results is None or key[1] != self._versions.get(key[0], 0):
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return results
+
+    def put(self, key: tuple, results):
+        with self._lock:
+            # a write landed while this search was running; don't cache a stale result
+            if key[1] != self._versions.get(key[0], 0):
+                return
+            self._entries[key] = results
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["collection_versions"] = dict(self._versions)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["max_entries"] = self.max_entries
+        return stats
+
+
+def to_plain_results(results) -> list:
+    """Copy a pymilvus SearchResult into plain lists/dicts that are safe to cache."""
+    return [
+        [{"id": hit["id"], "distance": hit["distance"], "entity": dict(hit["entity"])} for hit in hits]
+        for hits in results
+    ]
+
+
+_cache = SearchCache()
+
+
+def get_cache() -> SearchCache:
+    return _cache
+
+
+def bump_version(collection_name: str) -> int:
+    return _cache.bump_version(collection_name)
@@ -0,0 +1,47 @@
+import os
+
+from databaseHandling.index_manager import get_index_manager
+
+
+PROFILES = ("fast", "balanced", "exhaustive")
+DEFAULT_PROFILE = os.environ.get("SEARCH_PROFILE", "balanced")
+
+# Fraction of IVF lists probed per profile (exhaustive probes all of them).
+IVF_PROBE_FRACTION = {"fast": 1 / 64, "balanced": 1 / 16, "exhaustive": 1.0}
+IVF_MIN_NPROBE = {"fast": 4, "balanced": 16, "exhaustive": 1}
+# HNSW candidate list size per profile; never below the requested limit.
+HNSW_EF = {"fast": 32, "balanced": 96, "exhaustive": 512}
+
+
+def higher_is_better(metric_type: str) -> bool:
+    """IP/COSINE scores are similarities; L2 scores are distances."""
+    return (metric_type or "").upper() in ("IP", "COSINE")
+
+
+def profile_params(index_spec: dict, profile: str, limit: int) -> dict:
+    """
+    Search params for `profile` that match the collection's actual index.
+
+    The metric always comes from the index (Milvus rejects a mismatched one);
+    the tuning knob depends on the index type: nprobe for IVF, ef for HNSW and
+    nothing for FLAT, which is always exact.
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown search profile '{profile}'. Expected one of {PROFILES}.")
+    index_type = (index_spec.get("index_type") or "FLAT").upper()
+    params = {}
+    if index_type.startswith("IVF"):
+        nlist = int(index_spec.get("params", {}).get("nlist", 128))
+        nprobe = int(nlist * IVF_PROBE_FRACTION[profile])
+        params["nprobe"] = max(1, min(nlist, max(IVF_MIN_NPROBE[profile], nprobe)))
+    elif index_type == "HNSW":
+        params["ef"] = max(limit, HNSW_EF[profile])
+    return {"metric_type": index_spec.get("metric_type"), "params": params}
+
+
+def resolve(client, collection_name: str, profile: str = DEFAULT_PROFILE, limit: int = 5) -> dict:
+    """Look up the collection's index (cached by the index manager) and build params for `profile`."""
+    spec = get_index_manager().describe(client, collection_name)
+    if spec is None:
+        spec = {"index_type": "FLAT", "metric_type": None, "params": {}}
+    return profile_params(spec, profile, limit)
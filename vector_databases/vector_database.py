@@ -1,78 +1,91 @@
-from pymilvus import connections, FieldSchema, CollectionSchema, DataType, Collection, utility
-from sentence_transformers import SentenceTransformer
+from pymilvus import FieldSchema, CollectionSchema, DataType
 import numpy as np
 import json
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# 1. connect to Milvus
-connections.connect(alias="default", host="localhost", port="19530")
-
-# 2. create database if not exists
-try:
-    utility.create_database("faqs_db")
-except Exception as e:
-    print(f"Database creation skipped: {e}")
-
-# 3. load model
-model = SentenceTransformer('all-MiniLM-L6-v2')
-
-# 4. define schema with two vector fields
-fields = [
-    FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
-    FieldSchema(name="question", dtype=DataType.VARCHAR, max_length=512),
-    FieldSchema(name="answer", dtype=DataType.VARCHAR, max_length=2048),
-    FieldSchema(name="question_embedding", dtype=DataType.FLOAT_VECTOR, dim=384),
-    FieldSchema(name="answer_embedding", dtype=DataType.FLOAT_VECTOR, dim=384),
-]
-
-schema = CollectionSchema(fields, description="FAQ embeddings (question + answer)")
-
-# 5. recreate collection
-collection_name = "med_faqs"
-if utility.has_collection(collection_name=collection_name, using="default"):
-    utility.drop_collection(collection_name=collection_name, using="default")
-
-collection = Collection(
-    name=collection_name,
-    schema=schema,
-    using="default",
-    db_name="faqs_db",
-    shards_num=2,
-)
-
-# 6. load data
-json_file = 'data//Bankmed//m_by_bankmed_faq.json'
-with open(json_file, 'r', encoding='utf-8') as f:
-    faq_data = json.load(f)
-
-questions, answers = [], []
-for category, qas in faq_data.items():
-    for qa in qas:
-        questions.append(qa['question'])
-        answers.append(qa['answer'])
-
-# 7. generate embeddings for both fields
-question_embeddings = model.encode(questions, convert_to_numpy=True).astype("float32")
-answer_embeddings = model.encode(answers, convert_to_numpy=True).astype("float32")
-
-entities = [
-    questions,
-    answers,
-    question_embeddings,
-    answer_embeddings,
-]
-collection.insert(entities)
-
-# 9. create indexes for both embedding fields
-index_params = {
-    "index_type": "IVF_FLAT",
-    "metric_type": "L2",
-    "params": {"nlist": 128},
-}
-
-collection.create_index(field_name="question_embedding", index_params=index_params)
-collection.create_index(field_name="answer_embedding", index_params=index_params)
-
-# 10. load for search
-collection.load()
-
-print("Inserted and indexed 'bob_faqs' with separate question + answer embeddings.")
+from databaseHandling.connection_manager import get_manager
+from databaseHandling.index_manager import choose_index
+from embeddingService import embedding_cache
+
+
+def main():
+    # 1-2. borrow a client bound to faqs_db (the database is created if missing);
+    # VECTOR_STORE=local runs this without a Milvus server
+    database_name = "faqs_db"
+    manager = get_manager()
+    client = manager.acquire(database_name)
+
+    # 3. embedding model; it is only loaded if some text is not in the embedding cache yet
+    model_name = 'all-MiniLM-L6-v2'
+
+    # 4. define schema with two vector fields
+    fields = [
+        FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
+        FieldSchema(name="question", dtype=DataType.VARCHAR, max_length=512),
+        FieldSchema(name="answer", dtype=DataType.VARCHAR, max_length=2048),
+        FieldSchema(name="question_embedding", dtype=DataType.FLOAT_VECTOR, dim=384),
+        FieldSchema(name="answer_embedding", dtype=DataType.FLOAT_VECTOR, dim=384),
+    ]
+
+    schema = CollectionSchema(fields, description="FAQ embeddings (question + answer)")
+
+    # 5. recreate collection
+    collection_name = "med_faqs"
+    if client.has_collection(collection_name=collection_name):
+        client.drop_collection(collection_name=collection_name)
+
+    client.create_collection(
+        collection_name=collection_name,
+        schema=schema,
+        shards_num=2,
+    )
+
+    # 6. load data
+    json_file = 'data//Bankmed//m_by_bankmed_faq.json'
+    with open(json_file, 'r', encoding='utf-8') as f:
+        faq_data = json.load(f)
+
+    questions, answers = [], []
+    for category, qas in faq_data.items():
+        for qa in qas:
+            questions.append(qa['question'])
+            answers.append(qa['answer'])
+
+    # 7. generate embeddings for both fields
+    # questions and answers go through one call, so bulk encoding is spread over the worker pool at once
+    embeddings = embedding_cache.encode(questions + answers, model_name)
+    question_embeddings, answer_embeddings = embeddings[:len(questions)], embeddings[len(questions):]
+
+    rows = [
+        {
+            "question": question,
+            "answer": answer,
+            "question_embedding": question_embedding,
+            "answer_embedding": answer_embedding,
+        }
+        for question, answer, question_embedding, answer_embedding
+        in zip(questions, answers, question_embeddings, answer_embeddings)
+    ]
+    client.insert(collection_name=collection_name, data=rows)
+
+    # 9. create indexes for both embedding fields, sized to the number of FAQs
+    index_spec = choose_index(len(questions))
+
+    index_params = client.prepare_index_params()
+    for field_name in ("question_embedding", "answer_embedding"):
+        index_params.add_index(field_name=field_name, index_name=field_name, **index_spec)
+    client.create_index(collection_name=collection_name, index_params=index_params)
+
+    # 10. load for search
+    client.load_collection(collection_name=collection_name)
+    manager.release(database_name, client)
+    manager.close()
+
+    print("Inserted and indexed 'bob_faqs' with separate question + answer embeddings.")
+
+
+# embedding workers are spawned processes that re-import this module, so the script body must not run on import
+if __name__ == "__main__":
+    main()